@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Comparación de la carga de los modelos guardados como pickle contra el formato
+lean (--model-format both genera los dos), para el caso de un dashboard:
+
+    pickle           pickle.load del archivo completo
+    lean (grupo)     load_index y load_group de un solo grupo (mapeado en memoria)
+    lean (todos)     load_group de todos los grupos
+    lean (scoring)   load_models: tablas listas para evaluar todos los grupos
+
+Se reporta el tamaño en disco y el mejor tiempo de --rounds rondas:
+
+    python bench/artifacts_load_bench.py --pickle out/risk_models.pickle --lean out/risk_models
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modelos_hosp.artifacts import load_index, load_group
+from modelos_hosp.scoring import load_models
+
+
+# Tamaño en disco (MB) de un archivo o directorio
+def disk_size(path):
+
+    if os.path.isfile(path):
+        return os.path.getsize(path)/2**20
+
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)/2**20
+
+
+# Mejor tiempo (en ms) de fn, de n_rounds rondas
+def best_time(fn, n_rounds):
+
+    best = np.inf
+    for _ in range(n_rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter()-t0)
+
+    return 1e3*best
+
+
+# Carga completa del pickle (dentro de una función: los modelos con fórmula guardan su entorno de patsy)
+def load_pickle(path):
+
+    with open(path, 'rb') as handle:
+        return pickle.load(handle)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Carga de los modelos: pickle contra formato lean')
+    parser.add_argument('--pickle', required=True, help='Archivo .pickle de los modelos')
+    parser.add_argument('--lean', required=True, help='Directorio de los mismos modelos en formato lean')
+    parser.add_argument('--grp', default=None, help='Grupo a cargar solo (el primero por omisión)')
+    parser.add_argument('--rounds', type=int, default=5, help='Rondas (se reporta la mejor)')
+    args = parser.parse_args()
+
+    index = load_index(args.lean)
+    grps = list(index['groups'])
+    grp = args.grp or grps[0]
+
+    def lean_group():
+        load_group(args.lean, grp, load_index(args.lean))
+
+    def lean_all():
+        idx = load_index(args.lean)
+        for g in grps:
+            load_group(args.lean, g, idx)
+
+    print(f'grupos: {len(grps)}; pickle {disk_size(args.pickle):.2f} MB, lean {disk_size(args.lean):.2f} MB')
+    t_ref = best_time(lambda: load_pickle(args.pickle), args.rounds)
+    rows = [('pickle', t_ref),
+            (f'lean (grupo {grp})', best_time(lean_group, args.rounds)),
+            ('lean (todos)', best_time(lean_all, args.rounds)),
+            ('lean (scoring)', best_time(lambda: load_models(args.lean), args.rounds))]
+    for name, t in rows:
+        print(f'{name:30s} {t:9.2f} ms  x{t_ref/t:7.1f}')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Micro-benchmark del costo por ajuste en la selección de variables: la fórmula
+(smf.glm, que interpreta la fórmula con patsy y construye la matriz en cada
+ajuste) contra glm_design/glm_fit (matriz construida una vez, columnas por
+índice), sin y con el inicio en los coeficientes del ajuste anterior.
+
+Usa datos sintéticos (conteos binomiales negativos con semilla fija), por lo
+que no necesita la base de datos:
+
+    python bench/glm_fit_bench.py --n 4000 --n-vars 60 --fit-vars 10 --repeat 30
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+import statsmodels.formula.api as smf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modelos_hosp.glm_select import glm_design, glm_fit
+
+
+# Datos sintéticos: n celdas, n_vars predictoras en [0, 1] y conteos binomiales negativos
+def make_data(n, n_vars, alpha, seed):
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.random((n, n_vars)), columns=[f'V{i:03d}' for i in range(n_vars)])
+    beta = rng.normal(0, 0.5, 5)
+    mu = np.exp(0.5 + X.iloc[:, :5].to_numpy().dot(beta))
+    X['Y'] = rng.negative_binomial(1/alpha, 1/(1+alpha*mu)).astype('float64')
+
+    return X
+
+
+# Secuencia de conjuntos de variables como la de la búsqueda: se agrega o se quita una variable por paso
+def var_sets(names, fit_vars, repeat, seed):
+
+    rng = np.random.default_rng(seed)
+    cur = list(names[:fit_vars])
+    sets = []
+    for _ in range(repeat):
+        if len(cur)>2 and rng.random()<0.5:
+            cur.pop(rng.integers(len(cur)))
+        else:
+            cur.append(rng.choice([v for v in names if v not in cur]))
+        sets.append(list(cur))
+
+    return sets
+
+
+# Mejor tiempo por ajuste (en ms) de fn sobre todos los conjuntos, de n_rounds rondas
+def time_fits(fn, sets, n_rounds):
+
+    best = np.inf
+    for _ in range(n_rounds):
+        t0 = time.perf_counter()
+        fn(sets)
+        best = min(best, time.perf_counter()-t0)
+
+    return 1e3*best/len(sets)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Costo por ajuste: fórmula contra glm_design/glm_fit')
+    parser.add_argument('--n', type=int, default=4000, help='Número de registros (celdas)')
+    parser.add_argument('--n-vars', type=int, default=60, help='Número de variables candidatas')
+    parser.add_argument('--fit-vars', type=int, default=10, help='Variables del conjunto inicial')
+    parser.add_argument('--repeat', type=int, default=30, help='Ajustes por ronda')
+    parser.add_argument('--rounds', type=int, default=3, help='Rondas (se reporta la mejor)')
+    parser.add_argument('--alpha', type=float, default=0.5, help='alpha de la binomial negativa')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data = make_data(args.n, args.n_vars, args.alpha, args.seed)
+    names = list(data.columns.drop('Y'))
+    sets = var_sets(names, args.fit_vars, args.repeat, args.seed)
+    family = sm.families.NegativeBinomial(alpha=args.alpha)
+
+    def formula(sets):
+        return [smf.glm('Y~'+'+'.join(v), data=data, family=family).fit().params for v in sets]
+
+    def design_fit(sets):
+        design = glm_design(data)
+        return [glm_fit(design, v, family)['params'] for v in sets]
+
+    def design_fit_start(sets):
+        design = glm_design(data)
+        start, res = None, []
+        for v in sets:
+            start = glm_fit(design, v, family, start=start)['params']
+            res.append(start)
+        return res
+
+    # Los tres caminos llegan a los mismos coeficientes
+    ref = formula(sets)
+    for name, fn in [('glm_fit', design_fit), ('glm_fit (start)', design_fit_start)]:
+        diff = max(np.max(np.abs(a.to_numpy()-b[a.index].to_numpy())) for a, b in zip(ref, fn(sets)))
+        print(f'max |diff| {name} vs fórmula: {diff:.2e}')
+
+    print(f'n={args.n}, variables={args.n_vars}, ajustes={len(sets)}')
+    t_ref = time_fits(formula, sets, args.rounds)
+    for name, fn in [('fórmula (smf.glm)', formula), ('glm_fit', design_fit), ('glm_fit (start)', design_fit_start)]:
+        t = t_ref if fn is formula else time_fits(fn, sets, args.rounds)
+        print(f'{name:20s} {t:8.2f} ms/ajuste  x{t_ref/t:5.2f}')
+
+
+if __name__=='__main__':
+    main()
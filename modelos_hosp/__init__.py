@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Generación automatizada de modelos predictivos del número y severidad de las
+hospitalizaciones por enfermedades y categorías de enfermedades.
+
+Los datos de referencia y los egresos se cargan una sola vez y se pueden usar
+para generar varios modelos:
+
+    from modelos_hosp import CFG, load_ref_data, load_data, nhosp
+
+    cfg = CFG(grp='HE', max_grps=10)
+    ref = load_ref_data(cfg)
+    data = load_data(cfg, ref)
+    models_dict = nhosp.run(cfg, ref, data)
+"""
+
+from .config import CFG
+from .prep import MinMaxScaler, min_max_scaler, x_set_lim, rep_outlier, shuffle_data
+from .refdata import load_ref_data, load_catalogs, load_inegi, load_cont, load_loc_feat
+from .egresos import load_data, add_date_features
+from .groups import build_groups
+from .artifacts import save_artifacts, load_index, load_group, load_common
+from .scoring import load_risk_models, load_count_models, score_risk, score_count
+from .cubes import save_cubes, load_cubes, cube_slice
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Formato compacto y versionado de los modelos generados (alternativo al pickle).
+
+En lugar de guardar los objetos de statsmodels (que incluyen los datos de
+entrenamiento) y de sklearn, cada grupo se guarda en su propio directorio con
+un archivo .npy por arreglo, que se puede mapear en memoria, y un archivo
+meta.json con los nombres de las variables, la familia del GLM y los
+resultados de validación:
+
+    glm_params, glm_pvalues   coeficientes del GLM ('Intercept' y variables)
+    glm_cov                   matriz de covarianzas de los coeficientes
+    xmin, xmax                límites para escalar las variables a 0-1
+    tree_*, gbm_*             nodos del árbol y de los árboles del GBM
+
+Los nodos de los árboles se guardan concatenados: feature, threshold, left,
+right (índices globales, -1 en las hojas), value y missing_left (solo se usa
+si allow_nan, en HistGradientBoosting), y en roots el nodo raíz de cada árbol. La predicción del GBM es init + scale*suma de
+los valores de las hojas.
+
+El archivo index.json tiene la versión del formato y el directorio de cada
+grupo, de modo que un dashboard puede cargar solo el grupo que necesita. Las
+tablas comunes a todos los grupos (estadísticas, nombres, etc.) se guardan en
+common.pickle, que solo contiene objetos de pandas.
+"""
+
+import os
+import json
+import shutil
+import pickle
+import numpy as np
+import pandas as pd
+import sklearn
+
+
+# Cambiar cuando cambie el formato, para que los lectores puedan detectarlo
+ARTIFACT_VERSION = 1
+
+# Versión de scikit-learn con la que se escribió la lectura de los atributos privados de HistGradientBoostingRegressor
+HGB_SKLEARN_VERSION = '1.2'
+
+# Campos de los nodos de HistGradientBoostingRegressor que se usan
+hgb_node_fields = ('value', 'feature_idx', 'num_threshold', 'missing_go_to_left', 'left', 'right', 'is_leaf')
+
+
+# Coeficientes y familia de un GLM ajustado con statsmodels
+def glm_arrays(model):
+
+    family = model.model.family
+    arrays = {'glm_params': model.params.to_numpy(dtype='float64'),
+              'glm_pvalues': model.pvalues.to_numpy(dtype='float64'),
+              'glm_cov': np.asarray(model.cov_params(), dtype='float64')}
+    meta = {'glm_names': list(model.params.index),
+            'glm_family': type(family).__name__,
+            'glm_link': type(family.link).__name__,
+            'glm_alpha': getattr(family, 'alpha', None)}
+
+    return arrays, meta
+
+
+# Nodos de árboles de sklearn, concatenados; values es el valor de cada nodo de cada árbol
+def _flat_trees(trees, values):
+
+    sizes = np.array([t.node_count for t in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    left = np.concatenate([t.children_left for t in trees])
+    right = np.concatenate([t.children_right for t in trees])
+    offset = np.repeat(roots, sizes)
+
+    return {'feature': np.concatenate([t.feature for t in trees]).astype('int32'),
+            'threshold': np.concatenate([t.threshold for t in trees]).astype('float64'),
+            'left': np.where(left>=0, left+offset, -1).astype('int32'),
+            'right': np.where(right>=0, right+offset, -1).astype('int32'),
+            'value': np.concatenate(values).astype('float64'),
+            'missing_left': np.zeros(sizes.sum(), dtype='uint8'),
+            'roots': roots.astype('int32')}
+
+
+# Árbol de regresión (DecisionTreeRegressor); sklearn compara las variables como float32
+def tree_arrays(clf, prefix='tree_'):
+
+    t = clf.tree_
+    arrays = _flat_trees([t], [t.value[:, 0, 0]])
+    meta = {'x_dtype': 'float32', 'init': 0.0, 'scale': 1.0, 'allow_nan': False, 'n_features': int(clf.n_features_in_)}
+
+    return {prefix+k: v for k, v in arrays.items()}, {prefix+'meta': meta}
+
+
+# Nodos de los árboles de HistGradientBoostingRegressor (atributos privados, revisados contra la versión esperada)
+def _hgb_nodes(gbm):
+
+    def unsupported(what):
+        return ValueError(f'HistGradientBoostingRegressor de scikit-learn {sklearn.__version__} no es compatible con '
+                          f'el formato lean ({what}); la lectura de sus árboles se escribió para scikit-learn '
+                          f'{HGB_SKLEARN_VERSION}. Use --model-format pickle o la versión {HGB_SKLEARN_VERSION}.')
+
+    predictors = getattr(gbm, '_predictors', None)
+    if predictors is None or not hasattr(gbm, '_baseline_prediction'):
+        raise unsupported('sin _predictors o _baseline_prediction')
+    if any(len(p)!=1 for p in predictors):
+        raise unsupported('más de un árbol por iteración')
+
+    nodes = [p[0].nodes for p in predictors]
+    missing = [f for f in hgb_node_fields if f not in (nodes[0].dtype.names or ())]
+    if missing:
+        raise unsupported(f"nodos sin los campos {', '.join(missing)}")
+    if 'is_categorical' in nodes[0].dtype.names and any(n['is_categorical'].any() for n in nodes):
+        raise unsupported('divisiones por variables categóricas')
+
+    return nodes
+
+
+# GBM: GradientBoostingRegressor o HistGradientBoostingRegressor, como árboles concatenados
+def gbm_arrays(gbm, prefix='gbm_'):
+
+    if hasattr(gbm, 'estimators_'):
+        trees = [est.tree_ for est in gbm.estimators_[:, 0]]
+        arrays = _flat_trees(trees, [t.value[:, 0, 0] for t in trees])
+        meta = {'x_dtype': 'float32', 'init': float(gbm.init_.constant_.ravel()[0]),
+                'scale': float(gbm.learning_rate), 'allow_nan': False}
+    else:
+        # En HistGradientBoostingRegressor los valores de las hojas ya incluyen la tasa de aprendizaje
+        nodes = _hgb_nodes(gbm)
+        sizes = np.array([len(n) for n in nodes])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        nodes_c = np.concatenate(nodes)
+        offset = np.repeat(roots, sizes)
+        leaf = nodes_c['is_leaf'].astype(bool)
+        arrays = {'feature': np.where(leaf, -2, nodes_c['feature_idx']).astype('int32'),
+                  'threshold': nodes_c['num_threshold'].astype('float64'),
+                  'left': np.where(leaf, -1, nodes_c['left'].astype('int64')+offset).astype('int32'),
+                  'right': np.where(leaf, -1, nodes_c['right'].astype('int64')+offset).astype('int32'),
+                  'value': nodes_c['value'].astype('float64'),
+                  'missing_left': nodes_c['missing_go_to_left'].astype('uint8'),
+                  'roots': roots.astype('int32')}
+        meta = {'x_dtype': 'float64', 'init': float(np.ravel(gbm._baseline_prediction)[0]), 'scale': 1.0,
+                'allow_nan': True}
+    meta['n_features'] = int(gbm.n_features_in_)
+
+    return {prefix+k: v for k, v in arrays.items()}, {prefix+'meta': meta}
+
+
+# Arreglos y metadatos de un grupo a partir de sus entradas (sin el prefijo grp+'_') de models_dict
+def group_arrays(entries):
+
+    arrays, meta = {}, {'scores': {}}
+    for key, value in entries.items():
+        if key in ('NB', 'LOGISTIC'):
+            a, m = glm_arrays(value)
+            meta['glm_key'] = key
+        elif key in ('xmin', 'xmax'):
+            a, m = {key: value.to_numpy(dtype='float64')}, {'columns': list(value.index)}
+        elif key=='TREE':
+            a, m = tree_arrays(value)
+        elif key=='GBM':
+            a, m = gbm_arrays(value)
+        elif key=='scaler':
+            # Se reconstruye con xmin y xmax
+            continue
+        elif isinstance(value, pd.Index):
+            a, m = {}, {key.lower(): list(value)}
+        elif isinstance(value, pd.DataFrame):
+            a, m = {}, {key.lower(): json.loads(value.to_json(orient='split'))}
+        elif np.isscalar(value):
+            a, m = {}, {}
+            meta['scores'][key] = float(value)
+        else:
+            raise TypeError(f'Tipo no soportado para {key}: {type(value)}')
+        arrays.update(a)
+        meta.update(m)
+
+    return arrays, meta
+
+
+# Guarda models_dict (de nhosp.run o riesgo.run) en el directorio path, un subdirectorio por grupo
+def save_artifacts(models_dict, path):
+
+    grps = list(models_dict['models'])
+    prefixes = tuple(grp+'_' for grp in grps)
+
+    # Se escribe en un directorio temporal para no dejar artefactos incompletos
+    tmp_path = path.rstrip('/') + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    index = {'version': ARTIFACT_VERSION, 'groups': {}, 'common': 'common.pickle'}
+    for i, grp in enumerate(grps):
+        entries = {k[len(grp)+1:]: v for k, v in models_dict.items() if k.startswith(grp+'_')}
+        arrays, meta = group_arrays(entries)
+
+        grp_dir = f'g{i:04d}'
+        os.makedirs(os.path.join(tmp_path, grp_dir))
+        for name, a in arrays.items():
+            np.save(os.path.join(tmp_path, grp_dir, f'{name}.npy'), a)
+        meta.update({'version': ARTIFACT_VERSION, 'grp': grp, 'arrays': list(arrays)})
+        with open(os.path.join(tmp_path, grp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        index['groups'][grp] = grp_dir
+
+    common = {k: v for k, v in models_dict.items() if not k.startswith(prefixes)}
+    with open(os.path.join(tmp_path, index['common']), 'wb') as handle:
+        pickle.dump(common, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+# Índice de los artefactos guardados en path
+def load_index(path):
+
+    with open(os.path.join(path, 'index.json')) as f:
+        index = json.load(f)
+    if index['version']!=ARTIFACT_VERSION:
+        raise ValueError(f"Versión de artefactos no soportada: {index['version']} (se esperaba {ARTIFACT_VERSION})")
+
+    return index
+
+
+# Carga un grupo: sus metadatos y arreglos (mapeados en memoria con mmap=True)
+def load_group(path, grp, index=None, mmap=True):
+
+    if index is None:
+        index = load_index(path)
+    grp_path = os.path.join(path, index['groups'][grp])
+
+    with open(os.path.join(grp_path, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(grp_path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+              for name in meta['arrays']}
+
+    return {'meta': meta, 'arrays': arrays}
+
+
+# Tablas comunes a todos los grupos
+def load_common(path, index=None):
+
+    if index is None:
+        index = load_index(path)
+    with open(os.path.join(path, index['common']), 'rb') as handle:
+        return pickle.load(handle)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Cache en disco de los egresos, defunciones y afecciones ya preparados.
+
+Cada tabla se guarda en un directorio con un archivo .npy por columna (formato
+columnar que se puede mapear en memoria) y un archivo meta.json con el orden y
+tipo de las columnas. Las columnas de texto (y categóricas) se guardan como
+códigos enteros y sus categorías, y se cargan como categóricas sobre los códigos
+mapeados en memoria; las funciones que necesiten texto las convierten con
+restore_dtypes solo en las columnas que usan. La llave de la cache depende del archivo de la base de datos
+(ruta, fecha de modificación y tamaño), de q_cond y de la versión del formato,
+por lo que cualquier cambio en ellos genera una nueva cache.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+# Cambiar cuando cambie la preparación de los datos, para invalidar las caches anteriores
+CACHE_VERSION = 2
+
+
+# Llave de la cache para la base de datos y condición de la configuración
+def cache_key(cfg):
+
+    db_file = os.path.abspath(os.path.join(cfg.base_dir, cfg.db))
+    st = os.stat(db_file)
+    key = repr((db_file, st.st_mtime_ns, st.st_size, cfg.q_cond, bool(cfg.chunk_size), CACHE_VERSION))
+
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+# Guarda un DataFrame como un archivo .npy por columna
+def save_frame(df, path):
+
+    os.makedirs(path, exist_ok=True)
+    kinds = {}
+    for i, col in enumerate(df.columns):
+        x = df[col]
+        if pd.api.types.is_datetime64_any_dtype(x):
+            kinds[col] = 'dt'
+            np.save(os.path.join(path, f'{i}.npy'), x.to_numpy(dtype='datetime64[ns]').view('int64'))
+        elif x.dtype==object or isinstance(x.dtype, pd.CategoricalDtype):
+            # 'category' (categórica) y 'cat' (texto) se guardan igual y se cargan como categóricas
+            if isinstance(x.dtype, pd.CategoricalDtype):
+                kinds[col] = 'category'
+                codes, cats = x.cat.codes.to_numpy(), x.cat.categories
+            else:
+                kinds[col] = 'cat'
+                codes, cats = pd.factorize(x)
+            np.save(os.path.join(path, f'{i}.npy'), codes.astype('int32'))
+            np.save(os.path.join(path, f'{i}_cat.npy'), np.asarray(cats, dtype=str))
+        elif pd.api.types.is_extension_array_dtype(x) and pd.api.types.is_integer_dtype(x):
+            # Enteros con valores nulos (p. ej. Int16): valores y máscara de nulos
+            kinds[col] = str(x.dtype)
+            np.save(os.path.join(path, f'{i}.npy'), x.to_numpy(dtype=x.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(path, f'{i}_na.npy'), x.isna().to_numpy())
+        else:
+            kinds[col] = 'num'
+            np.save(os.path.join(path, f'{i}.npy'), x.to_numpy())
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'columns': list(df.columns), 'kinds': kinds, 'n': len(df)}, f)
+
+
+# Carga un DataFrame guardado con save_frame; las columnas numéricas y los códigos de las de texto se mapean en memoria
+def load_frame(path, columns=None):
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+
+    cols = {}
+    for i, col in enumerate(meta['columns']):
+        if columns is not None and col not in columns:
+            continue
+        x = np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')
+        kind = meta['kinds'][col]
+        if kind=='dt':
+            x = x.view('datetime64[ns]')
+        elif kind in ('cat', 'category'):
+            x = pd.Categorical.from_codes(x, np.load(os.path.join(path, f'{i}_cat.npy')).astype(object))
+        elif kind!='num':
+            x = pd.arrays.IntegerArray(x, np.load(os.path.join(path, f'{i}_na.npy')))
+        cols[col] = x
+
+    return pd.DataFrame(cols, index=pd.RangeIndex(meta['n']))
+
+
+# Regresa las tablas preparadas por build_fn(cfg), leyéndolas de la cache si existe
+def cached_frames(cfg, build_fn, names=('df_egre', 'df_defu', 'df_afec')):
+
+    path = os.path.join(cfg.cache_dir, cache_key(cfg))
+    if all(os.path.exists(os.path.join(path, name, 'meta.json')) for name in names):
+        return {name: load_frame(os.path.join(path, name)) for name in names}
+
+    frames = build_fn(cfg)
+
+    # Se escribe en un directorio temporal para no dejar caches incompletas
+    tmp_path = path + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    for name in names:
+        save_frame(frames[name].reset_index(drop=True), os.path.join(tmp_path, name))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    return frames
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Índice invertido de códigos CIE a registros.
+
+Para cada código CIE se guardan las posiciones (ordenadas y sin repetir, aunque
+el código aparezca en varias columnas del mismo registro) de los registros que
+lo tienen en alguna de las columnas indicadas (p. ej. AFECCION, DIAGNOSTICO o
+CAUSA), en formato CSR: las posiciones del código i son pos[indptr[i]:indptr[i+1]].
+Así, los registros de un grupo se obtienen uniendo las listas de sus códigos, sin
+recorrer toda la tabla para cada grupo.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Construye el índice invertido de las columnas cols de df
+def build_cie_index(df, cols):
+
+    codes, cie = pd.factorize(pd.concat([df[col] for col in cols], ignore_index=True))
+    pos = np.tile(np.arange(len(df), dtype=np.int64), len(cols))
+
+    # Se descartan los valores nulos
+    idx = codes>=0
+    codes, pos = codes[idx], pos[idx]
+
+    # Orden por código y posición; un registro con el mismo código en dos columnas se cuenta una vez
+    order = np.lexsort((pos, codes))
+    codes, pos = codes[order], pos[order]
+    idx = np.ones(len(codes), dtype=bool)
+    idx[1:] = (codes[1:]!=codes[:-1]) | (pos[1:]!=pos[:-1])
+    codes, pos = codes[idx], pos[idx]
+
+    indptr = np.zeros(len(cie)+1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(codes, minlength=len(cie)))
+
+    return {'cie': pd.Index(cie), 'indptr': indptr, 'pos': pos}
+
+
+# Posiciones (en el orden de la tabla) de los registros con alguno de los códigos CIE de cie_x
+def cie_rows(cie_idx, cie_x):
+
+    k = cie_idx['cie'].get_indexer(pd.unique(pd.Series(cie_x, dtype=object)))
+    k = k[k>=0]
+
+    indptr = cie_idx['indptr']
+    pos = [cie_idx['pos'][indptr[i]:indptr[i+1]] for i in k]
+
+    return np.unique(np.concatenate(pos)) if len(pos) else np.empty(0, dtype=np.int64)
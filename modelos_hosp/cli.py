@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Línea de comandos para generar los modelos:
+
+    python -m modelos_hosp nhosp --grp PC --max-grps 2
+    python -m modelos_hosp riesgo --grp HE --max-grps 10 --n-jobs 4
+"""
+
+import os
+import argparse
+import importlib
+
+from .config import CFG
+from .refdata import load_ref_data
+from .egresos import load_data
+from .artifacts import save_artifacts
+from .cubes import save_cubes, fecha_range
+
+
+# Valores por defecto de cada tipo de modelo (archivo de salida y número de grupos)
+models_defaults = {'nhosp': {'output': 'n_hosp.pickle', 'max_grps': 2},
+                   'riesgo': {'output': 'risk_models.pickle', 'max_grps': 5}}
+
+
+# alpha de la binomial negativa: un número o el método para estimarlo
+def nb_alpha_arg(value):
+
+    if value in ('mom', 'profile'):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"debe ser un número, 'mom' o 'profile': {value}")
+
+
+def get_parser():
+
+    parser = argparse.ArgumentParser(prog='modelos_hosp',
+                                     description='Generación de modelos del número (nhosp) y severidad (riesgo) de las hospitalizaciones')
+    parser.add_argument('model', nargs='+', choices=list(models_defaults),
+                        help='Modelos a generar; los datos se cargan una sola vez para todos')
+    parser.add_argument('--base-dir', default=CFG.base_dir, help='Directorio base')
+    parser.add_argument('--db', default=CFG.db, help='Base de datos a usar')
+    parser.add_argument('--seed', type=int, default=CFG.seed, help='Semilla para el componente aleatorio')
+    parser.add_argument('--out', default=CFG.out, help='Directorio de salida para las imágenes generadas')
+    parser.add_argument('--no-plot', dest='save_plot', action='store_false', help='No guardar las imágenes')
+    parser.add_argument('--train-prop', type=float, default=CFG.train_prop, help='Proporción de registros para entrenamiento')
+    parser.add_argument('--grp', default=CFG.grp, choices=['PC', 'HE', 'CM'], help='Tipo de análisis a realizar')
+    parser.add_argument('--max-grps', type=int, default=None, help='Número máximo de modelos a generar')
+    parser.add_argument('--err-func', default=CFG.err_func, choices=['AUC', 'COR', 'MSE', 'MAE', 'R2'], help='Función con la que se mide el error (severidad)')
+    parser.add_argument('--use-weight', action='store_true', help='Usar mínimos cuadrados ponderados')
+    parser.add_argument('--lang', default=CFG.lang, choices=['EN', 'ES'], help='Idioma de la salida de resultados')
+    parser.add_argument('--all-cie', dest='use_defu', action='store_false', help='Usar también CIE sin defunciones')
+    parser.add_argument('--n-jobs', type=int, default=CFG.n_jobs, help='Número de procesos para generar los modelos en paralelo')
+    parser.add_argument('--plot-n-jobs', type=int, default=CFG.plot_n_jobs, help='Número de procesos para dibujar las imágenes (0: en el proceso principal)')
+    parser.add_argument('--chunk-size', type=int, default=CFG.chunk_size, help='Registros por bloque al leer los egresos (con tipos reducidos)')
+    parser.add_argument('--cache-dir', default=CFG.cache_dir, help='Directorio de la cache de egresos ya preparados')
+    parser.add_argument('--db-grps', action='store_true', help='Leer de la base de datos (sin modificarla) los egresos de cada grupo')
+    parser.add_argument('--create-indexes', action='store_true', help='Crear en la base de datos los índices que usa --db-grps (modifica el archivo)')
+    parser.add_argument('--sparse-dummies', action='store_true', help='Guardar las dummies de municipio, procedencia, entidad y mes como columnas dispersas')
+    parser.add_argument('--glm-cache-size', type=int, default=CFG.glm_cache_size, help='Ajustes de GLM guardados por grupo en la selección de variables (0: sin cache)')
+    parser.add_argument('--nb-alpha', type=nb_alpha_arg, default=CFG.nb_alpha, help="alpha de la binomial negativa (nhosp): valor fijo, 'mom' o 'profile' (estimado por grupo)")
+    parser.add_argument('--nb-screen', action='store_true', help='Hacer el primer ajuste de la selección de variables de todos los grupos en un solo IRLS (nhosp)')
+    parser.add_argument('--hist-gbm', action='store_true', help='Usar HistGradientBoostingRegressor con paro temprano en validación (severidad)')
+    parser.add_argument('--perm-n-jobs', type=int, default=CFG.perm_n_jobs, help='Número de procesos para la importancia por permutación del GBM (severidad)')
+    parser.add_argument('--q-cond', default=CFG.q_cond, help='Condición SQL para el rango de años a usar')
+    parser.add_argument('--output-dir', default='./', help='Directorio donde se guardan los modelos')
+    parser.add_argument('--model-format', default='pickle', choices=['pickle', 'lean', 'both'],
+                        help='Formato de los modelos: pickle, compacto por grupo (directorio con el nombre del archivo, sin extensión) o ambos')
+    parser.add_argument('--cubes', action='store_true',
+                        help='Guardar también los cubos de predicciones por localidad y mes con sus intervalos de confianza (nhosp, directorio n_hosp_cubes)')
+    parser.add_argument('--cube-level', type=float, default=0.95, help='Nivel de confianza de los intervalos de los cubos')
+
+    return parser
+
+
+def main(argv=None):
+
+    args = vars(get_parser().parse_args(argv))
+    model_lst = args.pop('model')
+    output_dir = args.pop('output_dir')
+    max_grps = args.pop('max_grps')
+    model_format = args.pop('model_format')
+    cubes = args.pop('cubes')
+    cube_level = args.pop('cube_level')
+
+    cfg = CFG(**args)
+
+    # El directorio de salida se crea antes de generar los modelos, para no fallar al guardarlos
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Datos de referencia y egresos, comunes a todos los modelos
+    ref = load_ref_data(cfg)
+    data = load_data(cfg, ref)
+
+    for model in model_lst:
+        mod = importlib.import_module(f'.{model}', __package__)
+        cfg.max_grps = max_grps if max_grps is not None else models_defaults[model]['max_grps']
+
+        models_dict = mod.run(cfg, ref, data)
+        path = os.path.join(output_dir, models_defaults[model]['output'])
+        if model_format in ('pickle', 'both'):
+            mod.save_models(models_dict, path)
+        if model_format in ('lean', 'both'):
+            save_artifacts(models_dict, os.path.splitext(path)[0])
+        if cubes and model=='nhosp':
+            save_cubes(models_dict, ref['loc_feat'], fecha_range(data), os.path.splitext(path)[0]+'_cubes', cube_level)
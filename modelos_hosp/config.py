@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Configuración por defecto del análisis a correr.
+
+Los scripts heredan de CFG para cambiar únicamente los valores que necesitan, 
+y la línea de comandos crea una instancia con los argumentos recibidos.
+"""
+
+
+class CFG:
+    base_dir = './'      # Directorio base
+    db = 'rnd_db.sqlite' # Base de datos a usar
+    seed = 11            # Semilla para el componente aleatorio
+    out = 'out/'         # Directorio de salida para las imágenes generadas
+    save_plot = True     # ¿Se guardan las imágenes?
+    train_prop = 0.85    # Proporción de registros para entrenamiento, (1-train_prop) para validación
+    grp = 'PC'           # Tipo de análisis a realizar, PC: Principales causas de defunción, HE: Hospitalizaciones evitables, CM: Grupo especifico 
+    max_grps = 2         # Número máximo de modelos a generar
+    
+    err_func = 'AUC'     # Función con la que se mide el error (solo severidad)
+    use_weight = False   # Usar mínimos cuadrados ponderados
+    lang = 'EN'          # lang=EN o lang=ES para la salida de resultados
+    use_defu = True      # ¿Usar solo CIE que tengan defunciones?
+    n_jobs = 1           # Número de procesos para generar los modelos en paralelo (1: secuencial)
+    plot_n_jobs = 1      # Número de procesos para dibujar las imágenes mientras se generan los modelos (0: en el proceso principal)
+    chunk_size = None    # Registros por bloque al leer los egresos, con tipos reducidos (None: todos a la vez)
+    cache_dir = None     # Directorio de la cache de egresos ya preparados (None: sin cache)
+    db_grps = False      # ¿Leer de la base de datos los egresos de cada grupo en lugar de cargarlos todos?
+    create_indexes = False # ¿Crear en la base de datos los índices para db_grps? (modifica el archivo)
+    glm_cache_size = 256 # Ajustes de GLM guardados por grupo en la selección de variables (0: sin cache)
+    sparse_dummies = False # ¿Guardar las dummies de municipio, procedencia, entidad y mes como columnas dispersas?
+    hist_gbm = False     # ¿Usar HistGradientBoostingRegressor con paro temprano en validación en lugar de GradientBoostingRegressor? (solo severidad)
+    perm_n_jobs = 2      # Número de procesos para la importancia por permutación del GBM (solo severidad)
+    nb_alpha = 1.0       # alpha de la binomial negativa: valor fijo, 'mom' (momentos) o 'profile' (perfil de verosimilitud), estimado por grupo
+    nb_screen = False    # ¿Hacer el primer ajuste de todos los grupos en un solo IRLS (nb_fit_batch)? (solo nhosp)
+
+    q_cond = 'ANIO<=2020'    # rango de años a usar para el análisis
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            if not hasattr(self, k):
+                raise AttributeError(f'Parámetro de configuración desconocido: {k}')
+            setattr(self, k, v)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Cubos precalculados del número esperado de hospitalizaciones por localidad y
+mes, para los dashboards.
+
+Para cada grupo de models_dict['models'] (n_hosp) se guarda un arreglo
+(3, localidades, meses) con la predicción del modelo binomial negativo y los
+límites de su intervalo de confianza (de la media, al nivel level):
+
+    N_HOSP, LOWER, UPPER
+
+de modo que una vista es un corte del arreglo mapeado en memoria y no una
+evaluación del modelo:
+
+    from modelos_hosp import load_cubes, cube_slice
+
+    cubes = load_cubes('n_hosp_cubes')
+    v = cube_slice(cubes, 'E10-E149', locs=['090020001'])
+
+Las variables de los modelos dependen solo de la localidad (indicadores, E_MUN
+y ENTIDAD) o solo del mes (FECHA y MES), por lo que el predictor lineal es la
+suma de una parte por localidad y otra por mes, y su varianza x'Σx se obtiene
+de las varianzas de cada parte y de un producto de matrices para el término
+cruzado, sin construir la matriz de diseño de cada celda.
+
+El directorio tiene un index.json con la versión, el nivel de confianza, los
+meses (FECHA y 'AAAA-MM') y el subdirectorio de cada grupo, y localities.npy
+con las claves de las localidades (ENTIDAD+MUNIC+LOC) en el orden de los cubos.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .scoring import models_from_dict, base_features, feature_matrix, scale_matrix, month_names
+
+
+# Cambiar cuando cambie el formato, para que los lectores puedan detectarlo
+CUBE_VERSION = 1
+
+# Capas de cada cubo
+cube_layers = ['N_HOSP', 'LOWER', 'UPPER']
+
+# Variables de los modelos que dependen del mes; las demás dependen de la localidad
+month_vars = ['FECHA', 'MES']
+
+
+# Rango de meses (FECHA, meses desde 2015) de los egresos y defunciones cargados con load_data
+def fecha_range(data):
+
+    fechas = [df['FECHA'] for df in (data['df_egre_not_defu'], data['df_defu']) if df is not None]
+
+    return np.arange(min(f.min() for f in fechas), max(f.max() for f in fechas)+1)
+
+
+# Etiqueta 'AAAA-MM' de cada FECHA
+def fecha_labels(fechas):
+
+    fechas = np.asarray(fechas)
+
+    return [f'{2015+(f-1)//12}-{(f-1)%12+1:02d}' for f in fechas]
+
+
+# Predictor lineal y su varianza separados en la parte por localidad (con el intercepto) y la parte por mes
+def glm_parts(glm, feat_loc, feat_month):
+
+    is_month = np.array([any(v==m or v.startswith(m+'_') for m in month_vars) for v in glm['vars']], dtype=bool)
+    k_loc = np.flatnonzero(~is_month)
+    k_month = np.flatnonzero(is_month)
+    loc_vars = [glm['vars'][k] for k in k_loc]
+    mon_vars = [glm['vars'][k] for k in k_month]
+
+    # Variables escaladas con los límites del grupo; el intercepto va con la parte por localidad
+    X_loc = np.empty((len(feat_loc['FECHA']), len(k_loc)+1))
+    X_loc[:, 0] = 1
+    X_loc[:, 1:] = scale_matrix(feature_matrix(feat_loc, loc_vars), glm['xmin'][k_loc], glm['xmax'][k_loc])
+    X_month = scale_matrix(feature_matrix(feat_month, mon_vars), glm['xmin'][k_month], glm['xmax'][k_month])
+
+    # Índices en params (con el intercepto en 0)
+    p_loc = np.concatenate([[0], k_loc+1])
+    p_month = k_month+1
+    params, cov = glm['params'], glm['cov']
+
+    return {'X_loc': X_loc, 'X_month': X_month,
+            'eta_loc': X_loc.dot(params[p_loc]), 'eta_month': X_month.dot(params[p_month]),
+            'var_loc': np.einsum('ij,jk,ik->i', X_loc, cov[np.ix_(p_loc, p_loc)], X_loc),
+            'var_month': np.einsum('ij,jk,ik->i', X_month, cov[np.ix_(p_month, p_month)], X_month),
+            'cross': cov[np.ix_(p_loc, p_month)].dot(X_month.T)}
+
+
+# Calcula el cubo de un grupo y lo escribe en out (arreglo (3, localidades, meses)), por bloques de localidades
+def fill_cube(out, model, feat_loc, feat_month, z, block=4096):
+
+    glm = model['glm']
+    if glm['cov'] is None:
+        raise ValueError('Los modelos no tienen la matriz de covarianzas de los coeficientes (glm_cov)')
+
+    parts = glm_parts(glm, feat_loc, feat_month)
+    inv_link = glm['inv_link']
+    for i in range(0, out.shape[1], block):
+        sl = slice(i, i+block)
+        eta = parts['eta_loc'][sl, None] + parts['eta_month'][None, :]
+        var = parts['var_loc'][sl, None] + parts['var_month'][None, :] + 2*parts['X_loc'][sl].dot(parts['cross'])
+        se = np.sqrt(np.maximum(var, 0))
+        out[0, sl] = inv_link(eta)
+        out[1, sl] = inv_link(eta - z*se)
+        out[2, sl] = inv_link(eta + z*se)
+
+
+# Guarda en el directorio path los cubos de todos los grupos de models_dict (n_hosp), para las localidades
+# de loc_feat y los meses fechas (FECHA); level es el nivel de confianza de los límites
+def save_cubes(models_dict, loc_feat, fechas, path, level=0.95, dtype='float32'):
+
+    models = models_from_dict(models_dict)
+    fechas = np.asarray(fechas, dtype='int64')
+    locs = loc_feat.index.to_numpy(dtype=str)
+    z = stats.norm.ppf(0.5 + level/2)
+
+    # Variables base de cada localidad y de cada mes, comunes a todos los grupos
+    rows_loc = pd.DataFrame({'ENTIDAD': [l[:2] for l in locs], 'MUNIC': [l[2:5] for l in locs],
+                             'LOC': [l[5:] for l in locs], 'FECHA': np.nan})
+    feat_loc = base_features(rows_loc, loc_feat)
+    feat_month = {'FECHA': fechas.astype('float64'), 'MES': month_names[(fechas-1) % 12].astype(object)}
+
+    # Se escribe en un directorio temporal para no dejar cubos incompletos
+    tmp_path = path.rstrip('/') + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    index = {'version': CUBE_VERSION, 'level': level, 'layers': cube_layers, 'dtype': dtype,
+             'fechas': fechas.tolist(), 'months': fecha_labels(fechas),
+             'localities': 'localities.npy', 'groups': {}}
+    np.save(os.path.join(tmp_path, index['localities']), locs)
+    for i, (grp, model) in enumerate(models.items()):
+        grp_dir = f'g{i:04d}'
+        os.makedirs(os.path.join(tmp_path, grp_dir))
+        out = np.lib.format.open_memmap(os.path.join(tmp_path, grp_dir, 'cube.npy'), mode='w+', dtype=dtype,
+                                        shape=(len(cube_layers), len(locs), len(fechas)))
+        fill_cube(out, model, feat_loc, feat_month, z)
+        out.flush()
+        del out
+        index['groups'][grp] = grp_dir
+    with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+# Índice de los cubos guardados en path, con las posiciones de las localidades y los meses
+def load_cubes(path):
+
+    with open(os.path.join(path, 'index.json')) as f:
+        index = json.load(f)
+    if index['version']!=CUBE_VERSION:
+        raise ValueError(f"Versión de cubos no soportada: {index['version']} (se esperaba {CUBE_VERSION})")
+
+    return {'path': path, 'index': index,
+            'loc': pd.Index(np.load(os.path.join(path, index['localities']))),
+            'fecha': pd.Index(index['fechas']),
+            'cubes': {}}
+
+
+# Cubo (3, localidades, meses) de un grupo, mapeado en memoria
+def load_cube(cubes, grp):
+
+    if grp not in cubes['cubes']:
+        grp_path = os.path.join(cubes['path'], cubes['index']['groups'][grp])
+        cubes['cubes'][grp] = np.load(os.path.join(grp_path, 'cube.npy'), mmap_mode='r')
+
+    return cubes['cubes'][grp]
+
+
+# Corte del cubo de un grupo para las localidades locs y los meses fechas (todos si son None):
+# un arreglo (localidades, meses) por capa (N_HOSP, LOWER, UPPER)
+def cube_slice(cubes, grp, locs=None, fechas=None):
+
+    cube = load_cube(cubes, grp)
+    i = slice(None) if locs is None else cubes['loc'].get_indexer(locs)
+    j = slice(None) if fechas is None else cubes['fecha'].get_indexer(fechas)
+    for k, name in [(i, 'Localidades'), (j, 'Meses')]:
+        if not isinstance(k, slice) and (k<0).any():
+            raise KeyError(f'{name} no disponibles en los cubos')
+
+    v = cube[:, i][:, :, j]
+
+    return {layer: v[k] for k, layer in enumerate(cube_layers)}
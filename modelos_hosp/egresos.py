@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Carga y preparación de los egresos hospitalarios, defunciones y afecciones.
+"""
+
+import os
+import sqlite3
+import pathlib
+import numpy as np
+import pandas as pd
+
+from .cache import cached_frames
+from .cie_index import build_cie_index
+
+
+# Columnas de EGRESO que se agregan a las defunciones
+defu_egre_vars = ['DIAGNOSTICO', 'AFECCION', 'DIAS', 'EDAD', 'SEXO', 'PESO', 'TALLA', 'PROCED', 'DERHAB', 'VEZ', 'ENTIDAD', 'MUNIC', 'LOC', 'INGRESO']
+
+# Columnas de EGRESO que usan los modelos (lectura por bloques)
+egre_vars = ['FOLIO', 'CLUES', 'EGRESO', 'INGRESO', 'DIAGNOSTICO', 'AFECCION', 'DIAS', 'EDAD', 'SEXO', 'PESO', 'PROCED', 'DERHAB', 'VEZ', 'ENTIDAD', 'MUNIC', 'LOC']
+
+# Columnas que ya no se usan una vez construidos el identificador y las variables de fecha
+drop_vars = ['FOLIO', 'CLUES', 'EGRESO', 'INGRESO', 'QN', 'DIA_SEMANA']
+
+# Tipos reducidos para la lectura por bloques
+cat_vars = ['SEXO', 'PROCED', 'DERHAB', 'VEZ', 'ENTIDAD', 'MUNIC', 'LOC']
+int_vars = {'EDAD': 'Int16', 'DIAS': 'Int16'}
+
+
+# Consulta de las defunciones, con los datos de su egreso
+def query_defu(q_cond, egre_sel=defu_egre_vars):
+
+    egre_sel = ', '.join('EGRESO.'+x for x in egre_sel)
+
+    return f'SELECT DEFUNC.*, {egre_sel} \
+                FROM DEFUNC \
+                INNER JOIN EGRESO on EGRESO.FOLIO = DEFUNC.FOLIO AND EGRESO.CLUES = DEFUNC.CLUES AND EGRESO.EGRESO = DEFUNC.EGRESO \
+                WHERE (DEFUNC.{q_cond} AND (EGRESO.ENTIDAD="09"))'
+
+
+# Lectura de las tablas de egresos, defunciones y afecciones de la base de datos
+def read_egresos(cfg):
+
+    q_cond = cfg.q_cond
+    con = sqlite3.connect(os.path.join(cfg.base_dir, cfg.db))
+
+    df_afec = pd.read_sql_query(f'SELECT * FROM AFECCIONES WHERE {q_cond}', con)
+    df_egre = pd.read_sql_query(f'SELECT * FROM EGRESO WHERE ({q_cond} AND (ENTIDAD="09"))', con)
+    df_defu = pd.read_sql_query(query_defu(q_cond), con)
+
+    con.close()
+
+    return df_egre, df_defu, df_afec
+
+
+# Índices para filtrar los egresos por código CIE y unirlos con las defunciones: nombre, tabla y columnas
+db_indexes = [('IDX_EGRESO_DIAGNOSTICO', 'EGRESO', ['DIAGNOSTICO']),
+              ('IDX_EGRESO_AFECCION', 'EGRESO', ['AFECCION']),
+              ('IDX_EGRESO_KEY', 'EGRESO', ['FOLIO', 'CLUES', 'EGRESO']),
+              ('IDX_DEFUNC_CAUSA', 'DEFUNC', ['CAUSA']),
+              ('IDX_DEFUNC_KEY', 'DEFUNC', ['FOLIO', 'CLUES', 'EGRESO'])]
+
+
+# Conexión de solo lectura a la base de datos (las consultas por grupo no la modifican)
+def connect_ro(cfg):
+
+    uri = pathlib.Path(cfg.base_dir, cfg.db).absolute().as_uri()
+
+    return sqlite3.connect(uri+'?mode=ro', uri=True)
+
+
+# Crea los índices de db_indexes en la base de datos (modifica el archivo; solo con --create-indexes)
+def create_indexes(cfg):
+
+    con = sqlite3.connect(os.path.join(cfg.base_dir, cfg.db))
+    for name, table, cols in db_indexes:
+        con.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(cols)})')
+    con.commit()
+    con.close()
+
+
+# Índices de db_indexes que faltan; basta cualquier índice de la tabla que empiece con las mismas columnas
+def missing_indexes(con):
+
+    idx_cols = {}
+    for table in {table for _, table, _ in db_indexes}:
+        idx_cols[table] = [[col[2] for col in con.execute(f'PRAGMA index_info("{idx[1]}")')]
+                           for idx in con.execute(f'PRAGMA index_list("{table}")')]
+
+    return [name for name, table, cols in db_indexes
+            if not any(c[:len(cols)]==cols for c in idx_cols[table])]
+
+
+# Número de egresos por afección, diagnóstico y si terminaron en defunción (DEFU), calculado en la base de datos
+def read_egre_pairs(cfg, con):
+
+    q_cond = cfg.q_cond
+    n_egre_pairs = pd.read_sql_query(f'SELECT AFECCION, DIAGNOSTICO, \
+                                     EXISTS (SELECT 1 FROM DEFUNC WHERE DEFUNC.FOLIO = EGRESO.FOLIO AND DEFUNC.CLUES = EGRESO.CLUES \
+                                             AND DEFUNC.EGRESO = EGRESO.EGRESO AND DEFUNC.{q_cond}) AS DEFU, \
+                                     COUNT(*) AS N \
+                                     FROM EGRESO WHERE ({q_cond} AND (ENTIDAD="09")) \
+                                     GROUP BY AFECCION, DIAGNOSTICO, DEFU', con)
+    n_egre_pairs['DEFU'] = n_egre_pairs.DEFU.astype(bool)
+
+    return n_egre_pairs
+
+
+# Número de egresos por afección, diagnóstico y si terminaron en defunción (DEFU)
+def count_egre_pairs(df_egre, df_defu):
+
+    # Las columnas categóricas (lectura por bloques o cache) se agrupan como texto para conservar los nulos
+    pairs = restore_dtypes(df_egre[['AFECCION', 'DIAGNOSTICO']])
+    n_egre_pairs = pairs.assign(DEFU=df_egre['ID'].isin(df_defu['ID'])).groupby(['AFECCION', 'DIAGNOSTICO', 'DEFU'], dropna=False).size()
+
+    return n_egre_pairs.rename('N').reset_index()
+
+
+# Número de defunciones por causa básica
+def count_defu_cie(df_defu):
+
+    return restore_dtypes(df_defu[['CAUSA']]).groupby('CAUSA')['CAUSA'].count()
+
+
+# Lee de la base de datos (consulta parametrizada) los egresos sin defunción de los códigos CIE del grupo
+def read_grp_egresos(cfg, cie_x, df_defu):
+
+    con = connect_ro(cfg)
+    con.execute('CREATE TEMP TABLE GRP_CIE (CAUSA TEXT PRIMARY KEY)')
+    con.executemany('INSERT OR IGNORE INTO GRP_CIE VALUES (?)', [(x,) for x in cie_x])
+
+    # Se conserva el orden de la tabla para obtener los mismos registros que sin la consulta por grupo
+    df = pd.read_sql_query(f'SELECT * FROM EGRESO \
+                           WHERE ({cfg.q_cond} AND (ENTIDAD="09") \
+                           AND (AFECCION IN (SELECT CAUSA FROM GRP_CIE) OR DIAGNOSTICO IN (SELECT CAUSA FROM GRP_CIE))) \
+                           ORDER BY rowid', con)
+    con.close()
+
+    df = add_date_features(add_id(clean_egresos(df)))
+    df = df.loc[~df['ID'].isin(df_defu['ID']),]
+
+    return add_y_egre(df)
+
+
+# Limpieza de los egresos (o defunciones): espacios en DERHAB y outliers
+def clean_egresos(df):
+
+    # remover espacio al final (array(['0 ', '8 ', 'G ', '9 ', '6 ', '2 '], dtype=object))
+    df.DERHAB = df.DERHAB.str[:-1]
+
+    # Eliminar outliers
+    df.loc[df.EDAD>120,'EDAD'] = np.nan
+    df.loc[df.PESO>250,'PESO'] = np.nan
+    if 'TALLA' in df:
+        df.loc[df.TALLA>250,'TALLA'] = np.nan
+
+    return df
+
+
+# Identificador de registro: hash de 64 bits de FOLIO, CLUES y día de egreso.
+# No depende de los demás registros, por lo que coincide entre tablas, bloques y consultas por grupo.
+def record_id(folio, clues, egreso):
+
+    key = pd.DataFrame({'FOLIO': folio.map(str), 'CLUES': clues.map(str), 'EGRESO': egreso.dt.normalize()})
+
+    return pd.util.hash_pandas_object(key, index=False).to_numpy().view('int64')
+
+
+# Se construye un identificador único de registro
+def add_id(df):
+
+    df.EGRESO = pd.to_datetime(df.EGRESO)
+    df['ID'] = record_id(df['FOLIO'], df['CLUES'], df['EGRESO'])
+
+    return df
+
+
+# Variables de fecha a partir de la fecha de ingreso
+def add_date_features(df):
+
+    df.INGRESO = pd.to_datetime(df.INGRESO)
+
+    # Fecha como un valor numerico del mes-año
+    df['FECHA'] = df.INGRESO.dt.month + 12*(df.INGRESO.dt.year-2015)
+    df['MES'] = df.INGRESO.dt.month_name()
+    df['QN'] = df.INGRESO.dt.quarter
+    df['ANIO'] = df.INGRESO.dt.year
+    df['DIA_SEMANA'] = df.INGRESO.dt.day_name()
+
+    return df
+
+
+# Tabla de defunciones por causa, con cuartiles de edad y proporción por sexo
+def cie_def_table(df_defu, n_defu_cie_bas, cie):
+
+    df_defu = restore_dtypes(df_defu[['CAUSA', 'EDAD', 'SEXO']])
+
+    # Por edad
+    edad_cie = df_defu.pivot_table(['EDAD'],
+                   ['CAUSA'],
+                    aggfunc=lambda x: [np.percentile(x, [25, 50, 75])],
+        )
+    edad_cie = pd.DataFrame(np.asmatrix(list(map(lambda a:a[0],edad_cie.EDAD))),
+                 index=edad_cie.index,
+                 columns=['edad_Q1', 'edad_Q2', 'edad_Q3',])
+    edad_cie_def = pd.concat([edad_cie, cie.loc[edad_cie.index,'Nombre']], axis=1)
+
+    # Por sexo
+    sexo_cie = df_defu.pivot_table(['SEXO'],
+                   ['CAUSA'],
+                    aggfunc=lambda x: np.round([np.mean(x=='F'), np.mean(x=='M')],3),
+        )
+    sexo_cie_def = pd.DataFrame(np.asmatrix(list(sexo_cie.SEXO)),
+                     index=sexo_cie.index,
+                     columns=['SEXO_F', 'SEXO_M'])
+
+    idx_sel = edad_cie_def.index.isin(n_defu_cie_bas.index) # should be 100%
+    cie_def = edad_cie_def.loc[idx_sel,].copy()
+    cie_def.loc[:,'count'] = n_defu_cie_bas.loc[cie_def.index,'count']
+
+    cie_def[['SEXO_F', 'SEXO_M']] = sexo_cie_def.loc[cie_def.index,['SEXO_F', 'SEXO_M']]
+
+    # Por edad y sexo
+    cie_def = cie_def[['edad_Q1', 'edad_Q2', 'edad_Q3', 'SEXO_F', 'SEXO_M', 'Nombre', 'count']].sort_values(by=['count'], ascending=False)
+
+    return cie_def
+
+
+# Variable Y de los egresos sin defunción: menos días con menos severidad
+def add_y_egre(df_egre_not_defu, max_d=150):
+
+    # avoid warnings using assign
+    df_egre_not_defu = df_egre_not_defu.assign(Y=0.0)
+
+    fx = np.log(df_egre_not_defu.DIAS.astype('float64')+1)-np.log(max_d+1)
+    fx[fx>0] = 0
+    df_egre_not_defu['Y'] = 1/(1+np.exp(-1.0*fx))
+
+    return df_egre_not_defu
+
+
+# Variable Y de las defunciones: menos días con más severidad
+def add_y_defu(df_defu, max_d=150):
+
+    # avoid warnings using assign
+    df_defu = df_defu.assign(Y=1.0)
+
+    # Create Y as 0-1
+    fx = np.log(max_d+1)-np.log(df_defu.DIAS.astype('float64')+1)
+    fx[fx<0] = 0
+    df_defu['Y'] = 1/(1+np.exp(-1.0*fx))
+
+    return df_defu
+
+
+# Calcular la variable dependiente Y
+# Usa días de hospitalización como variable de severidad y afecciones
+# relaciona menos días en defunciones con más severidad
+# menos días en egresos (no defunc) con menos severidad
+def add_y(df_egre_not_defu, df_defu, max_d=150):
+
+    return add_y_egre(df_egre_not_defu, max_d), add_y_defu(df_defu, max_d)
+
+
+# Reduce la memoria de un bloque de registros: elimina las columnas que no se usan y reduce los tipos
+def downcast(df):
+
+    df = df.drop(columns=[x for x in drop_vars if x in df])
+    for col in df.columns.intersection(cat_vars):
+        df[col] = df[col].astype('category')
+    for col in df.columns.intersection(list(int_vars)):
+        df[col] = df[col].astype(int_vars[col])
+
+    return df
+
+
+# Regresa a texto y float64 las columnas con tipos reducidos (para tablas pequeñas, como las de un grupo)
+def restore_dtypes(df):
+
+    dtypes = {}
+    for col, t in df.dtypes.items():
+        if isinstance(t, pd.CategoricalDtype):
+            dtypes[col] = object
+        elif pd.api.types.is_extension_array_dtype(t) and pd.api.types.is_integer_dtype(t):
+            dtypes[col] = 'float64'
+
+    return df.astype(dtypes) if dtypes else df
+
+
+# Une los bloques de una tabla, combinando las categorías de las columnas categóricas
+def concat_chunks(chunks):
+
+    cols = {}
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            cols[col] = pd.api.types.union_categoricals([x[col] for x in chunks])
+        else:
+            cols[col] = pd.concat([x[col] for x in chunks], ignore_index=True)
+
+    return pd.DataFrame(cols)
+
+
+# Lectura por bloques de cfg.chunk_size registros, conservando solo las columnas usadas y con tipos reducidos.
+# Las tablas de conteo se acumulan bloque a bloque.
+def read_egresos_chunks(cfg):
+
+    q_cond = cfg.q_cond
+    chunk_size = cfg.chunk_size
+    con = sqlite3.connect(os.path.join(cfg.base_dir, cfg.db))
+
+    # Primero las defunciones, para identificar los egresos que terminaron en defunción
+    df_defu = []
+    n_defu_cie = []
+    for chunk in pd.read_sql_query(query_defu(q_cond, [x for x in defu_egre_vars if x!='TALLA']), con, chunksize=chunk_size):
+        chunk = add_date_features(add_id(clean_egresos(chunk)))
+        n_defu_cie.append(count_defu_cie(chunk))
+        df_defu.append(downcast(chunk))
+    df_defu = concat_chunks(df_defu)
+    n_defu_cie = pd.concat(n_defu_cie).groupby(level=0).sum()
+
+    df_egre = []
+    n_egre_pairs = []
+    for chunk in pd.read_sql_query(f'SELECT {", ".join(egre_vars)} FROM EGRESO WHERE ({q_cond} AND (ENTIDAD="09"))', con, chunksize=chunk_size):
+        chunk = add_date_features(add_id(clean_egresos(chunk)))
+        n_egre_pairs.append(count_egre_pairs(chunk, df_defu))
+        df_egre.append(downcast(chunk))
+    df_egre = concat_chunks(df_egre)
+    n_egre_pairs = pd.concat(n_egre_pairs).groupby(['AFECCION', 'DIAGNOSTICO', 'DEFU'], dropna=False)['N'].sum().reset_index()
+
+    df_afec = []
+    for chunk in pd.read_sql_query(f'SELECT FOLIO, CLUES, EGRESO, AFEC FROM AFECCIONES WHERE {q_cond}', con, chunksize=chunk_size):
+        df_afec.append(downcast(add_id(chunk)))
+    df_afec = concat_chunks(df_afec)
+
+    con.close()
+
+    return {'df_egre': df_egre, 'df_defu': df_defu, 'df_afec': df_afec,
+            'n_egre_pairs': n_egre_pairs, 'n_defu_cie': n_defu_cie}
+
+
+# Lectura y preparación (limpieza, identificador y fechas) de las tablas de la base de datos
+def prep_egresos(cfg):
+
+    if cfg.chunk_size:
+        return read_egresos_chunks(cfg)
+
+    df_egre, df_defu, df_afec = read_egresos(cfg)
+
+    df_egre = clean_egresos(df_egre)
+    df_defu = clean_egresos(df_defu)
+
+    # Se transforma la fecha a variable de tiempo
+    df_egre = add_id(df_egre)
+    df_defu = add_id(df_defu)
+    df_afec = add_id(df_afec)
+
+    df_egre = add_date_features(df_egre)
+    df_defu = add_date_features(df_defu)
+
+    return {'df_egre': df_egre, 'df_defu': df_defu, 'df_afec': df_afec}
+
+
+# Carga y prepara los egresos para generar los modelos
+def load_data(cfg, ref):
+
+    cie = ref['cie']
+
+    if cfg.create_indexes:
+        create_indexes(cfg)
+
+    if cfg.db_grps:
+        # Solo las defunciones se cargan completas, los egresos de cada grupo se leen al generar su modelo.
+        # La base de datos no se modifica: sin los índices las consultas por grupo recorren toda la tabla
+        con = connect_ro(cfg)
+        missing = missing_indexes(con)
+        if missing:
+            print(f'Faltan los índices {", ".join(missing)}: las consultas de cada grupo recorren toda la tabla EGRESO '
+                  '(se crean con --create-indexes)')
+        df_defu = pd.read_sql_query(query_defu(cfg.q_cond), con)
+        n_egre_pairs = read_egre_pairs(cfg, con)
+        con.close()
+
+        df_defu = add_date_features(add_id(clean_egresos(df_defu)))
+        n_defu_cie = count_defu_cie(df_defu)
+        df_egre = df_afec = df_egre_not_defu = None
+    else:
+        # Con cache_dir las tablas preparadas se leen de (o se guardan en) la cache en disco
+        if cfg.cache_dir:
+            frames = cached_frames(cfg, prep_egresos)
+        else:
+            frames = prep_egresos(cfg)
+        df_egre, df_defu, df_afec = frames['df_egre'], frames['df_defu'], frames['df_afec']
+
+        # Con la lectura por bloques las tablas de conteo ya vienen calculadas
+        n_egre_pairs = frames['n_egre_pairs'] if 'n_egre_pairs' in frames else count_egre_pairs(df_egre, df_defu)
+        n_defu_cie = frames['n_defu_cie'] if 'n_defu_cie' in frames else count_defu_cie(df_defu)
+        df_egre_not_defu =  df_egre.loc[~df_egre['ID'].isin(df_defu['ID']),]
+
+
+    # tablas de conteo para los diagnósticos
+    n_egre_cie = n_egre_pairs.groupby('DIAGNOSTICO')['N'].sum().rename('DIAGNOSTICO').sort_values(ascending=False)
+    n_defu_cie_bas = n_defu_cie.sort_values(ascending=False)
+    n_defu_cie_bas = pd.concat([n_defu_cie_bas, cie.loc[n_defu_cie_bas.index,'Nombre']], axis=1)
+    n_defu_cie_bas.rename(columns = {'CAUSA':'count'}, inplace = True)
+
+    cie_def = cie_def_table(df_defu, n_defu_cie_bas, cie)
+
+
+    # lista de códigos CIE para las defunciones en la base de datos
+    causas_defu = pd.Series(df_defu.CAUSA.unique()).astype(object)
+    egre_not_defu = n_egre_pairs[~n_egre_pairs.DEFU]
+    cie_xcat = causas_defu[~(causas_defu.isin(egre_not_defu.AFECCION) + causas_defu.isin(egre_not_defu.DIAGNOSTICO))]
+    cie_xcat = cie_xcat[cie_xcat.isin(cie_def.index)].values
+    cie_def.drop(cie_xcat, axis=0, inplace=True)
+
+    n_egre_in_def_cie = n_egre_cie[n_egre_cie.index.isin(cie_def.index)]
+
+    # al menos 20 defunciones con esa causa (por posibles CIE que se pusieron como causa de del pero no lo son)
+    n_egre_in_def_cie = n_egre_in_def_cie[cie_def['count'][n_egre_in_def_cie.index]>20]
+
+
+    df_defu = add_y_defu(df_defu)
+    if df_egre_not_defu is not None:
+        df_egre_not_defu = add_y_egre(df_egre_not_defu)
+
+
+    # Índices invertidos de códigos CIE, para seleccionar los registros de cada grupo sin recorrer toda la tabla
+    defu_cie_idx = build_cie_index(df_defu, ['AFECCION', 'DIAGNOSTICO', 'CAUSA'])
+    egre_cie_idx = build_cie_index(df_egre_not_defu, ['AFECCION', 'DIAGNOSTICO']) if df_egre_not_defu is not None else None
+
+    return {'df_egre': df_egre, 'df_defu': df_defu, 'df_afec': df_afec,
+            'df_egre_not_defu': df_egre_not_defu, 'n_egre_pairs': n_egre_pairs,
+            'egre_cie_idx': egre_cie_idx, 'defu_cie_idx': defu_cie_idx,
+            'n_egre_cie': n_egre_cie, 'n_defu_cie_bas': n_defu_cie_bas,
+            'cie_def': cie_def, 'n_egre_in_def_cie': n_egre_in_def_cie}
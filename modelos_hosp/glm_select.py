@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Ajustes de GLM para el proceso iterativo de selección de variables.
+
+La matriz de diseño numérica (intercepto y todas las variables candidatas) se
+construye una sola vez por grupo; en cada iteración se toman sus columnas por
+índice, sin volver a interpretar la fórmula con patsy, y el IRLS inicia en los
+coeficientes de la iteración anterior (las variables nuevas inician en cero).
+Con la misma matriz y el inicio por omisión, el resultado es igual al de la
+fórmula. Solo el modelo final (el que se guarda) se vuelve a ajustar con la
+fórmula, para conservar predict() sobre DataFrames.
+
+Como la búsqueda suele volver a conjuntos de variables ya ajustados, cada grupo
+puede usar una cache LRU de ajustes, con llave el conjunto de variables, la
+familia y su liga.
+
+nb_fit_batch ajusta en un solo IRLS vectorizado varios modelos binomiales
+negativos (liga log) que comparten la matriz de diseño y difieren en los
+conteos, en los registros usados (máscara), en las columnas usadas o en alpha;
+nb_screen además estima el alpha de cada modelo. Así se hacen los ajustes
+iniciales de todos los grupos de nhosp a la vez (ver nhosp.screen_grps).
+"""
+
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy import stats, special
+import statsmodels.api as sm
+import statsmodels.formula.api as smf
+
+
+# Matriz de diseño con el intercepto y todas las columnas de data excepto y
+def glm_design(data, y='Y'):
+
+    cols = data.columns.drop(y)
+    if any(isinstance(dt, pd.SparseDtype) for dt in data[cols].dtypes):
+        # Con dummies dispersas se guarda como CSC y solo se convierten a densas las columnas de cada ajuste
+        X = sp.hstack([np.ones((len(data), 1)),
+                       data[cols].astype(pd.SparseDtype('float64', 0)).sparse.to_coo()], format='csc')
+    else:
+        X = np.empty((len(data), len(cols)+1))
+        X[:, 0] = 1
+        X[:, 1:] = data[cols].to_numpy(dtype='float64')
+
+    return {'X': X, 'y': data[y].to_numpy(dtype='float64'),
+            'names': pd.Index(['Intercept']).append(cols)}
+
+
+# Columnas (intercepto y var_lst) de la matriz de diseño y registros sin valores nulos
+def design_cols(design, var_lst):
+
+    idx = design['names'].get_indexer(var_lst)
+    if any(idx<1):
+        raise KeyError(f'Variables no encontradas en la matriz de diseño: {np.array(var_lst)[idx<1]}')
+
+    idx = np.concatenate([[0], idx])
+    if sp.issparse(design['X']):
+        X = design['X'][:, idx].toarray(order='C')
+    else:
+        X = design['X'].take(idx, axis=1) # take: copia en orden C, igual que la fórmula
+    y = design['y']
+
+    # Igual que con la fórmula, se descartan los registros con valores nulos
+    ok = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+    if not ok.all():
+        X, y = X[ok], y[ok]
+
+    return design['names'][idx], X, y, ok
+
+
+# Cache LRU de ajustes (de un grupo), con sus contadores de aciertos y fallos
+def glm_cache(max_size=256):
+
+    return {'fits': OrderedDict(), 'max_size': max_size, 'hits': 0, 'misses': 0}
+
+
+# Llave del cache de un ajuste; los pesos son los mismos dentro de un grupo, basta saber si se usan
+def glm_cache_key(var_lst, family, freq_weights=None):
+
+    return (frozenset(var_lst), type(family).__name__, type(family.link).__name__,
+            getattr(family, 'alpha', None), freq_weights is not None)
+
+
+# Guarda en el cache un ajuste hecho fuera de glm_fit (con el formato de glm_fit)
+def glm_cache_put(cache, sel):
+
+    cache['fits'][glm_cache_key(sel['vars'], sel['family'], sel['freq_weights'])] = sel
+    if len(cache['fits'])>cache['max_size']:
+        cache['fits'].popitem(last=False)
+
+
+# Ajusta el GLM con las variables var_lst; start son los coeficientes (por nombre) con los que inicia el IRLS.
+# Con cache, un conjunto de variables ya ajustado regresa el resultado guardado (en el orden de var_lst).
+def glm_fit(design, var_lst, family, freq_weights=None, start=None, cache=None):
+
+    var_lst = list(var_lst)
+    if cache is not None:
+        key = glm_cache_key(var_lst, family, freq_weights)
+        sel = cache['fits'].get(key)
+        if sel is not None:
+            cache['hits'] += 1
+            cache['fits'].move_to_end(key)
+            names = ['Intercept'] + var_lst
+            return dict(sel, vars=var_lst, params=sel['params'][names], pvalues=sel['pvalues'][names])
+
+        cache['misses'] += 1
+        sel = glm_fit(design, var_lst, family, freq_weights, start)
+        glm_cache_put(cache, sel)
+        return sel
+
+    names, X, y, ok = design_cols(design, var_lst)
+    w = freq_weights
+    if w is not None and not ok.all():
+        w = np.asarray(w)[ok]
+
+    start_params = None
+    if start is not None:
+        start_params = start.reindex(names).fillna(0).to_numpy()
+
+    res = sm.GLM(y, X, family=family, freq_weights=w).fit(start_params=start_params)
+
+    return {'vars': var_lst,
+            'params': pd.Series(res.params, index=names),
+            'pvalues': pd.Series(res.pvalues, index=names),
+            'aic': res.aic,
+            'family': family,
+            'freq_weights': freq_weights}
+
+
+# Predicción (en la escala de la respuesta) del ajuste de glm_fit para los registros de data
+def glm_predict(sel, data):
+
+    X = np.empty((len(data), len(sel['vars'])+1))
+    X[:, 0] = 1
+    X[:, 1:] = data[sel['vars']].to_numpy(dtype='float64')
+
+    return pd.Series(sel['family'].fitted(np.dot(X, sel['params'].to_numpy())), index=data.index)
+
+
+# Vuelve a ajustar con la fórmula el modelo elegido por glm_fit
+def glm_formula_fit(data, sel, family):
+
+    return smf.glm('Y~'+'+'.join(sel['vars']), data=data, family=family,
+                   freq_weights=sel['freq_weights']).fit()
+
+
+# Devianza binomial negativa de cada columna de Y (registros con peso M)
+def nb_deviance(Y, mu, alpha, M):
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_mu = np.where(Y>0, Y*np.log(np.maximum(Y/mu, np.finfo(float).eps)), 0)
+    y_a, mu_a = Y+1/alpha, mu+1/alpha
+
+    return 2*np.sum(M*(y_mu - y_a*np.log(y_a/mu_a)), axis=0)
+
+
+# Log-verosimilitud binomial negativa de cada columna de Y (registros con peso M)
+def nb_loglike(Y, mu, alpha, M):
+
+    ll = Y*np.log(alpha*mu) - (Y+1/alpha)*np.log(1+alpha*mu)
+    ll += special.gammaln(Y+1/alpha) - special.gammaln(1/alpha) - special.gammaln(Y+1)
+
+    return np.sum(M*ll, axis=0)
+
+
+# X'WX de cada columna de W, por bloques de modelos para que el producto intermedio (modelos, p, n)
+# no pase de max_elems elementos
+def weighted_gram(X, W, max_elems=2**24):
+
+    n, p = X.shape
+    G = W.shape[1]
+    step = max(1, max_elems//max(n*p, 1))
+    out = np.empty((G, p, p))
+    for i in range(0, G, step):
+        XtW = X.T[None, :, :]*W[:, i:i+step].T[:, None, :]
+        out[i:i+step] = np.matmul(XtW, X)
+
+    return out
+
+
+# Ajusta por IRLS (igual que statsmodels) un modelo binomial negativo con liga log por cada columna de Y.
+# X (n, p) es común e incluye la constante; mask (n, G) indica los registros de cada modelo, cols (G, p)
+# las columnas de X de cada modelo (las demás quedan con coeficiente 0) y alpha puede ser un valor por
+# modelo. Las iteraciones son vectorizadas sobre los modelos que no han convergido.
+def nb_fit_batch(X, Y, alpha=1.0, mask=None, cols=None, maxiter=100, tol=1e-8):
+
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    if Y.ndim==1:
+        Y = Y[:, None]
+    n, G = Y.shape
+    p = X.shape[1]
+    M = np.ones((n, G)) if mask is None else np.asarray(mask, dtype='float64')
+    alpha = np.broadcast_to(np.asarray(alpha, dtype='float64'), (G,))
+    C = None if cols is None else np.broadcast_to(np.asarray(cols, dtype=bool), (G, p))
+
+    # Fuera de la máscara los conteos no se usan; se reemplazan para evitar valores no finitos
+    Y = np.where(M>0, Y, 0)
+
+    # Inicio igual que statsmodels: mu = (y + media(y))/2
+    mu = (Y + (M*Y).sum(axis=0)/M.sum(axis=0))/2
+    eta = np.log(mu)
+    dev = nb_deviance(Y, mu, alpha, M)
+
+    params = np.zeros((G, p))
+    cov = np.zeros((G, p, p))
+    n_iter = np.zeros(G, dtype=int)
+    active = np.ones(G, dtype=bool)
+    for it in range(maxiter):
+        g = np.flatnonzero(active)
+        if len(g)==0:
+            break
+
+        # Pesos y respuesta de trabajo de los modelos activos
+        W = M[:, g]*mu[:, g]/(1+alpha[g]*mu[:, g])
+        z = eta[:, g] + (Y[:, g]-mu[:, g])/mu[:, g]
+
+        XtWX = weighted_gram(X, W)
+        XtWz = X.T.dot(W*z)
+        if C is not None:
+            # Las columnas que no usa un modelo se separan con un bloque identidad y sin respuesta
+            Cg = C[g]
+            XtWX = np.where(Cg[:, :, None] & Cg[:, None, :], XtWX, np.eye(p)[None, :, :])
+            XtWz = np.where(Cg.T, XtWz, 0)
+        cov[g] = np.linalg.pinv(XtWX, hermitian=True)
+        params[g] = np.einsum('gij,jg->gi', cov[g], XtWz)
+        if C is not None:
+            params[g] = np.where(Cg, params[g], 0)
+
+        eta[:, g] = X.dot(params[g].T)
+        mu[:, g] = np.exp(eta[:, g])
+        dev_g = nb_deviance(Y[:, g], mu[:, g], alpha[g], M[:, g])
+        n_iter[g] += 1
+        active[g[np.abs(dev_g-dev[g])<=tol]] = False
+        dev[g] = dev_g
+
+    bse = np.sqrt(np.einsum('gii->gi', cov))
+    llf = nb_loglike(Y, mu, alpha, M)
+    XtMX = weighted_gram(X, M)
+    if C is not None:
+        bse = np.where(C, bse, np.nan)
+        cov = np.where(C[:, :, None] & C[:, None, :], cov, np.nan)
+        XtMX = np.where(C[:, :, None] & C[:, None, :], XtMX, 0)
+    rank = np.linalg.matrix_rank(XtMX, hermitian=True)
+
+    return {'params': params,
+            'cov': cov,
+            'bse': bse,
+            'pvalues': 2*stats.norm.sf(np.abs(params/bse)),
+            'llf': llf,
+            'aic': -2*llf + 2*rank,
+            'deviance': dev,
+            'mu': mu,
+            'n_iter': n_iter,
+            'converged': ~active}
+
+
+# Ajustes binomiales negativos de varios modelos (columnas de Y, con sus máscaras de registros y de columnas,
+# como en nb_fit_batch) con alpha fijo o estimado por modelo: 'mom' por momentos (regresión auxiliar de
+# Cameron y Trivedi sobre el ajuste con alpha=1) o 'profile' como el máximo del perfil de verosimilitud en
+# alpha_grid (todos los modelos y valores de alpha en un solo IRLS). Regresa el alpha de cada modelo y el
+# resultado de nb_fit_batch con ese alpha
+def nb_screen(X, Y, alpha=1.0, mask=None, cols=None, alpha_grid=np.geomspace(0.01, 10, 31)):
+
+    Y = np.asarray(Y, dtype='float64')
+    if Y.ndim==1:
+        Y = Y[:, None]
+    n, G = Y.shape
+    M = np.ones((n, G)) if mask is None else np.asarray(mask, dtype='float64')
+
+    if isinstance(alpha, str) and alpha=='mom':
+        mu = nb_fit_batch(X, Y, 1.0, M, cols)['mu']
+        Y0 = np.where(M>0, Y, 0)
+        alpha = np.sum(M*((Y0-mu)**2 - Y0), axis=0)/np.sum(M*mu**2, axis=0)
+        alpha = np.clip(alpha, alpha_grid[0], alpha_grid[-1])
+    elif isinstance(alpha, str) and alpha=='profile':
+        K = len(alpha_grid)
+        C = None if cols is None else np.repeat(np.broadcast_to(cols, (G, np.shape(X)[1])), K, axis=0)
+        res = nb_fit_batch(X, np.repeat(Y, K, axis=1), np.tile(alpha_grid, G), np.repeat(M, K, axis=1), C)
+        k = np.arange(G)*K + np.array([np.nanargmax(llf) for llf in res['llf'].reshape(G, K)])
+        res = {key: v[:, k] if key=='mu' else v[k] for key, v in res.items()}
+        return alpha_grid[k % K], res
+    elif isinstance(alpha, str):
+        raise ValueError(f'Método no válido para estimar alpha: {alpha}')
+
+    alpha = np.broadcast_to(np.asarray(alpha, dtype='float64'), (G,))
+
+    return alpha, nb_fit_batch(X, Y, alpha, M, cols)
+
+
+# Estima una sola vez el alpha de la binomial negativa con las variables var_lst ('mom' o 'profile', ver nb_screen)
+def nb_alpha(design, var_lst, method='profile', alpha_grid=np.geomspace(0.01, 10, 31)):
+
+    _, X, y, _ = design_cols(design, list(var_lst))
+    if method not in ('mom', 'profile'):
+        raise ValueError(f'Método no válido para estimar alpha: {method}')
+
+    return float(nb_screen(X, y, method, alpha_grid=alpha_grid)[0][0])
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Grupos de códigos CIE a modelar, según el tipo de análisis (CFG.grp).
+"""
+
+import pandas as pd
+
+
+# Número de egresos con afección o diagnóstico en la lista de códigos CIE
+def count_regs(n_egre_pairs, cie_lst):
+
+    idx = (n_egre_pairs.AFECCION.isin(cie_lst)) + (n_egre_pairs.DIAGNOSTICO.isin(cie_lst))
+
+    return n_egre_pairs.N[idx].sum()
+
+
+# Número de defunciones con causa básica en la lista de códigos CIE, de la tabla de conteo por causa
+def count_defu(n_defu_cie, cie_lst):
+
+    return n_defu_cie.reindex(pd.unique(pd.Series(cie_lst, dtype=object)), fill_value=0).sum()
+
+
+# Determinar la lista de códigos CIE o de grupos a utilizar según la configuración
+def build_groups(cfg, ref, data):
+
+    cie = ref['cie']
+    n_egre_pairs = data['n_egre_pairs']
+    n_defu_cie = data['n_defu_cie_bas']['count']
+
+    cie_grp = {}
+    cie_grp_desc = {}
+    grp_n_regs = {}
+
+    if cfg.grp == 'HE':
+        for i,grp in enumerate(ref['hosp_e_cat']):
+            # Códigos de la categoría con los hijos de los códigos de 3 caracteres (ver load_catalogs)
+            cie_grp[grp] = list(ref['hosp_e_cie'][grp])
+            cie_grp_desc[grp] = ref['cie_hosp_gdesc'].ES_Desc[grp]
+            grp_n_regs[grp] = count_regs(n_egre_pairs, cie_grp[grp])
+
+
+    if cfg.grp == 'PC':
+        pcau_padre = cie.PCAU_PADRE_DESC.dropna().unique()
+        for i,grp in enumerate(pcau_padre):
+            cie_lst = cie.index[cie.PCAU_PADRE_DESC == grp].tolist()
+            grp_id = cie_lst[0]+'-'+cie_lst[-1]
+            cie_grp[grp_id] = cie_lst
+            cie_grp_desc[grp_id] = grp
+            grp_n_regs[grp_id] = count_regs(n_egre_pairs, cie_lst)
+            if cfg.use_defu:
+                grp_n_regs[grp_id] = count_defu(n_defu_cie, cie_lst)
+
+
+    if cfg.grp == 'CM':
+        cie_lst = cie.index[cie.PCAU_PADRE_DESC == 'Diabetes mellitus'].tolist()
+        n_egre_in_def_cie = data['n_egre_in_def_cie']
+        idx = n_egre_in_def_cie.index.isin(cie_lst)
+        idx_cie = n_egre_in_def_cie.index[idx]
+        for i,grp in enumerate(idx_cie):
+            cie_grp[grp] = [grp]
+            cie_grp_desc[grp] = cie.Nombre[grp]
+            grp_n_regs[grp] = count_regs(n_egre_pairs, [grp])
+
+
+    df_grp = pd.DataFrame(data={'grp':cie_grp.keys(), 'cie':cie_grp.values(), 'desc':cie_grp_desc.values(), 'n_regs':grp_n_regs.values()})
+    df_grp = df_grp.sort_values(by=['n_regs'], ascending=False).reset_index(drop=True)
+    df_grp.set_index('grp', inplace=True)
+
+    return df_grp
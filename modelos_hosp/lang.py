@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Traducciones usadas en la salida de resultados.
+"""
+
+
+# Traducción de variables de fecha
+day_es = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+day_en = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+day_en_es = {day_en[i]: day_es[i] for i in range(len(day_en))}
+
+month_es = ("Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre")
+month_en = ("January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December")
+month_en_es = {month_en[i]: month_es[i] for i in range(len(month_en))}
+
+# Traducción de algunos grupos de enfermedades
+grp_en = {}
+grp_en['DC'] = '[E10–E14] Diabetes mellitus'
+grp_en['E112'] = '[E112] Type 2 diabetes mellitus with kidney complications'
+grp_en['E117'] = '[E117] Type 2 diabetes mellitus with multiple complications'
+grp_en['E145'] = '[E145] Unspecified diabetes mellitus: with peripheral circulatory complication'
+grp_en['E118'] = '[E118] Type 2 diabetes mellitus with unspecified complications'
+
+
+grp_en['E10-E149'] = 'Diabetes mellitus'
+grp_en['A15-Z999'] = 'Other'
+grp_en['J09X-U049'] = 'Influenza and Pneumonia'
+grp_en['K70-K769'] = 'Liver diseases'
+grp_en['I00X-I519'] = 'Heart diseases'
+grp_en['U072-U072'] = 'COVID-19, virus unidentified'
+grp_en['I60-I698'] = 'Cerebrovascular Diseases'
+grp_en['A33X-P969'] = 'Certain conditions originating in the perinatal period'
+grp_en['U071-U071'] = 'COVID-19, virus identified'
+grp_en['N17-N19X'] = 'Renal insufficiency'
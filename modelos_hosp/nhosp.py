@@ -0,0 +1,847 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+MODELO DE REGRESIÓN BINOMIAL NEGATIVA PARA PREDECIR EL NÚMERO DE HOSPITALIZACIONES
+
+Se genera un modelo por grupo de códigos CIE, a partir de los datos de
+referencia (load_ref_data) y de los egresos (load_data) ya cargados.
+"""
+
+import os
+import pickle
+import pandas as pd
+import numpy as np
+import statsmodels.api as sm
+from scipy import stats
+
+from .cie_index import cie_rows
+from .egresos import read_grp_egresos, restore_dtypes
+from .glm_select import glm_cache, glm_cache_put, glm_design, glm_fit, glm_formula_fit, nb_alpha, nb_screen
+from .groups import build_groups
+from .lang import month_en_es, grp_en
+from .parallel import map_grps
+from .rankcorr import rank_corr, corr_sub
+from .prep import MinMaxScaler, col_std, scale_masks
+from .plots import PlotRenderer
+
+
+# Variables socioeconómicas y de contaminantes de las que se cuenta cuantas veces fueron relevantes
+inegi_fa_vars = ['F_ECONOM', 'F_SOCIAL']
+cont_fa_vars = ['PM_CO', 'NO2_NOx', 'SO2_NO_O3']
+
+
+
+# Agregación de los registros por celda (key): Y es el número de registros de la celda, las variables
+# numéricas se promedian y las categóricas (constantes en cada celda) se convierten en dummies ya agregadas.
+# cat_vars indica para cada variable categórica si se elimina la primera dummy (drop_first).
+# Evita construir las dummies por registro, por lo que la memoria depende del número de celdas.
+# Con sparse=True las dummies se guardan como columnas dispersas (ceros implícitos).
+def cell_aggregate(X, key, cat_vars, sparse=False):
+
+    g = X.groupby(key)
+    num_vars = X.columns.drop([key, 'Y'] + list(cat_vars))
+
+    X_cell = g[num_vars].mean()
+    X_cell.insert(0, 'Y', g.size())
+
+    X_cat = g[list(cat_vars)].first()
+    for col, drop_first in cat_vars.items():
+        dtype = pd.SparseDtype('float64', 0) if sparse else 'float64'
+        X_cell = pd.concat((X_cell, pd.get_dummies(X_cat[col], prefix=col, drop_first=drop_first, sparse=sparse).astype(dtype)), axis=1)
+
+    return X_cell
+
+
+
+#------------------------------------------------------------------
+# Celdas (MES_ANIO_LOC) de un grupo de códigos CIE, escaladas y divididas en entrenamiento y validación
+#------------------------------------------------------------------
+def grp_cells(grp, cfg, ref, data, df_grp):
+
+    df_egre_not_defu = data['df_egre_not_defu']
+    df_defu = data['df_defu']
+    egre_cie_idx = data['egre_cie_idx']
+    defu_cie_idx = data['defu_cie_idx']
+    cie = ref['cie']
+    cie_c = ref['cie_c']
+    nom_ent = ref['nom_ent']
+    loc_feat = ref['loc_feat']
+
+
+    # Resultados del grupo, se combinan al terminar todos los grupos
+    res = {'grp': grp, 'stats': None, 'models_dict': None}
+
+    # Codigos CIE y descripcion para el grupo actual
+    cie_x = df_grp.cie[grp]
+    cie_x_desc  = df_grp.desc[grp]
+
+
+    # Determinar la lista de registros que cumplen con el grupo a estudiar
+    if cfg.db_grps:
+        df_egre_cie = read_grp_egresos(cfg, cie_x, df_defu)
+    else:
+        df_egre_cie = df_egre_not_defu.iloc[cie_rows(egre_cie_idx, cie_x)]
+    df_defu_cie = df_defu.iloc[cie_rows(defu_cie_idx, cie_x)]
+    id_lst = pd.concat([df_egre_cie.ID, df_defu_cie.ID])
+
+    tmp = []
+
+
+    # Se reinicia semilla para cada grupo a estudiar
+    np.random.seed(cfg.seed)
+
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Data Frame
+    #------------------------------------------------------------------
+
+    vars_n = ['Y', 'EDAD', 'SEXO', 'PESO', 'PROCED', 'VEZ', 'ENTIDAD', 'MUNIC', 'LOC', 'FECHA', 'MES', 'ANIO']
+    tmp = pd.concat([df_egre_cie[vars_n], df_defu_cie[vars_n]], axis=0).set_index(id_lst)
+
+    X_df = restore_dtypes(tmp)
+
+    X_df.isnull().sum()
+    X_df['EDAD'].fillna(X_df['EDAD'].median(), inplace = True)
+    X_df['PESO'].fillna(X_df['PESO'].median(), inplace = True)
+
+    # La variable TALLA no es confiable, por lo que no se usa
+    #X_df['TALLA'].fillna(X_df['TALLA'].median(), inplace = True)
+
+
+
+
+    #------------- VARIABLES SOCIOECONOMICAS  ------------------
+    loc_id = pd.DataFrame(X_df['ENTIDAD'] + X_df['MUNIC'] + X_df['LOC'], columns=['loc'])
+
+
+    # Posición de cada localidad en la tabla de indicadores por localidad (-1 si no existe)
+    loc_k = loc_feat.index.get_indexer(loc_id['loc'])
+    idx_avail_loc = loc_k>=0
+    res['prop_ine'] = idx_avail_loc.mean()
+
+    X_df = X_df[idx_avail_loc]
+    loc_id = loc_id[idx_avail_loc]
+
+    # Indicadores socioeconómicos y de contaminantes de las localidades de los registros
+    X_loc = pd.DataFrame(loc_feat.to_numpy()[loc_k[idx_avail_loc]], index=X_df.index, columns=loc_feat.columns)
+    X_df = pd.concat([X_df, X_loc[inegi_fa_vars + ['POBTOT', 'POB0_14', 'POB15_64', 'POB65_MAS', 'REL_H_M', 'POB_AREA']]], axis=1)
+
+    X_df['E_MUN'] = X_df['ENTIDAD'] + X_df['MUNIC']
+    X_df.drop(['MUNIC', 'LOC'], axis=1, inplace=True)
+    #-------------------
+
+    X_df['MES_ANIO_LOC'] =  X_df['MES'] + '_' + X_df['ANIO'].astype(str) + '_' + loc_id['loc']
+
+
+
+    #------------- VARIABLES DE CONTAMINANTES  ------------------
+    X_df = pd.concat([X_df, X_loc[cont_fa_vars]], axis=1)
+    #-------------------
+
+
+
+
+    # Predictoras
+    X = X_df.copy()
+
+    # Incluir otras variables categóricas a través de dummies
+    # (E_MUN, ENTIDAD y MES son constantes en cada celda MES_ANIO_LOC, sus dummies se agregan por celda)
+    X = pd.concat((X, pd.get_dummies(X['SEXO'], prefix='SEXO', drop_first=True)), axis=1)
+
+    y = X['Y']
+    X.drop(['SEXO', 'PROCED', 'VEZ'], axis=1, inplace=True)
+    X.drop(['ANIO'], axis=1, inplace=True)
+    X_df.drop(['ENTIDAD'], axis=1, inplace=True)
+    bool_cols = X.columns[X.dtypes=='bool']
+    X[bool_cols] = X[bool_cols].astype('int')
+    X.dtypes.unique()
+    X.reset_index(drop=True, inplace=True)
+    y.reset_index(drop=True, inplace=True)
+
+
+
+    # Eliminar algunos outliers encontrados y errores de captura
+    if any((X.EDAD==0) * (X.PESO>10)):
+        X.loc[(X.EDAD==0) * (X.PESO>10),'PESO'] = X.PESO[X.EDAD==0].median()
+    if np.quantile(X.EDAD, 0.995)==0 and X.EDAD.max()>0: # Para cuando la mayoria son edad 0
+        X.loc[X.EDAD>0,'EDAD'] = 0
+
+    data_err1 = (X.EDAD>10) * (X.PESO<10)
+    data_err2 = (X.PESO==9.999) + (X.PESO==9.099) + (X.PESO==0.999)
+    if any(data_err1):             # Pesos sin sentido por culpa de variaviones de 999
+        X.loc[data_err1,'PESO'] = X.PESO[~data_err1].median()
+    if any(data_err2):             # variaciones de 999, como 9, 9.99, 0.99 u otros para pesos no especificados
+        X.loc[data_err2,'PESO'] = X.PESO[~data_err2].median()
+
+
+    # Incluir contaminantes, socioeconómicas
+    main_var = pd.Series(['EDAD', 'PESO', 'SEXO_M', 'F_ECONOM', 'F_SOCIAL', 'PM_CO', 'NO2_NOx', 'SO2_NO_O3'])
+    main_var = main_var[main_var.isin(X.columns)] # Algunas como SEXO_M podrian no existir por ser todas mujeres
+    X_main = X[main_var]
+    X.drop(['EDAD', 'PESO', 'SEXO_M'], axis=1, inplace=True, errors='ignore')
+
+
+
+    # -------------------------------------------------
+    # ----- X y Y por mes, se usa media o mediana, y se puede eliminar o no valores 0
+    # ----- Y es el número ce casos por mes y localidad
+    # -------------------------------------------------
+    X = cell_aggregate(X, 'MES_ANIO_LOC', {'E_MUN': False, 'ENTIDAD': True, 'MES': False}, sparse=cfg.sparse_dummies)
+
+
+
+    # Reescalar los predictores
+    scaler = MinMaxScaler().fit(X)
+    X_s, xmin, xmax = scaler.transform(X), scaler.xmin, scaler.xmax
+    X_s['Y'] = X['Y']
+
+
+
+
+
+
+    # Correlaciones (Spearman) con Y; las de pares de variables se calculan al pedirlas con corr_sub
+    y_corr = rank_corr(X_s)
+    corr_y = y_corr['corr_y'][1:].to_frame('Y')
+    best_vars = y_corr['corr_y'].abs().sort_values(ascending=False).index
+
+
+    msk = np.random.rand(len(X_s)) < cfg.train_prop
+    train_std = X_s.columns[col_std(X_s[msk])>0]
+
+    X_s = X_s[train_std]
+    X = X[train_std]
+
+    # train and test set
+    train = X_s[msk]
+    test = X_s[~msk]
+
+    return {'res': res, 'cie_x': cie_x, 'cie_x_desc': cie_x_desc, 'X': X, 'msk': msk,
+            'train': train, 'test': test, 'xmin': xmin, 'xmax': xmax, 'scaler': scaler,
+            'y_corr': y_corr, 'corr_y': corr_y}
+
+
+# Variables candidatas (correlación mínima con Y, de mayor a menor) y las iniciales de la selección
+def init_vars(corr_y, train, init_n_vars=10):
+
+    # Se inicia solo con las variables que tienen una correlación mínima
+    # El valor umbral es pequeño ya que la relación puede ser no lineal
+    best_vars_cor = corr_y.Y.abs()[(corr_y.Y.abs()>0.01)].sort_values(ascending=False).index
+    best_vars_cor = best_vars_cor[best_vars_cor.isin(train.columns)]
+
+    sif_vars = pd.Series(best_vars_cor)[:init_n_vars]
+
+    return best_vars_cor, sif_vars[sif_vars.isin(train.columns)]
+
+
+# Datos de un grupo para los ajustes iniciales de screen_grps: variables iniciales (sin escalar) y conteos
+# de sus celdas, registros usados (entrenamiento y sin valores nulos) y límites para escalar los coeficientes.
+# Incluye las celdas del grupo (grp_cells) para que gen_modelo no las vuelva a construir
+def screen_input(grp, cfg, ref, data, df_grp):
+
+    cells = grp_cells(grp, cfg, ref, data, df_grp)
+    _, sif_vars = init_vars(cells['corr_y'], cells['train'])
+    X = cells['X'][list(sif_vars)].astype('float64')
+
+    return {'grp': grp, 'cells': cells, 'vars': list(sif_vars), 'X': X, 'Y': cells['X']['Y'].to_numpy(dtype='float64'),
+            'ok': cells['msk'] & ~X.isna().any(axis=1).to_numpy(),
+            'xmin': cells['xmin'][list(sif_vars)], 'xmax': cells['xmax'][list(sif_vars)]}
+
+
+# Ajustes iniciales (binomial negativa con las variables iniciales) de todos los grupos en un solo IRLS.
+# Las variables de las celdas solo dependen de la localidad o del mes, por lo que son las mismas en todos
+# los grupos: la matriz de diseño es una sola, con las celdas MES_ANIO_LOC de todos los grupos y las variables
+# sin escalar, y cada grupo tiene su columna de conteos y máscaras de sus celdas de entrenamiento y de sus
+# variables. Como el escalamiento es lineal, los coeficientes de cada grupo (y su covarianza) se pasan a la
+# escala de sus variables (0-1): el ajuste es el primero de su selección de variables, con el formato de
+# glm_fit. Regresa las celdas de cada grupo y, si su ajuste convergió, su alpha y su ajuste inicial.
+def screen_grps(inputs, alpha=1.0):
+
+    # Celdas de todos los grupos; cada variable se toma del primer grupo que la tiene
+    var_lst = pd.Index([v for s in inputs for v in s['vars']]).unique()
+    X_all = pd.concat([s['X'] for s in inputs]).groupby(level=0, sort=False).first()
+    X = np.ones((len(X_all), len(var_lst)+1))
+    X[:, 1:] = X_all.reindex(columns=var_lst).fillna(0).to_numpy(dtype='float64')
+
+    Y = np.zeros((len(X_all), len(inputs)))
+    M = np.zeros((len(X_all), len(inputs)), dtype=bool)
+    C = np.zeros((len(inputs), len(var_lst)+1), dtype=bool)
+    C[:, 0] = True
+    for g, s in enumerate(inputs):
+        pos = X_all.index.get_indexer(s['X'].index)
+        Y[pos, g] = s['Y']
+        M[pos[s['ok']], g] = True
+        C[g, 1:] = var_lst.isin(s['vars'])
+
+    # Solo los grupos con registros de entrenamiento
+    fit_g = np.flatnonzero(M.sum(axis=0)>0)
+    alpha, fit = nb_screen(X, Y[:, fit_g], alpha, M[:, fit_g], C[fit_g])
+
+    screens = {s['grp']: {'cells': s['cells']} for s in inputs}
+    for k, g in enumerate(fit_g):
+        s = inputs[g]
+        if not fit['converged'][k] or not np.isfinite(fit['params'][k]).all():
+            continue
+
+        # x_s = (x-xmin)/(xmax-xmin) en las variables que se escalan (las demás ya están en 0-1):
+        # b_s = A b con A = [[1, x0], [0, diag(d)]] y la covarianza A cov A'
+        cols = np.r_[0, 1+var_lst.get_indexer(s['vars'])]
+        _, scale = scale_masks(s['xmin'], s['xmax'])
+        d = np.where(scale, s['xmax']-s['xmin'], 1)
+        x0 = np.where(scale, s['xmin'], 0)
+        A = np.diag(np.r_[1, d])
+        A[0, 1:] = x0
+        params = A.dot(fit['params'][k, cols])
+        cov = A.dot(fit['cov'][k][np.ix_(cols, cols)]).dot(A.T)
+        names = ['Intercept'] + s['vars']
+        screens[s['grp']].update({'alpha': float(alpha[k]),
+                                  'fit': {'vars': s['vars'],
+                                          'params': pd.Series(params, index=names),
+                                          'pvalues': pd.Series(2*stats.norm.sf(np.abs(params/np.sqrt(np.diag(cov)))), index=names),
+                                          'aic': fit['aic'][k]}})
+
+    return screens
+
+
+#------------------------------------------------------------------
+# Modelo de un grupo de códigos CIE
+#------------------------------------------------------------------
+def gen_modelo(grp, cfg, ref, data, df_grp, screens=None):
+
+    # Las celdas ya construidas en screen_input, o se construyen aquí
+    screen = screens.get(grp) if screens else None
+    cells = screen['cells'] if screen is not None else grp_cells(grp, cfg, ref, data, df_grp)
+    res, cie_x, cie_x_desc = cells['res'], cells['cie_x'], cells['cie_x_desc']
+    train, test = cells['train'], cells['test']
+    xmin, xmax, scaler = cells['xmin'], cells['xmax'], cells['scaler']
+    y_corr, corr_y = cells['y_corr'], cells['corr_y']
+
+    cie = ref['cie']
+    cie_c = ref['cie_c']
+    nom_ent = ref['nom_ent']
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Regresion Binomial Negativa (Variable selection)
+    #------------------------------------------------------------------
+    #
+    # Regresion Binomial Negativa con selección de variables. Sólo se mantienen las
+    # variables que contribuyen significativamente al modelo para que éste sea
+    # lo más parsimonioso posible y reducir el problema de la multicolinealidad.
+
+    # Se incluyen penalizaciones en el proceso de selección de variables teniendo
+    # en cuenta el problema de la multicolinealidad y la paradoja de Simpson, como
+    # no permitir que el signo de la variable sea diferente del signo de
+    # correlación a menos que la contribución al modelo sea significativa
+    # al hacerlo.
+
+    # Todas estas consideraciones mantienen la interpretabilidad del modelo.
+
+    # El algoritmo prueba eliminando variables con poca significación estadística
+    # y mantiene los modelos con mejor AIC considerando las penalizaciones
+    # mencionadas. Cambien prueba incluyendo variables de forma iterativa,
+    # incluyendo aquellas con mejor correlación con la variable dependiente.
+
+
+
+    # Se inicia solo con las variables que tienen una correlación mínima (las 10 primeras)
+    best_vars_cor, sif_vars = init_vars(corr_y, train)
+    sif_vars0 = pd.Series(best_vars_cor)
+
+
+    p_vals = pd.Series([1,1,1,0])
+    p_var = p_vals
+    n_it = 0
+    n_it_ch = 0
+    n_forw = 0
+
+    max_n_it_ch = 2*len(best_vars_cor)
+    max_p_val = 0.15
+    max_p_val_final = 0.05
+    delta_p = 0.001
+    keep_going = False
+
+    removed_vars = np.array([])
+    prev_ic = np.inf
+    best_ic = np.inf
+    ic_tol = 1e-9 # Tolerancia relativa para comparar la función objetivo
+
+    pob_vars = ['POBTOT', 'POB0_14', 'POB15_64', 'POB65_MAS']
+    neg_vars = np.concatenate([cont_fa_vars, inegi_fa_vars, pob_vars])
+    neg_v = np.inf
+    n_nvars = neg_vars.shape[0]
+    l_neg = 0.2   # Penalizacion que busca principalmente variables que aumentan el riesgo
+    l_cor = 0.025 # Penalizacion para variables que cambian el signo en su correlacion
+
+
+
+    # Matriz de diseño con todas las variables candidatas, se construye una sola vez
+    design = glm_design(train)
+
+    # alpha fijo o estimado una sola vez por grupo (con las variables iniciales) y usado en toda la selección.
+    # Con los ajustes iniciales de todos los grupos (screen_grps) ya se tienen alpha y el primer ajuste
+    alpha = cfg.nb_alpha
+    start = None
+    init_fit = None
+    if screen is not None and 'fit' in screen:
+        alpha = screen['alpha']
+    elif isinstance(alpha, str):
+        alpha = nb_alpha(design, sif_vars, alpha)
+    if isinstance(cfg.nb_alpha, str):
+        print(f'NB alpha ({cfg.nb_alpha}) para {grp}: {alpha:.3}')
+    family = sm.families.NegativeBinomial(alpha=alpha)
+    cache = glm_cache(cfg.glm_cache_size) if cfg.glm_cache_size else None
+    if screen is not None and 'fit' in screen:
+        init_fit = dict(screen['fit'], family=family, freq_weights=None)
+        if cache is not None:
+            glm_cache_put(cache, init_fit)
+
+    # proceso iterativo de selección de variables
+    while (n_it-n_it_ch)<max_n_it_ch:
+
+        # Ajuste con las columnas de la matriz de diseño, iniciando en los coeficientes anteriores
+        # (el primero es el de screen_grps, si lo hay)
+        if init_fit is not None:
+            cie_model, init_fit = init_fit, None
+        else:
+            cie_model = glm_fit(design, sif_vars, family, start=start, cache=cache)
+        start = cie_model['params']
+
+
+        p_vals = cie_model['pvalues'][1:]
+
+        if len(sif_vars)>1:
+            p_var = (p_vals<max([p_vals.max()-delta_p, max_p_val]))
+        else:
+            p_var = (p_vals<=1)
+
+
+        # Probar el eliminar variables con coeficientes contradictorios
+        reg_vars = pd.DataFrame(cie_model['params'][1:], columns=['Coef'])
+        coef_var = reg_vars[reg_vars.index.isin(neg_vars)] # solo inegi, contaminantes y poblacion
+        var_ok = coef_var['Coef']
+        var_ok = var_ok[var_ok<0]
+
+        if all(p_var):
+            if var_ok.shape[0]>0 and len(sif_vars)>1:
+                worst_var = p_vals[var_ok.index.values].sort_values(ascending=False).index[0]
+                p_var[worst_var] = False
+
+
+
+        keep_going = False
+        if p_vals.var()<1e-4 and p_var.size>15:
+            p_var = (p_vals>-1).cumsum()<=15 # Si todos los p-values son iguales, probablemente indica un error, mantener solo N variables
+            keep_going = True
+
+
+        # antes de cambiar las variables, calcular correlacion media para penalizar
+        nv = len(sif_vars)
+        avg_corr = 0
+        if len(sif_vars)>1:
+            avg_corr = corr_sub(y_corr, sif_vars).abs()
+            avg_corr = avg_corr[avg_corr<1].max().max()
+
+        sif_vars = p_var.index[p_var]
+
+        # Función objetivo a optimizar para elegir el mejor modelo
+        cur_ic = (cie_model['aic'])*(1+l_neg*var_ok.shape[0]/n_nvars)*(1+l_cor*avg_corr)
+
+
+
+        if all(p_var):
+            no_vars = sif_vars0[~sif_vars0.isin(sif_vars)].values
+            new_var = np.array([no_vars[n_forw%no_vars.shape[0]]])
+            sif_vars = np.unique(np.concatenate([sif_vars, new_var]))
+            n_forw += 1
+
+        # Con el inicio en los coeficientes anteriores, el mismo modelo puede variar en ~1e-12 en el AIC,
+        # por lo que solo se considera mejor si lo es por más que esa tolerancia
+        if (cur_ic<best_ic*(1-ic_tol) and var_ok.shape[0]<=neg_v) or n_it==1:
+            best_ic = cur_ic
+            neg_v = var_ok.shape[0]
+            best_reg_model = cie_model
+            n_it_ch = n_it
+            n_forw = 0 # reset the search with every new model
+
+        removed_vars = p_var.index[~p_var]
+        prev_ic = cur_ic
+        n_it += 1
+
+
+
+    best_p_vals = best_reg_model['pvalues'][1:]
+    while any(best_p_vals>max_p_val_final) and len(best_p_vals)>1:
+        sif_vars = best_p_vals.index[best_p_vals<best_p_vals.max()]
+
+        best_reg_model = glm_fit(design, sif_vars, family, start=best_reg_model['params'], cache=cache)
+
+        best_p_vals = best_reg_model['pvalues'][1:]
+
+
+
+
+    # Utilizar el modelo con los mejores valores encontrados (ajustado con la fórmula)
+    cie_model = glm_formula_fit(train, best_reg_model, family)
+    if cache is not None:
+        res['glm_cache'] = {'hits': cache['hits'], 'misses': cache['misses']}
+
+    pred_train = cie_model.fittedvalues
+    pred_test = cie_model.predict(test)
+
+    # Buscar outliers grandes
+    idx_outlier = (pred_test>pred_test.quantile(0.75)*100)
+    if any(idx_outlier):
+        test = test[~idx_outlier]
+        pred_test = pred_test[~idx_outlier]
+
+
+    pred_err_train = np.abs(1-(pred_train.dot(train.Y))/(pred_train.dot(pred_train))) # abs(1-beta_regression) : (x'x)^-1 * x'y
+    pred_err_test = np.abs(1-(pred_test.dot(test.Y))/(pred_test.dot(pred_test)))
+    corr_test = np.corrcoef(test.Y, pred_test)[1,0]
+
+    p_vals = cie_model.pvalues[1:]
+
+
+
+
+
+
+    # stats
+    reg_vars = pd.DataFrame(cie_model.params[1:], columns=['Coef'])
+    res['stats'] = {'id':grp, 'name':cie_x_desc,
+                    'inegi_vars':reg_vars.index.isin(inegi_fa_vars).sum(),
+                    'cont_vars':reg_vars.index.isin(cont_fa_vars).sum(),
+                    'emun':reg_vars.index.str.contains('^E_MUN_', regex=True).sum(),
+                    'reg_err':pred_err_test, 'reg_cor':corr_test,
+                    'time':reg_vars.index.str.contains('FECHA').sum(),
+                    'sexo_m':reg_vars.index.str.contains('REL_H_M').sum(),
+                    'neg_v':(reg_vars[reg_vars.index.isin(neg_vars)]['Coef']<0).sum(),
+                    'only_pobtot':int(any(reg_vars.index.str.contains('POBTOT')) and reg_vars.shape[0]==1),
+                    'cronic':pd.Series(cie_x).isin(cie_c['cie']).mean(),
+                    'pred_outliers':idx_outlier.sum(),
+                    'n_cases':train.shape[0] + test.shape[0]}
+
+
+    #------------------------------------------------------------------
+    # Printing
+    #------------------------------------------------------------------
+
+    # Se grefican los resultados
+
+    if pred_err_test<1:
+
+        print(f'Negative Binomial Model [{grp} - {cie_x_desc}]')
+        print(cie_model.summary())
+
+        p_val = cie_model.pvalues[1:]
+        reg_vars_n = pd.DataFrame(cie_model.params[1:].sort_values(ascending=False), columns=['Coef'])
+        reg_vars_n = reg_vars_n.assign(Desc='')
+
+        cie_in_reg = reg_vars_n.index[reg_vars_n.index.isin(cie.index)].values
+        if cie_in_reg.shape[0]>0:
+            reg_vars_n.loc[cie_in_reg,'Desc'] = cie.loc[cie_in_reg, 'Nombre']
+
+
+        emun_vars = reg_vars_n.index.str.contains('^E_MUN_', regex=True)
+        if emun_vars.sum()>0:
+            emun_vals = (reg_vars_n.index[emun_vars].str.extract(r'^E_MUN_(.*)', expand=True)+'0001').values.flatten()
+            reg_vars_n.loc[emun_vars,'Desc'] = 'Residencia: ' + nom_ent[emun_vals].values
+
+        month_vars = reg_vars_n.index.str.contains('^MES_', regex=True)
+        if month_vars.sum()>0:
+            month_vals = (reg_vars_n.index[month_vars].str.extract(r'^MES_(.*)', expand=True)).values.flatten()
+            reg_vars_n.loc[month_vars,'Desc'] = ['Mes de ' + month_en_es[i] for i in month_vals]
+
+
+        if any('SEXO_M'==reg_vars_n.index):
+            reg_vars_n.loc['SEXO_M','Desc'] = 'Sexo masculino'
+        if any('EDAD'==reg_vars_n.index):
+            reg_vars_n.loc['EDAD','Desc'] = 'Edad del paciente'
+        if any('PESO'==reg_vars_n.index):
+            reg_vars_n.loc['PESO','Desc'] = 'Peso del paciente'
+        if any('FECHA'==reg_vars_n.index):
+            reg_vars_n.loc['FECHA','Desc'] = 'Fecha de ingreso del paciente'
+        if any('NO2_NOx'==reg_vars_n.index):
+            reg_vars_n.loc['NO2_NOx','Desc'] = 'Contaminantes NO2 y NOX'
+        if any('PM_CO'==reg_vars_n.index):
+            reg_vars_n.loc['PM_CO','Desc'] = 'Contaminantes PM10, PM2.5 y CO'
+        if any('SO2_NO_O3'==reg_vars_n.index):
+            reg_vars_n.loc['SO2_NO_O3','Desc'] = 'Contaminantes SO2, NO y O3'
+        if any('F_ECONOM'==reg_vars_n.index):
+            reg_vars_n.loc['F_ECONOM','Desc'] = 'Factor Economico / Vivienda'
+        if any('F_SOCIAL'==reg_vars_n.index):
+            reg_vars_n.loc['F_SOCIAL','Desc'] = 'Factor Social'
+
+        if any('POBTOT'==reg_vars_n.index):
+            reg_vars_n.loc['POBTOT','Desc'] = 'Población total'
+        if any('REL_H_M'==reg_vars_n.index):
+            reg_vars_n.loc['REL_H_M','Desc'] = 'Hombres por cada 100 mujeres'
+        if any('P_0A2'==reg_vars_n.index):
+            reg_vars_n.loc['P_0A2','Desc'] = 'Población de 0 a 2 años'
+        if any('P_18A24'==reg_vars_n.index):
+            reg_vars_n.loc['P_18A24','Desc'] = 'Población de 18 a 24 años'
+        if any('P_60YMAS'==reg_vars_n.index):
+            reg_vars_n.loc['P_60YMAS','Desc'] = 'Población de 60 años y más'
+        if any('POB0_14'==reg_vars_n.index):
+            reg_vars_n.loc['POB0_14','Desc'] = 'Población de 0 a 14 años'
+        if any('POB15_64'==reg_vars_n.index):
+            reg_vars_n.loc['POB15_64','Desc'] = 'Población de 15 a 64 años'
+        if any('POB65_MAS'==reg_vars_n.index):
+            reg_vars_n.loc['POB65_MAS','Desc'] = 'Población de 65 años y más'
+        if any('POB_AREA'==reg_vars_n.index):
+            reg_vars_n.loc['POB_AREA','Desc'] = 'Densidad de población'
+
+        par_lname = pd.DataFrame(reg_vars_n.index.values, columns=['Name'], index=reg_vars_n.index.values).copy()
+        if cfg.lang=='EN':
+            if any('SEXO_M'==reg_vars_n.index):
+                reg_vars_n.loc['SEXO_M','Desc'] = 'Male sex'
+            if any('EDAD'==reg_vars_n.index):
+                reg_vars_n.loc['EDAD','Desc'] = 'Patient\'s age'
+            if any('PESO'==reg_vars_n.index):
+                reg_vars_n.loc['PESO','Desc'] = 'Patient\'s weight'
+            if any('FECHA'==reg_vars_n.index):
+                reg_vars_n.loc['FECHA','Desc'] = 'Patient\'s admission date'
+            if any('NO2_NOx'==reg_vars_n.index):
+                reg_vars_n.loc['NO2_NOx','Desc'] = 'Pollutants NO2 and NOX'
+            if any('PM_CO'==reg_vars_n.index):
+                reg_vars_n.loc['PM_CO','Desc'] = 'Pollutants PM10, PM2.5 and CO'
+            if any('SO2_NO_O3'==reg_vars_n.index):
+                reg_vars_n.loc['SO2_NO_O3','Desc'] = 'Pollutants SO2, NO and O3'
+            if any('F_ECONOM'==reg_vars_n.index):
+                reg_vars_n.loc['F_ECONOM','Desc'] = 'Economic Factor / Housing'
+            if any('F_SOCIAL'==reg_vars_n.index):
+                reg_vars_n.loc['F_SOCIAL','Desc'] = 'Social Factor'
+
+            if any('POBTOT'==reg_vars_n.index):
+                reg_vars_n.loc['POBTOT','Desc'] = 'Total Population'
+            if any('REL_H_M'==reg_vars_n.index):
+                reg_vars_n.loc['REL_H_M','Desc'] = 'Males per 100 females'
+            if any('P_0A2'==reg_vars_n.index):
+                reg_vars_n.loc['P_0A2','Desc'] = 'Population 0 to 2 y/o'
+            if any('P_18A24'==reg_vars_n.index):
+                reg_vars_n.loc['P_18A24','Desc'] = 'Population 18 to 24 y/o'
+            if any('P_60YMAS'==reg_vars_n.index):
+                reg_vars_n.loc['P_60YMAS','Desc'] = 'Population 60 y/o and over'
+            if any('POB0_14'==reg_vars_n.index):
+                reg_vars_n.loc['POB0_14','Desc'] = 'Population 0-14 y/o'
+            if any('POB15_64'==reg_vars_n.index):
+                reg_vars_n.loc['POB15_64','Desc'] = 'Population 15 to 64 y/o'
+            if any('POB65_MAS'==reg_vars_n.index):
+                reg_vars_n.loc['POB65_MAS','Desc'] = 'Population 65 y/o and over'
+            if any('POB_AREA'==reg_vars_n.index):
+                reg_vars_n.loc['POB_AREA','Desc'] = 'Population density'
+
+            if emun_vars.sum()>0:
+                emun_vals = (reg_vars_n.index[emun_vars].str.extract(r'^E_MUN_(.*)', expand=True)+'0001').values.flatten()
+                reg_vars_n.loc[emun_vars,'Desc'] = 'Residence: ' + nom_ent[emun_vals].values
+
+            month_vars = reg_vars_n.index.str.contains('^MES_', regex=True)
+            if month_vars.sum()>0:
+                month_vals = (reg_vars_n.index[month_vars].str.extract(r'^MES_(.*)', expand=True)).values.flatten()
+                reg_vars_n.loc[month_vars,'Desc'] = ['Month of ' + month_en_es[i] for i in month_vals]
+                month_idx_en = []
+                [month_idx_en.append(f'MONTH_{i}') for i in month_vals]
+                par_lname.Name[month_vars] = month_idx_en
+
+
+            if any('FECHA'==par_lname):
+                par_lname.Name['FECHA'] = 'DATE'
+            if any('PESO'==par_lname):
+                par_lname.Name['PESO'] = 'WEIGHT'
+            if any('EDAD'==par_lname):
+                par_lname.Name['EDAD'] = 'AGE'
+            if any('SEXO_M'==par_lname):
+                par_lname.Name['SEXO_M'] = 'SEX_M'
+
+
+        res['inegi_vars'] = pd.Index(inegi_fa_vars).isin(reg_vars_n.index)
+        res['cont_vars'] = pd.Index(cont_fa_vars).isin(reg_vars_n.index)
+
+
+        high_b_pars = reg_vars_n.loc[reg_vars_n.Coef>0,]
+        low_b_pars = reg_vars_n.loc[reg_vars_n.Coef<0,]
+        if high_b_pars.shape[0]>0:
+            sorted_idx = np.argsort(high_b_pars.Coef)
+            high_b_pars = high_b_pars.iloc[sorted_idx[::-1],:]
+            print('\nPrincipales variables que aumentan el número de hospitalizaciones:')
+            print(high_b_pars)
+        if low_b_pars.shape[0]>0:
+            sorted_idx = np.argsort(low_b_pars.Coef)
+            low_b_pars = low_b_pars.iloc[sorted_idx,:]
+            print('\nPrincipales variables que disminuyen el número de hospitalizaciones:')
+            print(low_b_pars)
+
+
+        print('\n')
+        print(f'REG ERR para {grp} (Entrenamiento) :  {pred_err_train:.3}')
+        print(f'REG ERR para {grp} (Validación)    :  {pred_err_test:.3}')
+        print(f'REG COR para {grp} (Validación)    :  {corr_test:.3}')
+        print('\n\n')
+
+
+        # Imágenes: solo su descripción, se dibujan en run con PlotRenderer
+        if cfg.save_plot:
+            max_feat = 20
+            feature_importance = cie_model.params[1:]
+            sorted_idx = np.argsort(feature_importance.abs())
+            pos = (np.arange(sorted_idx.shape[0]) + 0.5)[-max_feat:]
+            par = feature_importance[sorted_idx][-max_feat:]
+
+            clr = pd.Series(['#FF000099']*len(par))
+            clr[(par<0).values] = '#0000FF99'
+
+            size_y = 0
+            if reg_vars_n.shape[0]>5:
+                size_y = round((reg_vars_n.shape[0]-5)*0.5)
+
+            if cfg.lang=='EN':
+                title = f"{grp_en[grp]}\nFactors associated with an increase or decrease in the number of hospitalizations"
+            else:
+                title = f"{grp} - {cie_x_desc}\nFactores asociados al aumento o disminución del número de hospitalizaciones"
+            res['plots'] = [{'kind': 'barh', 'figsize': (10, 4+size_y), 'pos': pos, 'values': par.to_numpy(), 'colors': list(clr),
+                             'labels': list(reg_vars_n.Desc[par.index]+'\n['+par_lname.Name[par.index].values+' | p-value: '+p_val[par.index].apply(lambda x: f'{x:.3f}').astype(str)+']'),
+                             'title': title, 'adjust': {'left': 0.25, 'right': 0.99},
+                             'paths': [f'{cfg.out}/{cfg.grp}-{grp}_reg_nb_varimp-{cfg.lang}.png',
+                                       f'{cfg.out}/{cfg.grp}-{grp}_reg_nb_varimp-{cfg.lang}.pdf']}]
+
+
+
+
+
+        #---------
+        # Saving model
+        #---------
+        res['models_dict'] = {grp+'_ERR': pred_err_test,
+                              grp+'_NB': cie_model,
+                              grp+'_xmin': xmin,
+                              grp+'_xmax': xmax,
+                              grp+'_scaler': scaler}
+        res['model_vars'] = reg_vars_n.Desc
+
+    return res
+
+
+
+#------------------------------------------------------------------
+# Modelos de todos los grupos
+#------------------------------------------------------------------
+def run(cfg, ref, data):
+
+    df_grp = build_groups(cfg, ref, data)
+    print(df_grp)
+
+    if cfg.save_plot:
+        os.makedirs(cfg.out, exist_ok=True)
+
+    models_dict = {}
+    models = []
+    model_vars = pd.Series(dtype=object)
+    cie_stats = []
+    glm_hits, glm_misses = 0, 0
+
+    # Variable para almacenar cuantas veces fue relevante una variable socioeconómica en los modelos
+    inegi_v_model = pd.DataFrame(inegi_fa_vars, columns=['var'])
+    inegi_v_model = inegi_v_model.assign(count=0)
+    inegi_v_model.set_index('var', inplace=True)
+
+    # Variable para almacenar cuantas veces fue relevante una variable de contaminantes en los modelos
+    cont_v_model = pd.DataFrame(cont_fa_vars, columns=['var'])
+    cont_v_model = cont_v_model.assign(count=0)
+    cont_v_model.set_index('var', inplace=True)
+
+
+    # Las imágenes de cada grupo se dibujan en otros procesos mientras se generan los modelos siguientes
+    renderer = PlotRenderer(cfg.plot_n_jobs) if cfg.save_plot else None
+    on_result = (lambda res: renderer.submit(res.pop('plots', []))) if renderer is not None else None
+
+    grp_lst = df_grp.index[:cfg.max_grps]
+
+    # Ajustes iniciales de todos los grupos en un solo IRLS, antes de la selección de variables de cada uno
+    screens = None
+    if cfg.nb_screen:
+        inputs = map_grps(screen_input, grp_lst, cfg.n_jobs, desc='Celdas', cfg=cfg, ref=ref, data=data, df_grp=df_grp)
+        screens = screen_grps(inputs, cfg.nb_alpha)
+
+    res_lst = map_grps(gen_modelo, grp_lst, cfg.n_jobs, on_result=on_result, cfg=cfg, ref=ref, data=data, df_grp=df_grp,
+                       screens=screens)
+
+    # Se combinan los resultados de cada grupo, en el mismo orden que la ejecución secuencial
+    for res in res_lst:
+        print(res.get('log', ''), end='')
+        cie_stats.append(res['stats'])
+        glm_hits += res.get('glm_cache', {}).get('hits', 0)
+        glm_misses += res.get('glm_cache', {}).get('misses', 0)
+
+        if res['models_dict'] is not None:
+            inegi_v_model.loc[res['inegi_vars'],'count'] += 1
+            cont_v_model.loc[res['cont_vars'],'count'] += 1
+            models_dict.update(res['models_dict'])
+            models.append(res['grp'])
+
+            model_vars = pd.concat([res['model_vars'], model_vars], axis=0)
+
+    #------------------------------------------------------------------
+    # Resultados
+    #------------------------------------------------------------------
+    #
+    # Se guardan los modelos y sus medidas de desempeño
+    #
+    cie_mod_stats = pd.DataFrame(data=cie_stats, columns=['id', 'name',
+                       'inegi_vars', 'cont_vars', 'emun',
+                       'reg_err', 'reg_cor', 'time',
+                       'sexo_m', 'neg_v',
+                       'only_pobtot',
+                       'cronic', 'pred_outliers',
+                       'n_cases'])
+
+
+    # Summary
+    print('\n\n\n')
+    print(f'CIE                   :       ERR')
+    for i in models:
+        print(f"{i} - {df_grp.desc[i]}:   {models_dict[i+'_ERR']:.3}")
+
+    print(f"REG MEAN ERR:   {cie_mod_stats.reg_err.mean():.3}")
+    print(f"REG MEAN COR:   {cie_mod_stats.reg_cor.mean():.3}")
+    print(f"GLM CACHE HITS/MISSES: {glm_hits}/{glm_misses}")
+
+
+    model_vars.drop_duplicates(inplace=True)
+    model_vars.sort_index(inplace=True)
+
+    # modelos y variables
+    cie = ref['cie']
+    models_dict['models'] = models
+    models_dict['model_vars'] = model_vars
+    models_dict['models_name'] = df_grp.desc[models]
+    models_dict['affec_name'] = cie.loc[model_vars[pd.Series(model_vars).isin(cie.index)],'Nombre']
+    models_dict['model_stats'] = cie_mod_stats
+    models_dict['inegi_vars'] = inegi_v_model
+    models_dict['cont_vars'] = cont_v_model
+    models_dict['inegi_vars_cie'] = ref['inegi_loc'].columns
+    models_dict['cont_vars_cie'] = ref['cont_loc'].columns
+    models_dict['grp_data'] = df_grp
+
+    if renderer is not None:
+        renderer.close()
+
+    return models_dict
+
+
+
+# Se guardan los modelos para ser utilizados en los sistema web para la modelización del riesgo (dashboards)
+def save_models(models_dict, path='n_hosp.pickle'):
+
+    with open(path, 'wb') as handle:
+        pickle.dump(models_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Ejecución de los modelos por grupo, de forma secuencial o en paralelo.
+
+Los grupos son independientes entre sí, por lo que pueden generarse en un
+conjunto de procesos. Se usa 'fork' (cuando está disponible) para que los
+procesos hereden los datos ya cargados sin copiarlos por cada tarea.
+"""
+
+import io
+import contextlib
+import functools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from joblib import parallel_backend
+from tqdm.auto import tqdm
+
+
+# Función del grupo (con sus argumentos fijos) en cada proceso
+_task = None
+
+
+def _init_worker(fn, kwargs):
+    global _task
+    _task = functools.partial(fn, **kwargs)
+
+
+# Ejecuta la tarea capturando la salida, para imprimirla en orden al combinar resultados.
+# Dentro de cada proceso, joblib (p. ej. permutation_importance) usa hilos y no otros procesos.
+def _run_log(grp):
+
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf), parallel_backend('threading'):
+        res = _task(grp)
+        res['log'] = buf.getvalue()
+
+    return res
+
+
+# Resultados en orden; on_result(res) se llama con cada uno en cuanto está listo
+def _collect(res_iter, on_result):
+
+    res_lst = []
+    for res in res_iter:
+        if on_result is not None:
+            on_result(res)
+        res_lst.append(res)
+
+    return res_lst
+
+
+# Aplica fn(grp, **kwargs) a cada grupo y regresa los resultados en el mismo orden
+def map_grps(fn, grp_lst, n_jobs=1, desc='Modelo', on_result=None, **kwargs):
+
+    if n_jobs>1:
+        ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(fn, kwargs)) as executor:
+            return _collect(tqdm(executor.map(_run_log, grp_lst), total=len(grp_lst), desc=desc), on_result)
+
+    return _collect((fn(grp, **kwargs) for grp in tqdm(grp_lst, desc=desc)), on_result)
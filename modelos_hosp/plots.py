@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Generación de las imágenes de los modelos fuera del ciclo de modelado.
+
+Cada modelo regresa la descripción de sus imágenes (plot specs): un dict con
+el tipo de imagen, los archivos de salida y solo los datos necesarios para
+dibujarla (arreglos, etiquetas y títulos):
+
+    {'kind': 'barh', 'paths': ['out/PC-E10-E149_reg_nb_varimp-ES.png', ...],
+     'figsize': (10, 4), 'pos': ..., 'values': ..., 'labels': ..., 'title': ...}
+
+PlotRenderer las dibuja en un conjunto de procesos aparte (o en el proceso
+principal con n_jobs=0) mientras se generan los modelos de los grupos
+siguientes, y cierra cada figura al guardarla para que la memoria no crezca
+con el número de grupos. Con save_plot=False no se generan las descripciones.
+"""
+
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+import matplotlib.pyplot as plt
+
+
+# Gráfica de barras horizontales (coeficientes de la regresión)
+def render_barh(spec):
+
+    fig = plt.figure(figsize=spec['figsize'])
+    plt.barh(spec['pos'], spec['values'], align='center', color=spec.get('colors'))
+    plt.yticks(spec['pos'], spec['labels'])
+    plt.title(spec['title'])
+    plt.subplots_adjust(**spec.get('adjust', {}))
+
+    return fig
+
+
+# Mapa de calor de las correlaciones
+def render_heatmap(spec):
+
+    import seaborn as sns
+
+    fig = plt.figure(figsize=spec['figsize'], tight_layout=True)
+    ax = plt.axes()
+    sns.heatmap(spec['corr'], annot=True, cmap=plt.cm.RdBu, ax=ax)
+    ax.set_title(spec['title'])
+
+    return fig
+
+
+# Árbol de regresión
+def render_tree(spec):
+
+    from sklearn import tree
+
+    fig = plt.figure(figsize=spec['figsize'], tight_layout=False)
+    tree.plot_tree(spec['clf'], feature_names=spec['feature_names'], fontsize=6, filled=True, rounded=True)
+    plt.title(spec['title'])
+
+    return fig
+
+
+# Importancia de las variables del GBM (barras) y por permutación (cajas)
+def render_importance(spec):
+
+    fig = plt.figure(figsize=spec['figsize'])
+    plt.subplot(1, 2, 1)
+    plt.barh(spec['pos'], spec['values'], align='center')
+    plt.yticks(spec['pos'], spec['labels'])
+    plt.title(spec['title'])
+
+    plt.subplot(1, 2, 2)
+    plt.boxplot(spec['perm_values'], vert=False, labels=spec['perm_labels'])
+    plt.title(spec['perm_title'])
+    fig.tight_layout()
+
+    return fig
+
+
+# Dependencia parcial (pares de variables) ya calculada con partial_dependence, una por eje
+def render_pdp(spec):
+
+    from sklearn.inspection import PartialDependenceDisplay
+
+    fig, ax = plt.subplots(*spec['grid'], figsize=spec['figsize'])
+    for pd_result, features, a in zip(spec['pd_results'], spec['features'], ax.ravel()):
+        PartialDependenceDisplay(pd_results=[pd_result], features=[features], feature_names=spec['feature_names'],
+                                 target_idx=0, deciles=spec['deciles']).plot(ax=a)
+    fig.suptitle(spec['title'])
+    fig.tight_layout()
+
+    return fig
+
+
+plot_kinds = {'barh': render_barh, 'heatmap': render_heatmap, 'tree': render_tree,
+              'importance': render_importance, 'pdp': render_pdp}
+
+
+# Dibuja una imagen, la guarda en cada uno de sus archivos y cierra la figura
+def render_plot(spec):
+
+    fig = plot_kinds[spec['kind']](spec)
+    try:
+        for path in spec['paths']:
+            fig.savefig(path)
+    finally:
+        plt.close(fig)
+
+    return spec['paths']
+
+
+# Cada proceso dibuja sin pantalla y sin las figuras que pudiera haber heredado
+def _init_worker():
+
+    matplotlib.use('Agg')
+    plt.close('all')
+
+
+# Cola de imágenes: se dibujan en n_jobs procesos (o en el proceso principal con n_jobs=0)
+class PlotRenderer:
+
+    def __init__(self, n_jobs=1):
+
+        self.executor = None
+        self.futures = []
+        if n_jobs>0:
+            ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+            self.executor = ProcessPoolExecutor(max_workers=n_jobs, mp_context=ctx, initializer=_init_worker)
+            # Los procesos se crean desde ahora, antes de iniciar los modelos
+            self.executor.submit(plt.close, 'all').result()
+
+    def submit(self, specs):
+
+        for spec in specs:
+            if self.executor is None:
+                self._report(spec, render_plot, spec)
+            else:
+                self.futures.append((spec, self.executor.submit(render_plot, spec)))
+        self._collect(wait=False)
+
+    # Un error en una imagen no detiene la generación de los modelos
+    def _report(self, spec, fn, *args):
+
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"Error al generar {', '.join(spec['paths'])}: {e!r}")
+
+    # Revisa las imágenes terminadas (o espera a todas con wait=True) y libera sus descripciones
+    def _collect(self, wait):
+
+        pending = []
+        for spec, future in self.futures:
+            if wait or future.done():
+                self._report(spec, future.result)
+            else:
+                pending.append((spec, future))
+        self.futures = pending
+
+    # Espera a que terminen todas las imágenes
+    def close(self):
+
+        self._collect(wait=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Funciones de preprocesamiento compartidas por los modelos.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Reglas de escalamiento a 0-1 para los límites xmin, xmax: columnas constantes (quedan en 0) y columnas
+# a escalar (las demás, salvo las que ya están en 0-1). Las usan MinMaxScaler y scoring.scale_matrix
+def scale_masks(xmin, xmax):
+
+    xmin = np.asarray(xmin, dtype='float64')
+    xmax = np.asarray(xmax, dtype='float64')
+
+    return xmin==xmax, (xmin<xmax) & ((xmin!=0) | (xmax!=1))
+
+
+# Escalador a 0-1 con los mínimos y máximos (xmin, xmax) calculados una sola vez.
+# Las columnas constantes quedan en 0, las que ya están en 0-1 no se modifican y el resto
+# se escala con operaciones sobre arreglos de NumPy, solo en esas columnas. Con lim=(ll, ul)
+# además se limita el rango del resultado. Se guarda en los modelos para reutilizarlo al evaluar.
+class MinMaxScaler:
+
+    def __init__(self, xmin=None, xmax=None, lim=None):
+
+        self.xmin = xmin
+        self.xmax = xmax
+        self.lim = lim
+
+    # Calcula (o toma de los dados) los límites de las columnas de X
+    def fit(self, X):
+
+        self.xmin = X.min() if self.xmin is None else self.xmin[X.columns.values]
+        self.xmax = X.max() if self.xmax is None else self.xmax[X.columns.values]
+
+        const, scale = scale_masks(self.xmin, self.xmax)
+        self.const_cols = self.xmin.index[const]
+        self.scale_cols = self.xmin.index[scale]
+
+        return self
+
+    # Escala X; con inplace=False no modifica X (solo se reemplazan las columnas escaladas de una copia superficial)
+    def transform(self, X, inplace=False):
+
+        if not inplace:
+            X = X.copy(deep=False)
+
+        cols = self.const_cols[self.const_cols.isin(X.columns)]
+        if len(cols)>0:
+            X[cols] = 0
+
+        cols = self.scale_cols[self.scale_cols.isin(X.columns)]
+        if len(cols)>0:
+            A = X[cols].to_numpy(dtype='float64')
+            A -= self.xmin[cols].to_numpy(dtype='float64')
+            A /= (self.xmax[cols]-self.xmin[cols]).to_numpy(dtype='float64')
+            X[cols] = A
+
+        if self.lim is not None:
+            X.clip(self.lim[0], self.lim[1], inplace=True)
+
+        return X
+
+    def fit_transform(self, X, inplace=False):
+
+        return self.fit(X).transform(X, inplace)
+
+
+# Función para escalar los datos a 0-1
+def min_max_scaler(X, xmin=None, xmax=None):
+
+    scaler = MinMaxScaler(xmin, xmax).fit(X)
+
+    return (scaler.transform(X), scaler.xmin, scaler.xmax)
+
+
+# Función para limitar el rango de una variable
+def x_set_lim(X, ll, ul):
+
+    return X.clip(ll, ul)
+
+
+# Desviación estándar de cada columna (como en describe()), también para columnas dispersas
+def col_std(X):
+
+    return pd.Series([X[col].sparse.to_dense().std() if isinstance(X[col].dtype, pd.SparseDtype) else X[col].std()
+                      for col in X.columns], index=X.columns, dtype='float64')
+
+
+# Si X tiene columnas dispersas (dummies), convierte todas a dispersas para que sklearn
+# las reciba como matriz dispersa en lugar de convertirlas a una matriz densa
+def as_sparse(X):
+
+    if not any(isinstance(dt, pd.SparseDtype) for dt in X.dtypes):
+        return X
+
+    return X.astype(pd.SparseDtype('float64', 0))
+
+
+# Si X tiene columnas dispersas, las convierte a densas (para los modelos de sklearn que no aceptan matrices dispersas)
+def as_dense(X):
+
+    if not any(isinstance(dt, pd.SparseDtype) for dt in X.dtypes):
+        return X
+
+    return pd.DataFrame(X.to_numpy(dtype='float64'), index=X.index, columns=X.columns)
+
+
+# Máscara de entrenamiento estratificada: en los casos positivos (y>0.5) y en el resto se toma al azar
+# (con el generador rng) la proporción train_prop para entrenamiento, dejando al menos min_pos casos
+# positivos en entrenamiento y en validación. Si no hay suficientes casos positivos regresa None.
+def stratified_split(y, train_prop, rng, min_pos=1):
+
+    pos = np.asarray(y)>0.5
+    if pos.sum()<2*min_pos:
+        return None
+
+    msk = np.zeros(len(pos), dtype=bool)
+    for cls in (pos, ~pos):
+        idx = np.flatnonzero(cls)
+        n_train = int(round(train_prop*len(idx)))
+        if cls is pos:
+            n_train = min(max(n_train, min_pos), len(idx)-min_pos)
+        msk[rng.choice(idx, n_train, replace=False)] = True
+
+    return msk
+
+
+# Función para limitar valores extremos al cuantil (1-d), cuando el máximo 
+# supera en max_p veces a dicho cuantil
+def rep_outlier(X, d=0.001, max_p=1.4):
+    
+    X_up = X.quantile(1-d)
+
+    idx_up = X.max().div(X_up)>max_p
+  
+    X_c = X.copy()
+
+    for i in X.columns[idx_up]:
+        X_c.loc[X_c[i]>X_up[i],i] = X_up[i]
+        
+    return X_c    
+
+
+# Función para permutar cada columna de forma independiente
+def shuffle_data(df):
+        
+    n, m = df.shape
+    
+    df = df.reset_index(drop=True)
+    for i in range(m):
+        df.iloc[:,i] = df.iloc[:,i].sample(frac=1).reset_index(drop=True)
+        
+    return df
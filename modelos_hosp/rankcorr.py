@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Correlaciones de Spearman para la selección de variables.
+
+Los modelos solo usan la correlación de cada variable con Y y la submatriz de las
+variables seleccionadas en cada iteración, por lo que no se calcula la matriz
+completa de p x p. Cada columna se ordena (rangos promedio en empates, como en
+pandas) una sola vez, por bloques de columnas, y la correlación con Y es un
+producto matriz-vector de los rangos estandarizados. Las correlaciones entre
+pares de variables se calculan solo cuando se piden, guardando los rangos de las
+variables ya usadas.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+
+# Rangos centrados y con norma 1 de cada columna de A (NaN si la columna es constante)
+def std_ranks(A):
+
+    R = rankdata(A, axis=0)
+    R -= R.mean(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return R/np.sqrt((R**2).sum(axis=0))
+
+
+# Correlación de Spearman entre x y z usando solo los registros sin valores nulos (como en pandas)
+def spearman_pair(x, z):
+
+    ok = ~(np.isnan(x) | np.isnan(z))
+    if ok.sum()<2:
+        return np.nan
+
+    return float(np.dot(std_ranks(x[ok]), std_ranks(z[ok])))
+
+
+# Correlación de cada columna de X con la columna y; regresa el estado para pedir después pares de variables
+def rank_corr(X, y='Y', block=256):
+
+    cols = X.columns
+    y_val = X[y].to_numpy(dtype='float64')
+    r_y = std_ranks(y_val)
+
+    corr_y = np.empty(len(cols))
+    for i in range(0, len(cols), block):
+        A = X.iloc[:, i:i+block].to_numpy(dtype='float64')
+        nan_col = np.isnan(A).any(axis=0)
+        corr_y[i:i+block] = np.dot(r_y, std_ranks(A))
+
+        # Columnas con valores nulos: solo los registros completos
+        for j in np.flatnonzero(nan_col):
+            corr_y[i+j] = spearman_pair(A[:, j], y_val)
+
+    corr_y = pd.Series(corr_y, index=cols)
+    corr_y[y] = 1.0
+
+    return {'X': X, 'corr_y': corr_y, 'ranks': {}}
+
+
+# Matriz de correlaciones de Spearman entre las variables var_lst (calculada bajo demanda)
+def corr_sub(rc, var_lst):
+
+    var_lst = list(var_lst)
+    X, ranks = rc['X'], rc['ranks']
+
+    new_vars = [v for v in var_lst if v not in ranks]
+    if len(new_vars):
+        A = X[new_vars].to_numpy(dtype='float64')
+        for j, v in enumerate(new_vars):
+            # None indica que la variable tiene valores nulos y se calcula por pares
+            ranks[v] = None if np.isnan(A[:, j]).any() else std_ranks(A[:, j])
+
+    k = len(var_lst)
+    ok = np.array([ranks[v] is not None for v in var_lst], dtype=bool)
+    C = np.empty((k, k))
+    if ok.any():
+        S = np.column_stack([ranks[v] for v, v_ok in zip(var_lst, ok) if v_ok])
+        C[np.ix_(ok, ok)] = np.dot(S.T, S)
+    for i in np.flatnonzero(~ok):
+        x = X[var_lst[i]].to_numpy(dtype='float64')
+        for j in range(k):
+            C[i, j] = C[j, i] = spearman_pair(x, X[var_lst[j]].to_numpy(dtype='float64'))
+
+    # Como en pandas, la diagonal es exactamente 1
+    np.fill_diagonal(C, 1.0)
+
+    return pd.DataFrame(C, index=var_lst, columns=var_lst)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Carga de los datos de referencia: catálogos CIE, indicadores socioeconómicos
+(INEGI) y concentraciones de contaminantes por localidad.
+
+Estos datos no dependen del grupo ni del tipo de modelo, por lo que se cargan
+una sola vez (load_ref_data) y se reutilizan en todas las corridas.
+"""
+
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from .prep import MinMaxScaler
+
+
+# CIE
+# http://www.dgis.salud.gob.mx/contenidos/intercambio/diagnostico_gobmx.html
+
+# CLUES
+# http://www.dgis.salud.gob.mx/contenidos/intercambio/clues_gobmx.html
+
+# PRINCAU
+# LISTA MEXICANA PARA LA SELECCION DE LAS PRINCIPALES CAUSASDE MORTALIDAD
+# http://dgis.salud.gob.mx/descargas/pdf/lista_mexicana.pdf
+
+
+main_inegi_vars = ['POBTOT', 'POB_AREA', 'P_0A2', 'P_18A24', 'P_60YMAS', 'POB0_14', 'POB15_64', 'POB65_MAS', 'REL_H_M', 'PROM_HNV', 'GRAPROES', 'PROM_OCUP', 'P3HLINHE_M', 'P5_HLI_NHE', 'PDER_IMSS', 'PDER_ISTE', 'PDER_ISTEE', 'PAFIL_PDOM', 'PDER_SEGP', 'PDER_IMSSB', 'PAFIL_IPRIV', 'VIVPAR_UT', 'VPH_PISOTI', 'VPH_1CUART', 'VPH_AGUAFV', 'VPH_LETR', 'VPH_NODREN', 'VPH_SNBIEN', 'VPH_SINRTV', 'VPH_SINTIC']
+
+
+# Códigos hijos (de 4 o más caracteres) de cada código CIE de 3 caracteres, en el orden del catálogo.
+# Se busca cada prefijo en el catálogo ordenado (searchsorted), en lugar de recorrerlo con una expresión regular por código.
+def expand_cie_prefixes(cie_idx, prefixes):
+
+    codes = np.asarray(cie_idx, dtype=str)
+    order = np.argsort(codes, kind='stable')
+    codes_s = codes[order]
+
+    prefixes = np.asarray(prefixes, dtype=str)
+    lo = np.searchsorted(codes_s, prefixes, side='right')
+    hi = np.searchsorted(codes_s, np.char.add(prefixes, '\uffff'), side='left')
+
+    return {x: cie_idx[np.sort(order[l:h])].tolist() for x, l, h in zip(prefixes, lo, hi)}
+
+
+# Códigos CIE de cada categoría de hospitalizaciones evitables, incluyendo los hijos de los códigos de 3 caracteres
+def hosp_e_groups(cie_idx, cie_hosp_e, hosp_e_cat):
+
+    prefixes = cie_hosp_e.index[cie_hosp_e.index.str.len()==3].unique()
+    cie_child = expand_cie_prefixes(cie_idx, prefixes)
+
+    hosp_e_cie = {}
+    for grp in hosp_e_cat:
+        cie_lst = cie_hosp_e.index[cie_hosp_e.CATEGORIA == grp].tolist()
+        hosp_e_cie[grp] = cie_lst + [y for x in cie_lst if len(x)==3 for y in cie_child[x]]
+
+    return hosp_e_cie
+
+
+### Se cargan los catálogos de CIE ####
+def load_catalogs(cfg):
+
+    con = sqlite3.connect(os.path.join(cfg.base_dir, cfg.db))
+
+    cie = pd.read_sql_query('SELECT * FROM CATCIE10', con)
+    cie.set_index('CAUSA', inplace=True)
+
+    # Catalogo de principales causas de defunción
+    df_princau = pd.read_sql_query('SELECT PRINCAU.descrip_padre, PRINCAU.principal FROM PRINCAU', con)
+
+
+    cie_caup = pd.read_sql_query('SELECT CATCIE10.CAUSA, PRINCAU.descrip_padre AS PCAU_PADRE_DESC \
+    	FROM CATCIE10 \
+    	INNER JOIN PRINCAU ON PRINCAU.principal = CATCIE10.prinmorta', con)
+    cie_caup.set_index('CAUSA', inplace=True)
+    cie = pd.concat([cie, cie_caup], axis=1)
+
+    con.close()
+
+
+    # Catalogo de CIE consideradas cronicas
+    cie_c = pd.read_csv(os.path.join(cfg.base_dir, 'cie_cronicas.csv'))
+
+    # Catalogos de hospitalizaciones evitables (Purdy y ACSCMex)
+    cie_hosp_e_Purdy = pd.read_csv(os.path.join(cfg.base_dir, 'cie-hosp_e_Purdy.csv'))
+    cie_hosp_e_ACSCMex = pd.read_csv(os.path.join(cfg.base_dir, 'cie-hosp_e_ACSCMex.csv'))
+    cie_hosp_e = pd.concat([cie_hosp_e_ACSCMex,cie_hosp_e_Purdy])
+    cie_hosp_e = cie_hosp_e[['CAUSA', 'CATEGORIA', 'NV0']]
+    cie_hosp_e.drop_duplicates(inplace=True)
+    cie_hosp_e.set_index('CAUSA', inplace=True)
+    cie_hosp_e.dropna(inplace=True)
+    hosp_e_cat = cie_hosp_e.CATEGORIA.unique()
+    hosp_e_cie = hosp_e_groups(cie.index, cie_hosp_e, hosp_e_cat)
+
+    cie_hosp_gdesc = pd.read_csv(os.path.join(cfg.base_dir, 'cie-hosp_gdesc.csv'))
+    cie_hosp_gdesc.set_index('Code', inplace=True)
+
+    return {'cie': cie, 'df_princau': df_princau, 'cie_c': cie_c,
+            'cie_hosp_e': cie_hosp_e, 'hosp_e_cat': hosp_e_cat, 'hosp_e_cie': hosp_e_cie,
+            'cie_hosp_gdesc': cie_hosp_gdesc}
+
+
+
+#########################################
+## INEGI VARS
+#########################################
+#
+# Se cargan los datos del Censo de Población y Vivienda 2020 (INEGI), así como
+# las variables y ponderaciones para construir los indicadores socioeconómicos por localidad
+#
+# Valores (999,9999)  indican que tienen municipio o localidad desconocida
+def load_inegi(cfg):
+
+    inegi_vars = pd.read_csv(os.path.join(cfg.base_dir, 'variables.csv'))
+    inegi_loc = pd.read_csv(os.path.join(cfg.base_dir, 'inegi_loc.csv'), dtype={'ENTIDAD':'str','MUN':'str','LOC':'str'})
+    area_ageb = pd.read_csv(os.path.join(cfg.base_dir, 'ageb-area.csv'), dtype={'CVE_ENT':'str','CVE_MUN':'str','CVE_LOC':'str','CVE_AGEB':'str'})
+    inegi_fa_loads = pd.read_csv(os.path.join(cfg.base_dir, 'inegi_fa_loads.csv'))
+    scale_inegi_fa = pd.read_csv(os.path.join(cfg.base_dir, 'scale_inegi_fa.csv')).transpose()
+    inegi_fa_loads.set_index('Var', inplace=True)
+    scale_inegi_fa.rename(columns = {0:'min', 1:'max'}, inplace = True)
+
+    area_ageb['loc_id'] = area_ageb['CVE_ENT'] + area_ageb['CVE_MUN'] + area_ageb['CVE_LOC']
+    area_loc = area_ageb.groupby(['loc_id'])['Area'].sum().reset_index()
+    area_loc.set_index('loc_id', inplace=True)
+
+
+    id_inegi = (inegi_loc['ENTIDAD']+inegi_loc['MUN']+inegi_loc['LOC'])
+
+    inegi_loc.set_index(id_inegi, inplace=True)
+
+
+    idx = inegi_loc.index[inegi_loc.index.isin(area_ageb['loc_id'])].to_numpy()
+
+    inegi_loc = inegi_loc.assign(AREA=area_loc.Area.min())  #usar el area minima como estimado para aquellos que no aparecen
+    inegi_loc.loc[idx, 'AREA'] = area_loc.loc[idx, 'Area']
+
+
+    idx_scalable = inegi_loc.columns.isin(inegi_vars.Var[inegi_vars.No_Esc==0])
+    idx_pob = inegi_loc.columns[[i[0]=='P' for i in inegi_loc.columns]*idx_scalable]
+    idx_viv = inegi_loc.columns[[i[0]=='V' for i in inegi_loc.columns]*idx_scalable]
+
+    inegi_loc_s = inegi_loc.copy()
+
+
+    inegi_loc_s[idx_pob] = inegi_loc[idx_pob].div(inegi_loc['POBTOT'], axis=0)
+    inegi_loc_s[idx_viv] = inegi_loc[idx_viv].div(inegi_loc['VIVTOT'], axis=0)
+
+    inegi_loc_s['POBTOT'] = inegi_loc['POBTOT']/inegi_loc['POBTOT'].sum()
+    inegi_loc_s['VIVTOT'] = inegi_loc['VIVTOT']/inegi_loc['VIVTOT'].sum()
+
+    inegi_loc_s = inegi_loc_s.assign(POB_AREA=inegi_loc['POBTOT']/inegi_loc['AREA'])
+
+
+    nom_ent = inegi_loc['NOM_LOC'].copy()
+    nom_ent.loc['099990001'] = 'Municipio desconocido'
+    nom_ent.loc['159990001'] = 'Municipio desconocido'
+
+    inegi_loc = inegi_loc_s[main_inegi_vars]
+    id_inegi_fa = inegi_loc.columns.get_loc('REL_H_M')
+
+    return {'inegi_loc': inegi_loc, 'nom_ent': nom_ent, 'id_inegi_fa': id_inegi_fa,
+            'inegi_fa_loads': inegi_fa_loads, 'scale_inegi_fa': scale_inegi_fa}
+
+
+
+#########################################
+## CONTAMINANTES
+#########################################
+#
+# Se cargan las concentraciones de contaminantes y las ponderaciones
+# para construir los indicadores (factores) de contaminantes por localidad.
+# Estos factores tienen la finalidad de solventar el problema de contaminantes
+# correlacionados espacialmente (multicolinealidad), al agrupar en factores de
+# aquellos que tienden a estar presentes de manera simultanea.
+def load_cont(cfg, inegi_loc):
+
+    cont_loc = pd.read_csv(os.path.join(cfg.base_dir, 'cont_loc_mean.csv'), dtype={'ENTIDAD':'str','MUN':'str','LOC':'str'})
+    id_cont = (cont_loc['ENTIDAD']+cont_loc['MUN']+cont_loc['LOC'])
+
+    scale_cont_fa = pd.read_csv(os.path.join(cfg.base_dir, 'scale_cont_fa.csv')).transpose()
+    scale_cont_fa.rename(columns = {0:'min', 1:'max'}, inplace = True)
+
+
+    cont_loc.set_index(id_cont, inplace=True)
+    idx = cont_loc.index.isin(inegi_loc.index)
+    cont_loc = cont_loc[idx]
+    cont_loc = cont_loc.drop(['ENTIDAD', 'MUN', 'LOC'], axis=1)
+
+    return {'cont_loc': cont_loc, 'scale_cont_fa': scale_cont_fa}
+
+
+
+#########################################
+## INDICADORES POR LOCALIDAD
+#########################################
+#
+# Factores socioeconómicos (INEGI), variables de población y factores de
+# contaminantes por localidad. Solo dependen de la localidad, por lo que se
+# calculan una sola vez y cada grupo los toma por la posición de sus localidades.
+def loc_features(inegi_loc, id_inegi_fa, inegi_fa_loads, scale_inegi_fa, cont_loc, scale_cont_fa):
+
+    # Escalado y límite (avoid outliers) en un solo paso
+    X_inegi_s = MinMaxScaler(scale_inegi_fa['min'], scale_inegi_fa['max'], lim=(-1, 10)).fit_transform(inegi_loc.iloc[:,id_inegi_fa:])
+    X_inegi_fa = X_inegi_s.dot(inegi_fa_loads.loc[X_inegi_s.columns,:])
+    X_inegi_fa.rename(columns = {'F1':'F_ECONOM', 'F2':'F_SOCIAL'}, inplace = True)
+
+    X_cont = cont_loc.reindex(inegi_loc.index)
+    X_cont_s = MinMaxScaler(scale_cont_fa['min'], scale_cont_fa['max']).fit_transform(X_cont, inplace=True)
+
+    X_cont_s['PM_CO'] = 0.35*X_cont_s['pm10_mean'] + 0.39*X_cont_s['pm25_mean'] + 0.26*X_cont_s['co_mean']
+    X_cont_s['NO2_NOx'] = 0.54*X_cont_s['no2_mean'] + 0.46*X_cont_s['nox_mean']
+    X_cont_s['SO2_NO_O3'] = 0.35*X_cont_s['so2_mean'] + 0.33*X_cont_s['no_mean'] + 0.32*X_cont_s['o3_mean']
+
+    X_cont_s.drop(cont_loc.columns, axis=1, inplace=True)
+
+    loc_feat = pd.concat([X_inegi_fa, inegi_loc[['POBTOT', 'POB0_14', 'POB15_64', 'POB65_MAS', 'REL_H_M', 'POB_AREA']], X_cont_s], axis=1)
+
+    return {'loc_feat': loc_feat}
+
+
+
+# Carga todos los datos de referencia en un solo diccionario
+def load_ref_data(cfg):
+
+    ref = load_catalogs(cfg)
+    ref.update(load_inegi(cfg))
+    ref.update(load_cont(cfg, ref['inegi_loc']))
+    ref.update(loc_features(ref['inegi_loc'], ref['id_inegi_fa'], ref['inegi_fa_loads'], ref['scale_inegi_fa'],
+                            ref['cont_loc'], ref['scale_cont_fa']))
+
+    return ref
+
+
+# Solo la tabla de indicadores por localidad (INEGI y contaminantes), sin consultar la base de datos
+def load_loc_feat(cfg):
+
+    ref = load_inegi(cfg)
+    ref.update(load_cont(cfg, ref['inegi_loc']))
+    ref.update(loc_features(ref['inegi_loc'], ref['id_inegi_fa'], ref['inegi_fa_loads'], ref['scale_inegi_fa'],
+                            ref['cont_loc'], ref['scale_cont_fa']))
+
+    return ref['loc_feat']
@@ -0,0 +1,1028 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+MODELO DE REGRESIÓN LOGÍSTICA PARA PREDECIR LA SEVERIDAD DE LAS HOSPITALIZACIONES
+
+Se genera un modelo por grupo de códigos CIE (regresión logística, árbol de
+regresión y GBM), a partir de los datos de referencia (load_ref_data) y de
+los egresos (load_data) ya cargados.
+"""
+
+import os
+import pickle
+import pandas as pd
+import numpy as np
+import statsmodels.api as sm
+from sklearn.metrics import roc_auc_score, r2_score, mean_absolute_error, mean_squared_error
+from sklearn import tree
+
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+from sklearn.inspection import permutation_importance
+from sklearn.inspection import partial_dependence
+from scipy.stats.mstats import mquantiles
+
+from .cie_index import cie_rows
+from .egresos import read_grp_egresos, restore_dtypes
+from .glm_select import glm_cache, glm_design, glm_fit, glm_formula_fit, glm_predict
+from .groups import build_groups
+from .lang import month_en_es, grp_en
+from .parallel import map_grps
+from .rankcorr import rank_corr, corr_sub
+from .scoring import W_MIX
+from .prep import MinMaxScaler, col_std, as_sparse, as_dense, stratified_split
+from .plots import PlotRenderer
+
+
+# Variables socioeconómicas y de contaminantes de las que se cuenta cuantas veces fueron relevantes
+inegi_fa_vars = ['F_ECONOM', 'F_SOCIAL']
+cont_fa_vars = ['PM_CO', 'NO2_NOx', 'SO2_NO_O3']
+
+
+
+def err_func(obs, pred, err_type='AUC'):
+
+    if err_type=='AUC':
+        return roc_auc_score((obs>0.5).astype(int), pred)
+    elif err_type=='COR':
+        return np.corrcoef(obs, pred)[1,0]
+    elif err_type=='MSE':
+        return mean_squared_error(obs, pred)
+    elif err_type=='MAE':
+        return mean_absolute_error(obs, pred)
+    elif err_type=='R2':
+        return r2_score(obs, pred)
+
+
+# GBM por histogramas con paro temprano en el conjunto de validación: se agregan step iteraciones
+# (warm_start) hasta que la pérdida en validación no mejora en n_iter_no_change iteraciones.
+# Como en sklearn, el modelo conserva las iteraciones posteriores a la mejor.
+def hist_gbm_fit(X_train, y_train, w_train, X_val, y_val, w_val, max_iter=1000, n_iter_no_change=50, step=10):
+
+    gbm = HistGradientBoostingRegressor(random_state=1, learning_rate=0.05, max_depth=3, max_iter=step,
+                                        early_stopping=False, warm_start=True)
+    best_loss, best_iter = np.inf, 0
+    while True:
+        gbm.fit(X_train, y_train, sample_weight=w_train)
+        loss = np.average((y_val-gbm.predict(X_val))**2, weights=w_val)
+        if loss<best_loss:
+            best_loss, best_iter = loss, gbm.n_iter_
+        if gbm.n_iter_-best_iter>=n_iter_no_change or gbm.max_iter>=max_iter:
+            break
+        gbm.max_iter = min(gbm.max_iter+step, max_iter)
+
+    return gbm
+
+
+
+#------------------------------------------------------------------
+# Modelo de un grupo de códigos CIE
+#------------------------------------------------------------------
+def gen_modelo(grp, cfg, ref, data, df_grp):
+
+    df_egre_not_defu = data['df_egre_not_defu']
+    df_defu = data['df_defu']
+    egre_cie_idx = data['egre_cie_idx']
+    defu_cie_idx = data['defu_cie_idx']
+    cie = ref['cie']
+    cie_c = ref['cie_c']
+    nom_ent = ref['nom_ent']
+    loc_feat = ref['loc_feat']
+
+
+    # Resultados del grupo, se combinan al terminar todos los grupos
+    res = {'grp': grp, 'prop_ine': None, 'stats': None}
+
+    # Codigos CIE y descripcion para el grupo actual
+    cie_x = df_grp.cie[grp]
+    cie_x_desc  = df_grp.desc[grp]
+
+
+    # Determinar la lista de registros que cumplen con el grupo a estudiar
+    if cfg.db_grps:
+        df_egre_cie = read_grp_egresos(cfg, cie_x, df_defu)
+    else:
+        df_egre_cie = df_egre_not_defu.iloc[cie_rows(egre_cie_idx, cie_x)]
+    df_defu_cie = df_defu.iloc[cie_rows(defu_cie_idx, cie_x)]
+    id_lst = pd.concat([df_egre_cie.ID, df_defu_cie.ID])
+
+    tmp = []
+
+
+    # Se reinicia semilla para cada grupo a estudiar; la división entrenamiento/validación usa su propio generador
+    np.random.seed(cfg.seed)
+    rng = np.random.default_rng(cfg.seed)
+
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Data Frame
+    #------------------------------------------------------------------
+
+    vars_n = ['Y', 'EDAD', 'SEXO', 'PESO', 'PROCED', 'DERHAB', 'VEZ', 'ENTIDAD', 'MUNIC', 'LOC', 'FECHA', 'MES']
+    tmp = pd.concat([df_egre_cie[vars_n], df_defu_cie[vars_n]], axis=0).set_index(id_lst)
+
+    # Grupos con muy pocas defunciones (no puede haber casos positivos en entrenamiento y validación)
+    # o en los que todos los casos tienen el mismo Y: se descartan antes de construir las variables
+    n_pos = (tmp.Y>0.5).sum()
+    if n_pos<2:
+        print(f'******** PROBLEM >> TOTAL NUMBER OF DEATH CASES: {n_pos} **********')
+        return res
+    if n_pos==tmp.Y.notna().sum():
+        return res
+
+    X_df = restore_dtypes(tmp)
+
+    X_df.isnull().sum()
+    X_df['EDAD'].fillna(X_df['EDAD'].median(), inplace = True)
+    X_df['PESO'].fillna(X_df['PESO'].median(), inplace = True)
+
+    # La variable TALLA no es confiable, por lo que no se usa
+    #X_df['TALLA'].fillna(X_df['TALLA'].median(), inplace = True)
+
+
+
+
+    #------------- VARIABLES SOCIOECONOMICAS  ------------------
+    loc_id = pd.DataFrame(X_df['ENTIDAD'] + X_df['MUNIC'] + X_df['LOC'], columns=['loc'])
+
+    idx_avail_loc = loc_id['loc'].isin(loc_feat.index)
+    res['prop_ine'] = idx_avail_loc.mean()
+
+    # replace no existing id's with a sample of existing id's
+    loc_id['loc'][~idx_avail_loc] = loc_id[idx_avail_loc].sample(n=(~idx_avail_loc).sum(), replace=True).to_numpy()
+
+    # Indicadores socioeconómicos y de contaminantes de las localidades de los registros
+    loc_k = loc_feat.index.get_indexer(loc_id['loc'])
+    X_loc = pd.DataFrame(loc_feat.to_numpy()[loc_k], index=X_df.index, columns=loc_feat.columns)
+    X_df = pd.concat([X_df, X_loc[inegi_fa_vars + ['POB_AREA']]], axis=1)
+
+    X_df['E_MUN'] = X_df['ENTIDAD'] + X_df['MUNIC']
+    X_df.drop(['MUNIC', 'LOC'], axis=1, inplace=True)
+    #-------------------
+
+
+    #------------- VARIABLES DE CONTAMINANTES  ------------------
+    X_df = pd.concat([X_df, X_loc[cont_fa_vars]], axis=1)
+    #-------------------
+
+
+
+    # Y debe ser 0-1
+    y_min = X_df['Y'].min()
+    y_max = X_df['Y'].max()
+    if y_min>0:
+        X_df.loc[X_df.Y < 0.5, 'Y'] = 0.5*(X_df.Y[X_df.Y < 0.5]-y_min)/(0.5-y_min)
+        #print(' ****** YMIN CHANGED ******')
+    if y_max<1:
+        X_df.loc[X_df.Y > 0.5, 'Y'] = 0.5 + 0.5*(X_df.Y[X_df.Y > 0.5]-0.5)/(y_max-0.5)
+        #print(' ****** YMAX CHANGED ******')
+
+    X_df['Y'].fillna(X_df['Y'].median(), inplace = True)
+
+    # -------------------------------
+    X = X_df.copy()
+
+    # Incluir otras variables categóricas a través de dummies
+    X = pd.concat((X, pd.get_dummies(X['SEXO'], prefix='SEXO', drop_first=True)), axis=1)
+    # (con cfg.sparse_dummies, las de muchas categorías se guardan como columnas dispersas)
+    X = pd.concat((X, pd.get_dummies(X['PROCED'], prefix='PROCED', drop_first=False, sparse=cfg.sparse_dummies)), axis=1)
+    X = pd.concat((X, pd.get_dummies(X['E_MUN'], prefix='E_MUN', drop_first=False, sparse=cfg.sparse_dummies)), axis=1)
+    X = pd.concat((X, pd.get_dummies(X['ENTIDAD'], prefix='ENTIDAD', drop_first=True, sparse=cfg.sparse_dummies)), axis=1)
+
+    y = X['Y']
+    X.drop(['SEXO', 'PROCED', 'DERHAB', 'VEZ'], axis=1, inplace=True)
+    X.drop(['ENTIDAD', 'E_MUN', 'MES'], axis=1, inplace=True)
+    X_df.drop(['ENTIDAD'], axis=1, inplace=True)
+    bool_cols = X.columns[X.dtypes=='bool']
+    X[bool_cols] = X[bool_cols].astype('int')
+    X.dtypes.unique()
+    X.reset_index(drop=True, inplace=True)
+    y.reset_index(drop=True, inplace=True)
+
+
+
+    # Eliminar algunos outliers encontrados y errores de captura
+    if any((X.EDAD==0) * (X.PESO>10)):
+        X.loc[(X.EDAD==0) * (X.PESO>10),'PESO'] = X.PESO[X.EDAD==0].median()
+    if np.quantile(X.EDAD, 0.995)==0 and X.EDAD.max()>0: # Para cuando la mayoria son edad 0
+        X.loc[X.EDAD>0,'EDAD'] = 0
+
+    data_err1 = (X.EDAD>10) * (X.PESO<10)
+    data_err2 = (X.PESO==9.999) + (X.PESO==9.099) + (X.PESO==0.999)
+    if any(data_err1):             # Pesos sin sentido por culpa de variaviones de 999
+        X.loc[data_err1,'PESO'] = X.PESO[~data_err1].median()
+    if any(data_err2):             # variaciones de 999, como 9, 9.99, 0.99 u otros para pesos no especificados
+        X.loc[data_err2,'PESO'] = X.PESO[~data_err2].median()
+
+
+    # Incluir contaminantes, socioeconómicas
+    main_var = pd.Series(['EDAD', 'PESO', 'SEXO_M', 'F_ECONOM', 'F_SOCIAL', 'PM_CO', 'NO2_NOx', 'SO2_NO_O3'])
+    main_var = main_var[main_var.isin(X.columns)] # Algunas como SEXO_M podrian no existir por ser todas mujeres
+    X_main = X[main_var]
+
+    # Ignorar codigo CIE o Grupo si todos los casos tienen el mismo Y
+    if (y<0.5).mean()==0 or (y<0.5).mean()==1:
+        return res
+
+
+    # Reescalar los predictores
+    scaler = MinMaxScaler().fit(X)
+    X_s, xmin, xmax = scaler.transform(X), scaler.xmin, scaler.xmax
+
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Logistic (ALL VARS)
+    #------------------------------------------------------------------
+    #
+    # Se hace una primer regresión logística para determinar las variables de relevancia
+    #
+
+    all_columns = X_s.columns.difference(['Y'], sort=False)
+
+    w_c = 1+y/y.mean()-2*y
+    #w_c = 1+y/y.mean()
+    if not cfg.use_weight:
+        w_c = w_c/w_c
+
+    cie_model_tmp = glm_fit(
+        glm_design(X_s), all_columns,
+        sm.families.Binomial(sm.genmod.families.links.probit()), # probit (Cumulative standard normal pdf) or Logit
+        freq_weights=np.asarray(w_c))
+
+    model_err_train = err_func(y, glm_predict(cie_model_tmp, X_s), cfg.err_func)
+
+
+    p_var = (cie_model_tmp['pvalues'][1:]<0.5)
+    sif_vars = p_var.index[p_var]
+    sif_vars = np.concatenate((['Y'], sif_vars.values))
+
+    # Correlaciones (Spearman) con Y; las de pares de variables se calculan al pedirlas con corr_sub
+    y_corr = rank_corr(X_s)
+    corr_y = y_corr['corr_y'][1:].to_frame('Y')
+    best_vars = y_corr['corr_y'].abs().sort_values(ascending=False).index
+
+
+    # División estratificada: siempre hay defunciones en entrenamiento y en validación
+    msk = stratified_split(X_s.Y, cfg.train_prop, rng)
+
+
+    train_std = X_s.columns[col_std(X_s[msk])>0]
+
+    X_s = X_s[train_std]
+    X = X[train_std]
+
+    train = X_s[msk]
+    test = X_s[~msk]
+    w_train = np.asarray(w_c[msk])
+
+    # Matriz de diseño de entrenamiento con todas las variables, se construye una sola vez
+    design = glm_design(train)
+
+    best_vars = best_vars[best_vars.isin(X.columns)]
+    corr_vars = best_vars[1:20]
+    cie_model = glm_fit(design, corr_vars, sm.families.Binomial(), freq_weights=w_train)
+
+
+    pred_test = glm_predict(cie_model, test)
+    corr_test = np.corrcoef(test.Y, pred_test)[1,0]
+
+    err_train = err_func(train.Y, glm_predict(cie_model, train), cfg.err_func)
+    err_test = err_func(test.Y, pred_test, cfg.err_func)
+    res['val_sc_reg'] = err_test
+
+
+
+
+    #------------------------------------------------------------------
+    # Trees | Modelo de arboles de regresion
+    #------------------------------------------------------------------
+    X = X.drop(['Y'], axis=1)
+
+    X_train = X[msk]
+    X_test = X[~msk]
+    y_train = y[msk]
+    y_test = y[~msk]
+
+    # Con dummies dispersas, los árboles reciben todas las columnas dispersas (sklearn las usa como CSC)
+    X_train_sp = as_sparse(X_train)
+    X_test_sp = as_sparse(X_test)
+
+    clf = tree.DecisionTreeRegressor(random_state=1, max_depth=3, criterion="squared_error")
+    clf = clf.fit(X_train_sp, y_train, sample_weight=w_train)
+
+    pred_train_tree = clf.predict(X_train_sp)
+    err_train_tree = err_func(y_train, pred_train_tree, cfg.err_func)
+
+    pred_test_tree = clf.predict(X_test_sp)
+    err_test_tree = err_func(y_test, pred_test_tree, cfg.err_func)
+    tree_vars = X_train.columns[clf.tree_.compute_feature_importances(normalize=True)>0]
+
+    res['val_sc_tree'] = err_test_tree
+
+
+
+
+    #------------------------------------------------------------------
+    # GBM | Modelo GBM
+    #------------------------------------------------------------------
+    gp = 0
+    if cfg.hist_gbm:
+        # HistGradientBoostingRegressor no acepta matrices dispersas
+        X_train_gbm, X_test_gbm = as_dense(X_train), as_dense(X_test)
+        gbm = hist_gbm_fit(X_train_gbm.iloc[:, gp:], y_train, w_train,
+                           X_test_gbm.iloc[:, gp:], y_test, np.asarray(w_c[~msk]))
+    else:
+        X_train_gbm, X_test_gbm = X_train_sp, X_test_sp
+        gbm = GradientBoostingRegressor(random_state=1, learning_rate=0.05 , max_depth=3, n_estimators=250)
+        gbm.fit(X_train_gbm.iloc[:, gp:], y_train, sample_weight=w_train)
+
+    pred_train_gbm = gbm.predict(X_train_gbm.iloc[:, gp:])
+    err_train_gbm = err_func(y_train, pred_train_gbm, cfg.err_func)
+
+    pred_test_gbm = gbm.predict(X_test_gbm.iloc[:, gp:])
+    err_test_gbm = err_func(y_test, pred_test_gbm, cfg.err_func)
+
+
+    res['val_sc_gbm'] = err_test_gbm
+
+
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Logistic (Variable selection)
+    #------------------------------------------------------------------
+    #
+    # Regresión logística con selección de variables. Sólo se mantienen las
+    # variables que contribuyen significativamente al modelo para que éste sea
+    # lo más parsimonioso posible y reducir el problema de la multicolinealidad.
+
+    # Se incluyen penalizaciones en el proceso de selección de variables teniendo
+    # en cuenta el problema de la multicolinealidad y la paradoja de Simpson, como
+    # no permitir que el signo de la variable sea diferente del signo de
+    # correlación a menos que la contribución al modelo sea significativa
+    # al hacerlo.
+
+    # Todas estas consideraciones mantienen la interpretabilidad del modelo.
+
+    # El algoritmo prueba eliminando variables con poca significación estadística
+    # y mantiene los modelos con mejor AIC considerando las penalizaciones
+    # mencionadas. Cambien prueba incluyendo variables de forma iterativa,
+    # incluyendo aquellas con mejor correlación con la variable dependiente.
+
+
+
+    # Se inicia solo con las variables que tienen una correlación mínima
+    # El valor umbral es pequeño ya que la relación puede ser no lineal
+    best_vars_cor = corr_y.Y.abs()[(corr_y.Y.abs()>0.01)].sort_values(ascending=False).index
+    best_vars_cor = best_vars_cor[best_vars_cor.isin(train.columns)]
+
+    sif_vars = pd.Series(best_vars_cor)
+    sif_vars0 = sif_vars.copy()
+    init_n_vars = 10
+    sif_vars = sif_vars[:init_n_vars]
+
+
+    sif_vars = sif_vars[sif_vars.isin(train.columns)]
+
+
+    p_vals = pd.Series([1,1,1,0])
+    p_var = p_vals
+    n_it = 0
+    n_it_ch = 0
+    n_forw = 0
+
+    max_n_it_ch = 2*len(best_vars_cor)
+    max_p_val = 0.15
+    max_p_val_final = 0.05
+    delta_p = 0.001
+    keep_going = False
+
+    removed_vars = np.array([])
+    prev_ic = np.inf
+    best_ic = np.inf
+    ic_tol = 1e-9 # Tolerancia relativa para comparar la función objetivo
+
+    neg_vars = np.concatenate([cont_fa_vars, inegi_fa_vars])
+    neg_v = np.inf
+    n_nvars = neg_vars.shape[0]
+    l_neg = 0.2   # Penalización que busca principalmente variables que aumentan el riesgo
+    l_cor = 0.025 # Penalización para variables que cambian el signo en su correlación
+
+
+
+    family = sm.families.Binomial(sm.genmod.families.links.Logit())
+    start = None
+    cache = glm_cache(cfg.glm_cache_size) if cfg.glm_cache_size else None
+
+    # proceso iterativo de selección de variables
+    while (n_it-n_it_ch)<max_n_it_ch:
+
+        # Ajuste con las columnas de la matriz de diseño, iniciando en los coeficientes anteriores
+        cie_model = glm_fit(design, sif_vars, family, freq_weights=w_train, start=start, cache=cache)
+        start = cie_model['params']
+
+
+        p_vals = cie_model['pvalues'][1:]
+
+        if len(sif_vars)>1:
+            p_var = (p_vals<max([p_vals.max()-delta_p, max_p_val]))
+        else:
+            p_var = (p_vals<=1)
+
+
+        # Probar el eliminar variables con coeficientes contradictorios
+        reg_vars = pd.DataFrame(cie_model['params'][1:], columns=['Coef'])
+        coef_var = reg_vars[reg_vars.index.isin(neg_vars)] # solo inegi y contaminantes
+        var_ok = coef_var['Coef']
+        var_ok = var_ok[var_ok<0]
+
+        if all(p_var):
+            if var_ok.shape[0]>0 and len(sif_vars)>1:
+                worst_var = p_vals[var_ok.index.values].sort_values(ascending=False).index[0]
+                p_var[worst_var] = False
+
+
+
+        keep_going = False
+        if p_vals.var()<1e-4 and p_var.size>15:
+            p_var = (p_vals>-1).cumsum()<=15 # Si todos los p-values son iguales, probablemente indica un error, mantener solo N variables
+            keep_going = True
+
+
+        # antes de cambiar las variables, calcular correlacion media para penalizar
+        nv = len(sif_vars)
+        avg_corr = 0
+        if len(sif_vars)>1:
+            avg_corr = corr_sub(y_corr, sif_vars).abs()
+            avg_corr = avg_corr[avg_corr<1].max().max()
+
+        sif_vars = p_var.index[p_var]
+
+        # Función objetivo a optimizar para elegir el mejor modelo
+        cur_ic = (cie_model['aic'])*(1+l_neg*var_ok.shape[0]/n_nvars)*(1+l_cor*avg_corr)
+
+
+
+        if all(p_var):
+            no_vars = sif_vars0[~sif_vars0.isin(sif_vars)].values
+            new_var = np.array([no_vars[n_forw%no_vars.shape[0]]])
+            sif_vars = np.unique(np.concatenate([sif_vars, new_var]))
+            n_forw += 1
+
+        # Con el inicio en los coeficientes anteriores, el mismo modelo puede variar en ~1e-12 en el AIC,
+        # por lo que solo se considera mejor si lo es por más que esa tolerancia
+        if (cur_ic<best_ic*(1-ic_tol) and var_ok.shape[0]<=neg_v) or n_it==1:
+            best_ic = cur_ic
+            neg_v = var_ok.shape[0]
+            best_reg_model = cie_model
+            n_it_ch = n_it
+            n_forw = 0 # reset the search with every new model
+
+        removed_vars = p_var.index[~p_var]
+        prev_ic = cur_ic
+        n_it += 1
+
+
+
+    best_p_vals = best_reg_model['pvalues'][1:]
+    while any(best_p_vals>max_p_val_final) and len(best_p_vals)>1:
+        sif_vars = best_p_vals.index[best_p_vals<best_p_vals.max()]
+
+        best_reg_model = glm_fit(design, sif_vars, family, start=best_reg_model['params'], cache=cache)
+
+        best_p_vals = best_reg_model['pvalues'][1:]
+
+
+
+
+    # Utilizar el modelo con los mejores valores encontrados (ajustado con la fórmula)
+    cie_model = glm_formula_fit(train, best_reg_model, family)
+    if cache is not None:
+        res['glm_cache'] = {'hits': cache['hits'], 'misses': cache['misses']}
+
+
+    pred_train = cie_model.fittedvalues
+    pred_test = cie_model.predict(test)
+
+    err_train = err_func(train.Y, pred_train, cfg.err_func)
+    err_test = err_func(test.Y, pred_test, cfg.err_func)
+
+    res['val_sc_reg2'] = err_test
+
+
+
+
+
+
+    #------------------------------------------------------------------
+    # Model Ensemble
+    #------------------------------------------------------------------
+
+
+    # Ponderaciones de los modelos
+    # Logístico, GBM, Arboles
+    w_mix = W_MIX
+
+    pred_train_mix = w_mix[0]*pred_train + w_mix[1]*pred_train_gbm + w_mix[2]*pred_train_tree
+    pred_test_mix = w_mix[0]*pred_test + w_mix[1]*pred_test_gbm + w_mix[2]*pred_test_tree
+    err_train_mix = err_func(train.Y, pred_train_mix, cfg.err_func)
+    err_test_mix = err_func(test.Y, pred_test_mix, cfg.err_func)
+
+    res['val_sc_mix'] = err_test_mix
+    res['val_mse'] = (((test.Y>0.5).astype(int)-pred_test_mix)**2).mean()
+    res['val_mse2'] = ((test.Y-pred_test_mix)**2).mean()
+
+
+
+    # stats
+    reg_vars = pd.DataFrame(cie_model.params[1:], columns=['Coef'])
+    res['stats'] = {'id':grp, 'name':cie_x_desc,
+                    'ndef':(X_s['Y']>=0.5).sum(), 'hosp':X_s['Y'].size,
+                    'inegi_vars':reg_vars.index.isin(inegi_fa_vars).sum(),
+                    'cont_vars':reg_vars.index.isin(cont_fa_vars).sum(),
+                    'emun':reg_vars.index.str.contains('^E_MUN_', regex=True).sum(),
+                    'mix_per':err_test_mix, 'mix_per_t':err_train_mix,
+                    'reg_per':err_test, 'gbm_per':err_test_gbm,
+                    'time':reg_vars.index.str.contains('FECHA').sum(),
+                    'sexo_m':reg_vars.index.str.contains('SEXO_M').sum(),
+                    'neg_v':(reg_vars[reg_vars.index.isin(neg_vars)]['Coef']<0).sum(),
+                    'cronic':pd.Series(cie_x).isin(cie_c['cie']).mean()}
+
+
+
+
+    #------------------------------------------------------------------
+    # Printing
+    #------------------------------------------------------------------
+
+    # Se grefican los resultados
+    #if err_test>0.6:
+    if True:
+
+        par_lname = pd.DataFrame(X_train.columns.values, columns=['Name'], index=X_train.columns.values).copy()
+        if cfg.lang=='EN':
+            par_lname.Name['FECHA'] = 'DATE'
+            par_lname.Name['PESO'] = 'WEIGHT'
+            par_lname.Name['EDAD'] = 'AGE'
+            par_lname.Name['SEXO_M'] = 'SEX_M'
+
+
+        # Imágenes: solo su descripción, se dibujan en run con PlotRenderer
+        plots = []
+
+        # Heat map
+        if cfg.save_plot:
+            plots.append({'kind': 'heatmap', 'figsize': [8, 6.5], 'corr': corr_sub(y_corr, best_vars[:10]),
+                          'title': f'Correlation map\n{grp} - {cie_x_desc}',
+                          'paths': [f'{cfg.out}/{grp}_corr.png']})
+
+
+
+        #---------
+        # TREE
+        #---------
+        if cfg.save_plot:
+            plots.append({'kind': 'tree', 'figsize': [15, 6], 'clf': clf, 'feature_names': list(X.columns),
+                          'title': f'Regression Tree\n{grp} - {cie_x_desc}',
+                          'paths': [f'{cfg.out}/{cfg.grp}-{grp}_tree.pdf']})
+
+
+
+
+        #---------
+        # GBM
+        #---------
+        max_feat = 10
+        result = permutation_importance(
+            gbm, X_test_gbm.iloc[:, gp:], y_test, n_repeats=10, random_state=42, n_jobs=cfg.perm_n_jobs
+        )
+
+        # HistGradientBoostingRegressor no calcula la importancia MDI, se usa la de permutación (sin valores negativos)
+        if cfg.hist_gbm:
+            feature_importance = np.maximum(result.importances_mean, 0)
+            imp_name = 'Permutation'
+        else:
+            feature_importance = gbm.feature_importances_
+            imp_name = 'MDI'
+        if cfg.save_plot:
+            sorted_idx = np.argsort(feature_importance)
+            pos = np.arange(sorted_idx.shape[0]) + 0.5
+            perm_idx = result.importances_mean.argsort()
+            grp_title = grp_en[grp] if cfg.lang=='EN' else f'{grp} - {cie_x_desc}'
+            plots.append({'kind': 'importance', 'figsize': (11, 4.5),
+                          'pos': pos[-max_feat:], 'values': feature_importance[sorted_idx][-max_feat:],
+                          'labels': list(par_lname.Name[sorted_idx][-max_feat:]),
+                          'title': f"Feature Importance ({imp_name})\n{grp_title}",
+                          'perm_values': result.importances[perm_idx][-max_feat:].T,
+                          'perm_labels': list(par_lname.Name[perm_idx][-max_feat:]),
+                          'perm_title': f"Permutation Importance (validation set)\n{grp_title}",
+                          'paths': [f'{cfg.out}/{cfg.grp}-{grp}_fimp_GBM-{cfg.lang}.pdf']})
+
+        print('\n\nGBM\n')
+        print(f'AUC  (Entrenamiento) para {grp}:  {err_train_gbm:.3}')
+        print(f'AUC  (Validación) para {grp}:     {err_test_gbm:.3}')
+
+
+        gbm_score = pd.DataFrame(data={'name':X_train.columns.values, 'imp':feature_importance/sum(feature_importance)*err_test_gbm}).sort_values(by=['imp'], ascending=False).set_index('name')
+        if not any(X_train.columns.isin(['EDAD'])):
+            gbm_score.loc['EDAD','imp'] = 0
+        gbm_score.loc['AUC-VAL','imp'] = err_test_gbm
+        res['gbm_score'] = gbm_score.imp[['EDAD', 'PESO', 'F_ECONOM', 'F_SOCIAL', 'NO2_NOx', 'PM_CO', 'SO2_NO_O3', 'AUC-VAL']].values
+
+
+
+        # Dependencia parcial: se calcula aquí (requiere el modelo) y solo se dibuja en PlotRenderer.
+        # Con pesos, HistGradientBoostingRegressor no permite el método 'recursion'
+        if cfg.save_plot:
+            pd_method = 'brute' if cfg.hist_gbm else 'auto'
+            pd_features = [(0,1), (6,7), (2,6), (2,7)]
+            pd_args = [((0.02,0.99), 5), ((0.1,0.95), 3), ((0.1,0.95), 3), ((0.1,0.95), 3)]
+            pd_results = [partial_dependence(gbm, X_train_gbm, features=list(fx), percentiles=q, grid_resolution=n,
+                                             method=pd_method, kind='average')
+                          for fx, (q, n) in zip(pd_features, pd_args)]
+            deciles = {fx: mquantiles(X_train_gbm.iloc[:, fx], prob=np.arange(0.1, 1.0, 0.1))
+                       for fx in np.unique(pd_features)}
+            if cfg.lang=='EN':
+                title = f"{grp_en[grp]} - Partial dependence"
+            else:
+                title = f"[{grp}] {cie_x_desc}  - Partial dependence"
+            plots.append({'kind': 'pdp', 'grid': (2, 2), 'figsize': (9, 6), 'pd_results': pd_results,
+                          'features': pd_features, 'feature_names': list(par_lname.Name), 'deciles': deciles,
+                          'title': title, 'paths': [f'{cfg.out}/{cfg.grp}-{grp}_gbm_pd-{cfg.lang}.pdf']})
+
+
+
+        #---------
+        # REG
+        #---------
+
+        print(f'Logistic model [{grp} - {cie_x_desc}]')
+        print(cie_model.summary())
+
+        p_val = cie_model.pvalues[1:]
+        reg_vars_n = pd.DataFrame(cie_model.params[1:].sort_values(ascending=False), columns=['Coef'])
+        reg_vars_n = reg_vars_n.assign(Desc='')
+
+        cie_in_reg = reg_vars_n.index[reg_vars_n.index.isin(cie.index)].values
+        if cie_in_reg.shape[0]>0:
+            reg_vars_n.loc[cie_in_reg,'Desc'] = cie.loc[cie_in_reg, 'Nombre']
+
+
+        emun_vars = reg_vars_n.index.str.contains('^E_MUN_', regex=True)
+        if emun_vars.sum()>0:
+            emun_vals = (reg_vars_n.index[emun_vars].str.extract(r'^E_MUN_(.*)', expand=True)+'0001').values.flatten()
+            reg_vars_n.loc[emun_vars,'Desc'] = 'Residencia: ' + nom_ent[emun_vals].values
+
+        month_vars = reg_vars_n.index.str.contains('^MES_', regex=True)
+        if month_vars.sum()>0:
+            month_vals = (reg_vars_n.index[month_vars].str.extract(r'^MES_(.*)', expand=True)).values.flatten()
+            reg_vars_n.loc[month_vars,'Desc'] = ['Mes de ' + month_en_es[i] for i in month_vals]
+
+
+        if any('SEXO_M'==reg_vars_n.index):
+            reg_vars_n.loc['SEXO_M','Desc'] = 'Sexo masculino'
+        if any('EDAD'==reg_vars_n.index):
+            reg_vars_n.loc['EDAD','Desc'] = 'Edad del paciente'
+        if any('PESO'==reg_vars_n.index):
+            reg_vars_n.loc['PESO','Desc'] = 'Peso del paciente'
+        if any('FECHA'==reg_vars_n.index):
+            reg_vars_n.loc['FECHA','Desc'] = 'Fecha de ingreso del paciente'
+        if any('NO2_NOx'==reg_vars_n.index):
+            reg_vars_n.loc['NO2_NOx','Desc'] = 'Contaminantes NO2 y NOX'
+        if any('PM_CO'==reg_vars_n.index):
+            reg_vars_n.loc['PM_CO','Desc'] = 'Contaminantes PM10, PM2.5 y CO'
+        if any('SO2_NO_O3'==reg_vars_n.index):
+            reg_vars_n.loc['SO2_NO_O3','Desc'] = 'Contaminantes SO2, NO y O3'
+        if any('F_ECONOM'==reg_vars_n.index):
+            reg_vars_n.loc['F_ECONOM','Desc'] = 'Factor Economico / Vivienda'
+        if any('F_SOCIAL'==reg_vars_n.index):
+            reg_vars_n.loc['F_SOCIAL','Desc'] = 'Factor Social'
+        if any('PROCED_1'==reg_vars_n.index):
+            reg_vars_n.loc['PROCED_1','Desc'] = 'Procedencia: CONSULTA EXTERNA'
+        if any('PROCED_2'==reg_vars_n.index):
+            reg_vars_n.loc['PROCED_2','Desc'] = 'Procedencia: Urgencias'
+        if any('PROCED_3'==reg_vars_n.index):
+            reg_vars_n.loc['PROCED_3','Desc'] = 'Procedencia: Referido'
+        if any('PROCED_4'==reg_vars_n.index):
+            reg_vars_n.loc['PROCED_4','Desc'] = 'Procedencia: Otro'
+        if any('PROCED_9'==reg_vars_n.index):
+            reg_vars_n.loc['PROCED_9','Desc'] = 'Procedencia: (N.E.)'
+        if any('VEZ_2'==reg_vars_n.index):
+            reg_vars_n.loc['VEZ_2','Desc'] = 'Hospitalización: Subsecuente'
+        if any('VEZ_9'==reg_vars_n.index):
+            reg_vars_n.loc['VEZ_9','Desc'] = 'Hospitalización: (N.E.)'
+        if any('POB_AREA'==reg_vars_n.index):
+            reg_vars_n.loc['POB_AREA','Desc'] = 'Densidad de población'
+        if any('DERHAB_0'==reg_vars_n.index):
+            reg_vars_n.loc['DERHAB_0','Desc'] = 'Derechohabiencia: NINGUNA'
+        if any('DERHAB_8'==reg_vars_n.index):
+            reg_vars_n.loc['DERHAB_8','Desc'] = 'Derechohabiencia: SEGURO POPULAR'
+        if any('DERHAB_8'==reg_vars_n.index):
+            reg_vars_n.loc['DERHAB_9','Desc'] = 'Derechohabiencia: SE IGNORA'
+        if any('DERHAB_G'==reg_vars_n.index):
+            reg_vars_n.loc['DERHAB_G','Desc'] = 'Derechohabiencia: GRATUIDAD'
+
+
+        if cfg.lang=='EN':
+            if any('SEXO_M'==reg_vars_n.index):
+                reg_vars_n.loc['SEXO_M','Desc'] = 'Male sex'
+            if any('EDAD'==reg_vars_n.index):
+                reg_vars_n.loc['EDAD','Desc'] = 'Patient\'s age'
+            if any('PESO'==reg_vars_n.index):
+                reg_vars_n.loc['PESO','Desc'] = 'Patient\'s weight'
+            if any('FECHA'==reg_vars_n.index):
+                reg_vars_n.loc['FECHA','Desc'] = 'Patient\'s admission date'
+            if any('NO2_NOx'==reg_vars_n.index):
+                reg_vars_n.loc['NO2_NOx','Desc'] = 'Pollutants NO2 and NOX'
+            if any('PM_CO'==reg_vars_n.index):
+                reg_vars_n.loc['PM_CO','Desc'] = 'Pollutants PM10, PM2.5 and CO'
+            if any('SO2_NO_O3'==reg_vars_n.index):
+                reg_vars_n.loc['SO2_NO_O3','Desc'] = 'Pollutants SO2, NO and O3'
+            if any('F_ECONOM'==reg_vars_n.index):
+                reg_vars_n.loc['F_ECONOM','Desc'] = 'Economic Factor / Housing'
+            if any('F_SOCIAL'==reg_vars_n.index):
+                reg_vars_n.loc['F_SOCIAL','Desc'] = 'Social Factor'
+
+            if any('PROCED_1'==reg_vars_n.index):
+                reg_vars_n.loc['PROCED_1','Desc'] = 'Origin: EXTERNAL'
+            if any('PROCED_2'==reg_vars_n.index):
+                reg_vars_n.loc['PROCED_2','Desc'] = 'Origin: ER'
+            if any('PROCED_3'==reg_vars_n.index):
+                reg_vars_n.loc['PROCED_3','Desc'] = 'Origin: Referral'
+            if any('PROCED_4'==reg_vars_n.index):
+                reg_vars_n.loc['PROCED_4','Desc'] = 'Origin: Other'
+            if any('PROCED_9'==reg_vars_n.index):
+                reg_vars_n.loc['PROCED_9','Desc'] = 'Origin: (N.E.)'
+            if any('VEZ_2'==reg_vars_n.index):
+                reg_vars_n.loc['VEZ_2','Desc'] = 'Hospitalization: Subsequent'
+            if any('VEZ_9'==reg_vars_n.index):
+                reg_vars_n.loc['VEZ_9','Desc'] = 'Hospitalization: (N.E.)'
+            if any('POB_AREA'==reg_vars_n.index):
+                reg_vars_n.loc['POB_AREA','Desc'] = 'Population density'
+            if any('DERHAB_0'==reg_vars_n.index):
+                reg_vars_n.loc['DERHAB_0','Desc'] = 'Health services: NONE'
+            if any('DERHAB_8'==reg_vars_n.index):
+                reg_vars_n.loc['DERHAB_8','Desc'] = 'Health services: SEGURO POPULAR'
+            if any('DERHAB_8'==reg_vars_n.index):
+                reg_vars_n.loc['DERHAB_9','Desc'] = 'Health services: NOT KNOWN'
+            if any('DERHAB_G'==reg_vars_n.index):
+                reg_vars_n.loc['DERHAB_G','Desc'] = 'Health services: GRATUIDAD'
+
+            if emun_vars.sum()>0:
+                emun_vals = (reg_vars_n.index[emun_vars].str.extract(r'^E_MUN_(.*)', expand=True)+'0001').values.flatten()
+                reg_vars_n.loc[emun_vars,'Desc'] = 'Residence: ' + nom_ent[emun_vals].values
+
+            month_vars = reg_vars_n.index.str.contains('^MES_', regex=True)
+            if month_vars.sum()>0:
+                month_vals = (reg_vars_n.index[month_vars].str.extract(r'^MES_(.*)', expand=True)).values.flatten()
+                reg_vars_n.loc[month_vars,'Desc'] = ['Month of ' + month_en_es[i] for i in month_vals]
+                month_idx_en = []
+                [month_idx_en.append(f'MONTH_{i}') for i in month_vals]
+                par_lname.Name[month_vars] = month_idx_en
+
+
+
+        res['inegi_vars'] = pd.Index(inegi_fa_vars).isin(reg_vars_n.index)
+        res['cont_vars'] = pd.Index(cont_fa_vars).isin(reg_vars_n.index)
+
+
+        high_b_pars = reg_vars_n.loc[reg_vars_n.Coef>0,]
+        low_b_pars = reg_vars_n.loc[reg_vars_n.Coef<0,]
+        if high_b_pars.shape[0]>0:
+            sorted_idx = np.argsort(high_b_pars.Coef)
+            high_b_pars = high_b_pars.iloc[sorted_idx[::-1],:]
+            print('\nPrincipales variables relacionadas a mayor riesgo:')
+            print(high_b_pars)
+        if low_b_pars.shape[0]>0:
+            sorted_idx = np.argsort(low_b_pars.Coef)
+            low_b_pars = low_b_pars.iloc[sorted_idx,:]
+            print('\nPrincipales variables relacionadas a menor riesgo:')
+            print(low_b_pars)
+
+        X_main_t = X_main.describe().T.round(2)
+
+        print('\n')
+        print(f'Estadísticas descriptivas de variables de interés probadas en el modelo')
+        print(X_main_t)
+
+        print('\n')
+        print(f'REG {cfg.err_func} para {grp} (Entrenamiento) :  {err_train:.3}')
+        print(f'REG {cfg.err_func} para {grp} (Validación)    :  {err_test:.3}')
+        print('\n\n')
+
+
+
+        if cfg.save_plot:
+            max_feat = 20
+            feature_importance = cie_model.params[1:]
+            sorted_idx = np.argsort(feature_importance.abs())
+            pos = (np.arange(sorted_idx.shape[0]) + 0.5)[-max_feat:]
+            par = feature_importance[sorted_idx][-max_feat:]
+
+            clr = pd.Series(['#FF000099']*len(par))
+            clr[(par<0).values] = '#0000FF99'
+
+            size_y = 0
+            if reg_vars_n.shape[0]>5:
+                size_y = round((reg_vars_n.shape[0]-5)*0.5)
+
+            if cfg.lang=='EN' and cfg.grp=='CM':
+                title = f"{grp_en[grp]}\nRisk factors that increase or decrease severity"
+            else:
+                title = f"{grp} - {cie_x_desc}\nFactores de riesgo que aumentan o disminuyen la severidad"
+            plots.append({'kind': 'barh', 'figsize': (10, 4+size_y), 'pos': pos, 'values': par.to_numpy(), 'colors': list(clr),
+                          'labels': list(reg_vars_n.Desc[par.index]+'\n['+par_lname.Name[par.index].values+' | p-value: '+p_val[par.index].apply(lambda x: f'{x:.3f}').astype(str)+']'),
+                          'title': title, 'adjust': {'left': 0.25, 'right': 0.99},
+                          'paths': [f'{cfg.out}/{cfg.grp}-{grp}_reg_varimp-{cfg.lang}.png',
+                                    f'{cfg.out}/{cfg.grp}-{grp}_reg_varimp-{cfg.lang}.pdf']})
+        res['plots'] = plots
+
+
+
+        #---------
+        # Saving model
+        #---------
+        res['models_dict'] = {grp+'_PER': err_test_mix,
+                              grp+'_REG_PER': err_test,
+                              grp+'_TREE_VARS': X.columns,
+                              grp+'_LOGISTIC': cie_model,
+                              grp+'_xmin': xmin,
+                              grp+'_xmax': xmax,
+                              grp+'_scaler': scaler,
+                              grp+'_TREE': clf,
+                              grp+'_GBM': gbm,
+                              grp+'_X_MAIN': X_main_t}
+        res['model_vars'] = np.concatenate([tree_vars.values, cie_model.pvalues[1:].index.values])
+
+    return res
+
+
+
+#------------------------------------------------------------------
+# Modelos de todos los grupos
+#------------------------------------------------------------------
+def run(cfg, ref, data):
+
+    df_grp = build_groups(cfg, ref, data)
+    print(df_grp)
+
+    if cfg.save_plot:
+        os.makedirs(cfg.out, exist_ok=True)
+
+    # Inicialización de variables para los modelos a generar
+    cum_val_sc_reg = 0
+    cum_val_sc_reg2 = 0
+    cum_val_sc_tree = 0
+    cum_val_sc_gbm = 0
+    cum_val_mse = 0
+    cum_val_mse2 = 0
+    cum_val_sc_mix = 0
+
+    models_dict = {}
+    models = []
+    model_vars = np.array([])
+    cie_stats = []
+    gbm_score_dict = {}
+    glm_hits, glm_misses = 0, 0
+
+    # Variable para almacenar cuantas veces fue relevante una variable socioeconómica en los modelos
+    inegi_v_model = pd.DataFrame(inegi_fa_vars, columns=['var'])
+    inegi_v_model = inegi_v_model.assign(count=0)
+    inegi_v_model.set_index('var', inplace=True)
+
+    # Variable para almacenar cuantas veces fue relevante una variable de contaminantes en los modelos
+    cont_v_model = pd.DataFrame(cont_fa_vars, columns=['var'])
+    cont_v_model = cont_v_model.assign(count=0)
+    cont_v_model.set_index('var', inplace=True)
+
+
+    # Las imágenes de cada grupo se dibujan en otros procesos mientras se generan los modelos siguientes
+    renderer = PlotRenderer(cfg.plot_n_jobs) if cfg.save_plot else None
+    on_result = (lambda res: renderer.submit(res.pop('plots', []))) if renderer is not None else None
+
+    grp_lst = df_grp.index[:cfg.max_grps]
+    res_lst = map_grps(gen_modelo, grp_lst, cfg.n_jobs, on_result=on_result, cfg=cfg, ref=ref, data=data, df_grp=df_grp)
+
+    # Se combinan los resultados de cada grupo, en el mismo orden que la ejecución secuencial
+    for res in res_lst:
+        print(res.get('log', ''), end='')
+        glm_hits += res.get('glm_cache', {}).get('hits', 0)
+        glm_misses += res.get('glm_cache', {}).get('misses', 0)
+        if res['stats'] is None:
+            continue
+
+        cie_stats.append(res['stats'])
+        cum_val_sc_reg = cum_val_sc_reg + res['val_sc_reg']
+        cum_val_sc_tree = cum_val_sc_tree + res['val_sc_tree']
+        cum_val_sc_gbm = cum_val_sc_gbm + res['val_sc_gbm']
+        cum_val_sc_reg2 = cum_val_sc_reg2 + res['val_sc_reg2']
+        cum_val_sc_mix = cum_val_sc_mix + res['val_sc_mix']
+        cum_val_mse = cum_val_mse + res['val_mse']
+        cum_val_mse2 = cum_val_mse2 + res['val_mse2']
+
+        gbm_score_dict[res['grp']] = res['gbm_score']
+        inegi_v_model.loc[res['inegi_vars'],'count'] += 1
+        cont_v_model.loc[res['cont_vars'],'count'] += 1
+        models_dict.update(res['models_dict'])
+        models.append(res['grp'])
+
+        model_vars = np.unique(np.concatenate([model_vars, res['model_vars']]))
+
+    #------------------------------------------------------------------
+    # Resultados
+    #------------------------------------------------------------------
+    #
+    # Se guardan los modelos y sus medidas de desempeño
+    #
+    cie_mod_stats = pd.DataFrame(data=cie_stats, columns=['id', 'name', 'ndef',
+                       'hosp', 'inegi_vars', 'cont_vars',
+                       'emun',
+                       'mix_per', 'mix_per_t',
+                       'reg_per', 'gbm_per', 'time',
+                       'sexo_m', 'neg_v',
+                       'cronic'])
+    cie_mod_stats['prop_defu'] = cie_mod_stats['ndef']/cie_mod_stats['hosp']
+    cie_mod_stats.set_index('id', inplace=True)
+
+    real_n_cie = cie_mod_stats.shape[0]
+
+
+    gbm_ap_imp = pd.DataFrame.from_dict(gbm_score_dict, orient='index', columns=['EDAD', 'PESO', 'F_ECONOM', 'F_SOCIAL', 'NO2_NOx', 'PM_CO', 'SO2_NO_O3', 'AUC'])
+    gbm_ap_imp = gbm_ap_imp.assign(desc=df_grp.desc[gbm_ap_imp.index])
+    gbm_ap_imp = gbm_ap_imp.assign(n_regs=cie_mod_stats.hosp[gbm_ap_imp.index])
+    mean_effect = gbm_ap_imp[['NO2_NOx', 'PM_CO', 'SO2_NO_O3']].T.mean()
+    s_effect = gbm_ap_imp[['NO2_NOx', 'PM_CO', 'SO2_NO_O3']].T.sum()
+    gbm_ap_imp = gbm_ap_imp.assign(mean=mean_effect, abs_e=s_effect*gbm_ap_imp['n_regs']/6)
+
+    gbm_ap_imp_out = gbm_ap_imp[['desc', 'EDAD', 'PESO', 'F_ECONOM', 'F_SOCIAL', 'NO2_NOx', 'PM_CO',
+                                  'SO2_NO_O3', 'n_regs', 'AUC', 'abs_e']].sort_values(by=['abs_e'], ascending=False)
+
+
+
+    # Summary
+    print('\n\n\n')
+    print(f'CIE                   :       {cfg.err_func}')
+    for i in models:
+        print(f"{i} - {df_grp.desc[i]}:   {models_dict[i+'_REG_PER']:.3}")
+
+
+    print('\n\n')
+    print(f'AVG REG SCORE  : {cum_val_sc_reg/real_n_cie:.3}')
+    print(f'AVG REG2 SCORE : {cum_val_sc_reg2/real_n_cie:.3}')
+    print(f'AVG TREE SCORE : {cum_val_sc_tree/real_n_cie:.3}')
+    print(f'AVG GBM SCORE  : {cum_val_sc_gbm/real_n_cie:.3}')
+    print(f'AVG MIX SCORE  : {cum_val_sc_mix/real_n_cie:.3}')
+    print(f'AVG MIX MSE    : {cum_val_mse/real_n_cie:.3}')
+    print(f'AVG MIX MSE2   : {cum_val_mse2/real_n_cie:.3}')
+    print(f'N models       : {len(models)}')
+    print(f'GLM CACHE HITS/MISSES: {glm_hits}/{glm_misses}')
+
+
+    inegi_v_model = inegi_v_model.sort_values(by='count', ascending=False)
+    cont_v_model = cont_v_model.sort_values(by='count', ascending=False)
+    print(inegi_v_model)
+    print(cont_v_model)
+
+
+
+    # modelos y variables
+    cie = ref['cie']
+    models_dict['models'] = models
+    models_dict['model_vars'] = model_vars
+    models_dict['models_name'] = df_grp.desc[models]
+    models_dict['affec_name'] = cie.loc[model_vars[pd.Series(model_vars).isin(cie.index)],'Nombre']
+    models_dict['model_stats'] = cie_mod_stats
+    models_dict['gbm_imp'] = gbm_ap_imp_out
+    models_dict['inegi_vars'] = inegi_v_model
+    models_dict['cont_vars'] = cont_v_model
+    models_dict['inegi_vars_cie'] = ref['inegi_loc'].columns
+    models_dict['cont_vars_cie'] = ref['cont_loc'].columns
+    models_dict['grp_data'] = df_grp
+    models_dict['perf_metric'] = cfg.err_func
+
+    if renderer is not None:
+        renderer.close()
+
+    return models_dict
+
+
+
+# Se guardan los modelos para ser utilizados en los sistema web para la modelización del riesgo (dashboards)
+def save_models(models_dict, path='risk_models.pickle'):
+
+    with open(path, 'wb') as handle:
+        pickle.dump(models_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Evaluación por lotes de los modelos de severidad (risk_models) y del número de
+hospitalizaciones (n_hosp).
+
+Recibe una tabla con registros de pacientes y localidades (EDAD, PESO, SEXO,
+PROCED, ENTIDAD, MUNIC, LOC y FECHA o INGRESO) de uno o varios grupos, y
+calcula para cada registro las tres predicciones del modelo (regresión
+logística, GBM y árbol) y su combinación con w_mix, igual que en riesgo:
+
+    from modelos_hosp import load_ref_data, load_risk_models, score_risk
+
+    ref = load_ref_data(cfg)
+    models = load_risk_models('risk_models')      # o 'risk_models.pickle'
+    pred = score_risk(rows, models, ref['loc_feat'])
+
+Con score_count y los modelos de load_count_models se calcula el número esperado
+de hospitalizaciones por mes y localidad (solo se necesitan ENTIDAD, MUNIC, LOC
+y FECHA o INGRESO).
+
+Las variables de cada grupo (incluidas las dummies de municipio, procedencia,
+entidad, sexo y mes) se construyen directamente como una matriz de NumPy con las
+columnas que usa el modelo; los indicadores socioeconómicos y de contaminantes
+se toman de loc_feat por índice (las localidades que no están en loc_feat usan
+el promedio de todas). Los árboles se evalúan con los nodos en el formato de
+artifacts, todos los árboles del GBM a la vez, por bloques de registros.
+"""
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .artifacts import load_index, load_group, group_arrays
+from .prep import scale_masks
+
+
+# Pesos de la combinación de la regresión logística, el GBM y el árbol
+W_MIX = [0.45, 0.45, 0.1]
+
+# Variables categóricas que se incluyen como dummies (prefijo de la columna del modelo)
+dummy_vars = ['SEXO', 'PROCED', 'E_MUN', 'ENTIDAD', 'MES']
+
+# Nombres de los meses como en egresos (INGRESO.dt.month_name())
+month_names = pd.date_range('2000-01-01', periods=12, freq='MS').month_name().to_numpy()
+
+# Inversa de la liga de los GLM
+glm_inv_link = {'Logit': special.expit, 'Log': np.exp, 'Identity': lambda eta: eta}
+
+
+# Modelos de los grupos grps (todos si es None), de un directorio de artifacts o de un pickle.
+# Las tablas para evaluar el GLM y los árboles se preparan una sola vez al cargar
+def load_models(path, grps=None):
+
+    if os.path.isdir(path):
+        index = load_index(path)
+        grps = list(index['groups']) if grps is None else grps
+        models = {grp: load_group(path, grp, index) for grp in grps}
+    else:
+        with open(path, 'rb') as handle:
+            return models_from_dict(pickle.load(handle), grps)
+
+    return prepare_models(models)
+
+
+# Modelos de los grupos grps (todos si es None) de un models_dict en memoria (de nhosp.run o riesgo.run)
+def models_from_dict(models_dict, grps=None):
+
+    grps = list(models_dict['models']) if grps is None else grps
+    models = {}
+    for grp in grps:
+        entries = {k[len(grp)+1:]: v for k, v in models_dict.items() if k.startswith(grp+'_')}
+        arrays, meta = group_arrays(entries)
+        models[grp] = {'meta': meta, 'arrays': arrays}
+
+    return prepare_models(models)
+
+
+# Tablas para evaluar el GLM y los árboles de cada grupo
+def prepare_models(models):
+
+    for model in models.values():
+        model['glm'] = glm_tables(model['meta'], model['arrays'])
+        model['trees'] = {prefix: tree_tables(model['arrays'], model['meta'][prefix+'meta'], prefix)
+                          for prefix in ['tree_', 'gbm_'] if prefix+'meta' in model['meta']}
+
+    return models
+
+
+# Modelos de severidad (risk_models)
+def load_risk_models(path, grps=None):
+
+    models = load_models(path, grps)
+    for grp, model in models.items():
+        if 'gbm_' not in model['trees']:
+            raise ValueError(f'El grupo {grp} no es un modelo de severidad')
+
+    return models
+
+
+# Modelos del número de hospitalizaciones (n_hosp)
+def load_count_models(path, grps=None):
+
+    models = load_models(path, grps)
+    for grp, model in models.items():
+        if model['meta'].get('glm_key')!='NB':
+            raise ValueError(f'El grupo {grp} no es un modelo del número de hospitalizaciones')
+
+    return models
+
+
+# Tabla de indicadores por localidad como arreglo, con el promedio para las localidades que no existen
+# (de las localidades con datos: la mayoría no tiene los de contaminantes)
+def loc_table(loc_feat):
+
+    A = loc_feat.to_numpy(dtype='float64')
+
+    return {'index': loc_feat.index, 'columns': list(loc_feat.columns), 'A': A, 'mean': np.nanmean(A, axis=0)}
+
+
+# Variables base de los registros (un arreglo de NumPy por variable): fecha, mes, E_MUN y los indicadores
+# de su localidad. EDAD, PESO, SEXO y PROCED son opcionales (no se usan en los modelos del número de
+# hospitalizaciones). loc_feat puede ser la tabla de loc_table, para no convertirla en cada llamada
+def base_features(rows, loc_feat):
+
+    if isinstance(loc_feat, pd.DataFrame):
+        loc_feat = loc_table(loc_feat)
+
+    feat = {}
+    for col in ['EDAD', 'PESO']:
+        if col in rows:
+            feat[col] = rows[col].to_numpy(dtype='float64')
+
+    # FECHA (meses desde 2015) y MES; los registros sin ellos los toman de INGRESO
+    fecha = rows['FECHA'].to_numpy(dtype='float64') if 'FECHA' in rows else np.full(len(rows), np.nan)
+    if 'INGRESO' in rows:
+        ingreso = pd.to_datetime(rows['INGRESO'])
+        fecha = np.where(np.isnan(fecha), (ingreso.dt.month + 12*(ingreso.dt.year-2015)).to_numpy(dtype='float64'), fecha)
+    feat['FECHA'] = fecha
+    mes = month_names[((np.nan_to_num(fecha, nan=1)-1) % 12).astype(int)].astype(object)
+    mes[np.isnan(fecha)] = 'nan'
+    if 'MES' in rows:
+        mes = np.where(rows['MES'].notna(), rows['MES'].astype(str).to_numpy(dtype=object), mes)
+    feat['MES'] = mes
+
+    ent = rows['ENTIDAD'].astype(str).to_numpy(dtype=object)
+    feat['E_MUN'] = ent + rows['MUNIC'].astype(str).to_numpy(dtype=object)
+    feat['ENTIDAD'] = ent
+    for col in ['SEXO', 'PROCED']:
+        if col in rows:
+            feat[col] = rows[col].astype(str).to_numpy(dtype=object)
+
+    # Indicadores de la localidad; las que no existen usan el promedio
+    loc_k = loc_feat['index'].get_indexer(feat['E_MUN'] + rows['LOC'].astype(str).to_numpy(dtype=object))
+    X_loc = loc_feat['A'][loc_k]
+    X_loc[loc_k<0] = loc_feat['mean']
+    for j, col in enumerate(loc_feat['columns']):
+        feat[col] = X_loc[:, j]
+
+    return feat
+
+
+# Variables base de los registros en las posiciones pos
+def feat_rows(feat, pos):
+
+    return {k: v[pos] for k, v in feat.items()}
+
+
+# Matriz (n, len(columns)) con las columnas de un modelo, incluidas las dummies
+def feature_matrix(feat, columns):
+
+    X = np.zeros((len(feat['FECHA']), len(columns)))
+    codes = {}
+    for j, col in enumerate(columns):
+        prefix = next((v for v in dummy_vars if col.startswith(v+'_')), None)
+        if col in feat and prefix is None:
+            X[:, j] = feat[col]
+        elif prefix is not None:
+            if prefix not in feat:
+                raise KeyError(f'Variable no disponible para evaluar el modelo: {prefix}')
+            if prefix not in codes:
+                c, uniques = pd.factorize(feat[prefix])
+                codes[prefix] = (c, {v: i for i, v in enumerate(uniques)})
+            k = codes[prefix][1].get(col[len(prefix)+1:], -1)
+            if k>=0:
+                X[:, j] = codes[prefix][0]==k
+        else:
+            raise KeyError(f'Variable no disponible para evaluar el modelo: {col}')
+
+    return X
+
+
+# Escala a 0-1 las columnas de X con los límites xmin, xmax (con las reglas de MinMaxScaler)
+def scale_matrix(X, xmin, xmax):
+
+    const, scale = scale_masks(xmin, xmax)
+    X[:, const] = 0
+    X[:, scale] = (X[:, scale]-xmin[scale])/(xmax[scale]-xmin[scale])
+
+    return X
+
+
+# Variables, límites, coeficientes y su matriz de covarianzas (None si no se guardó) del GLM de un grupo
+def glm_tables(meta, arrays):
+
+    glm_vars = meta['glm_names'][1:]
+    col_k = pd.Index(meta['columns']).get_indexer(glm_vars)
+
+    return {'vars': glm_vars,
+            'xmin': np.asarray(arrays['xmin'])[col_k],
+            'xmax': np.asarray(arrays['xmax'])[col_k],
+            'params': np.asarray(arrays['glm_params']),
+            'cov': np.asarray(arrays['glm_cov']) if 'glm_cov' in arrays else None,
+            'inv_link': glm_inv_link[meta['glm_link']]}
+
+
+# Nodos de los árboles guardados con artifacts (prefijo 'tree_' o 'gbm_') listos para evaluar: las hojas
+# apuntan a sí mismas (con umbral infinito), de modo que se desciende un número fijo de niveles (depth)
+def tree_tables(arrays, meta, prefix):
+
+    left = np.asarray(arrays[prefix+'left'], dtype='int64')
+    leaf = left<0
+    ids = np.arange(len(left))
+    tables = {'roots': np.asarray(arrays[prefix+'roots'], dtype='int64'),
+              'left': np.where(leaf, ids, left),
+              'right': np.where(leaf, ids, np.asarray(arrays[prefix+'right'], dtype='int64')),
+              'feature': np.where(leaf, 0, np.asarray(arrays[prefix+'feature'], dtype='int64')),
+              'threshold': np.where(leaf, np.inf, np.asarray(arrays[prefix+'threshold'])),
+              'missing_left': np.asarray(arrays[prefix+'missing_left']).astype(bool),
+              'value': np.asarray(arrays[prefix+'value'], dtype='float64'),
+              'x_dtype': meta['x_dtype'], 'init': meta['init'], 'scale': meta['scale'],
+              'allow_nan': meta.get('allow_nan', False)}
+
+    # Profundidad máxima de los árboles
+    depth, node = 0, tables['roots']
+    while not leaf[node].all():
+        node = np.concatenate([left[node[~leaf[node]]], tables['right'][node[~leaf[node]]]])
+        depth += 1
+    tables['depth'] = depth
+
+    return tables
+
+
+# Predicción de los árboles (init + scale*suma de las hojas), en todos los árboles a la vez, por bloques de registros.
+# Los valores nulos siguen missing_left solo en los árboles que los admiten (HistGradientBoosting); en los demás
+# (GradientBoosting y el árbol de regresión, que sklearn no evalúa con nulos) la predicción de esos registros es NaN
+def tree_predict(tables, X, block=4096):
+
+    X = np.asarray(X, dtype=tables['x_dtype'])
+    roots, left, right = tables['roots'], tables['left'], tables['right']
+    feature, threshold, missing_left = tables['feature'], tables['threshold'], tables['missing_left']
+
+    row_nan = np.isnan(X).any(axis=1)
+    has_nan = row_nan.any() and tables['allow_nan']
+    pred = np.empty(len(X))
+    for i in range(0, len(X), block):
+        Xb = X[i:i+block]
+        row_off = (np.arange(len(Xb))*X.shape[1])[:, None]
+        Xb = Xb.ravel()
+        node = np.repeat(roots[None, :], len(row_off), axis=0)
+        for _ in range(tables['depth']):
+            x = Xb[row_off + feature[node]]
+            go_left = x<=threshold[node]
+            if has_nan:
+                go_left |= np.isnan(x) & missing_left[node]
+            node = np.where(go_left, left[node], right[node])
+        pred[i:i+block] = tables['value'][node].sum(axis=1)
+
+    if not tables['allow_nan']:
+        pred[row_nan] = np.nan
+
+    return tables['init'] + tables['scale']*pred
+
+
+# Predicción (en la escala de la respuesta) del GLM de un grupo, con las variables escaladas con sus límites
+def glm_score(model, feat):
+
+    glm = model['glm']
+    X_s = scale_matrix(feature_matrix(feat, glm['vars']), glm['xmin'], glm['xmax'])
+
+    return glm['inv_link'](glm['params'][0] + X_s.dot(glm['params'][1:]))
+
+
+# Predicciones de un grupo para las variables base feat: regresión logística, GBM, árbol y su combinación
+def score_group(model, feat, w_mix=W_MIX):
+
+    # Árbol y GBM: variables sin escalar
+    X = feature_matrix(feat, model['meta']['tree_vars'])
+    pred_tree = tree_predict(model['trees']['tree_'], X)
+    pred_gbm = tree_predict(model['trees']['gbm_'], X)
+
+    # Regresión logística: variables escaladas con los límites del grupo
+    pred_reg = glm_score(model, feat)
+
+    pred_mix = w_mix[0]*pred_reg + w_mix[1]*pred_gbm + w_mix[2]*pred_tree
+
+    return np.column_stack([pred_reg, pred_gbm, pred_tree, pred_mix])
+
+
+# Evalúa los registros rows con el modelo de su grupo (columna grp_col, o todos con el grupo grp).
+# Regresa LOGISTIC, GBM, TREE y MIX con el índice de rows; los registros de grupos sin modelo quedan con NaN.
+# feat son las variables base ya calculadas con base_features, si se tienen
+def score_risk(rows, models, loc_feat, grp=None, grp_col='GRP', w_mix=W_MIX, feat=None):
+
+    if feat is None:
+        feat = base_features(rows, loc_feat)
+    codes, grps = pd.factorize(np.repeat(grp, len(rows)) if grp is not None else rows[grp_col])
+
+    pred = np.full((len(rows), 4), np.nan)
+    for k, g in enumerate(grps):
+        if g in models:
+            pos = np.flatnonzero(codes==k)
+            pred[pos] = score_group(models[g], feat_rows(feat, pos), w_mix)
+
+    return pd.DataFrame(pred, index=rows.index, columns=['LOGISTIC', 'GBM', 'TREE', 'MIX'])
+
+
+# Número esperado de hospitalizaciones (por mes y localidad) de los registros rows con el modelo de su grupo.
+# Los registros de grupos sin modelo quedan con NaN
+def score_count(rows, models, loc_feat, grp=None, grp_col='GRP', feat=None):
+
+    if feat is None:
+        feat = base_features(rows, loc_feat)
+    codes, grps = pd.factorize(np.repeat(grp, len(rows)) if grp is not None else rows[grp_col])
+
+    pred = np.full(len(rows), np.nan)
+    for k, g in enumerate(grps):
+        if g in models:
+            pos = np.flatnonzero(codes==k)
+            pred[pos] = glm_score(models[g], feat_rows(feat, pos))
+
+    return pd.Series(pred, index=rows.index, name='N_HOSP')
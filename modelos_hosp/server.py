@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Servidor local (HTTP/JSON) para evaluar los modelos desde los dashboards.
+
+Los modelos (artifacts o pickle) y la tabla de indicadores por localidad se
+cargan una sola vez al iniciar:
+
+    python -m modelos_hosp.server --risk risk_models --count n_hosp --port 8080
+
+POST /score recibe un registro o una lista de registros con el grupo y los
+datos de la localidad, el paciente y la fecha:
+
+    {"grp": "E10-E149", "ENTIDAD": "09", "MUNIC": "006", "LOC": "0001",
+     "EDAD": 60, "SEXO": "M", "PESO": 70, "FECHA": 70}
+
+y regresa, para cada uno, la severidad (LOGISTIC, GBM, TREE y MIX) y el
+número esperado de hospitalizaciones (N_HOSP) del grupo, o null si no hay
+modelo. Las solicitudes que llegan al mismo tiempo se juntan (micro-batching)
+hasta max_batch registros o max_wait segundos y se evalúan con una sola
+llamada a score_risk y score_count. GET /metrics regresa el número de
+solicitudes y lotes y las latencias p50/p99, y GET /groups los grupos con modelo.
+"""
+
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+
+from .config import CFG
+from .refdata import load_loc_feat
+from .scoring import load_risk_models, load_count_models, loc_table, base_features, score_risk, score_count
+
+
+# Campos de cada registro; los de severidad pueden faltar si solo se pide el número de hospitalizaciones
+required_fields = ['grp', 'ENTIDAD', 'MUNIC', 'LOC']
+risk_fields = ['EDAD', 'PESO', 'SEXO', 'PROCED']
+
+
+# Latencias de las últimas solicitudes (en segundos) y contadores
+class LatencyStats:
+
+    def __init__(self, max_size=10000):
+
+        self.lock = threading.Lock()
+        self.latency = deque(maxlen=max_size)
+        self.n_requests = 0
+        self.n_batches = 0
+        self.n_rows = 0
+
+    def add_request(self, seconds):
+
+        with self.lock:
+            self.latency.append(seconds)
+            self.n_requests += 1
+
+    def add_batch(self, n_rows):
+
+        with self.lock:
+            self.n_batches += 1
+            self.n_rows += n_rows
+
+    def summary(self):
+
+        with self.lock:
+            lat = np.array(self.latency)
+            res = {'requests': self.n_requests, 'batches': self.n_batches,
+                   'rows_per_batch': self.n_rows/self.n_batches if self.n_batches else None}
+        for q in [50, 90, 99]:
+            res[f'p{q}_ms'] = float(np.percentile(lat, q)*1000) if len(lat) else None
+
+        return res
+
+
+# Junta las solicitudes que llegan al mismo tiempo y las evalúa en un solo lote en un hilo aparte
+class MicroBatcher:
+
+    def __init__(self, score_fn, max_batch=256, max_wait=0.002, stats=None):
+
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = stats
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # Evalúa rows (DataFrame); bloquea hasta que el lote en el que se incluyó termina
+    def submit(self, rows):
+
+        item = {'rows': rows, 'done': threading.Event(), 'result': None, 'error': None}
+        self.queue.put(item)
+        item['done'].wait()
+        if item['error'] is not None:
+            raise item['error']
+
+        return item['result']
+
+    def _run(self):
+
+        while True:
+            batch = [self.queue.get()]
+            n_rows = len(batch[0]['rows'])
+            deadline = time.monotonic() + self.max_wait
+            while n_rows<self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline-time.monotonic(), 0)))
+                    n_rows += len(batch[-1]['rows'])
+                except queue.Empty:
+                    break
+
+            try:
+                res = self.score_fn(pd.concat([item['rows'] for item in batch], ignore_index=True))
+                start = 0
+                for item in batch:
+                    item['result'] = res.iloc[start:start+len(item['rows'])]
+                    start += len(item['rows'])
+            except Exception:
+                # Si el lote falla, se evalúa cada solicitud por separado para regresar el error solo a la que lo causó
+                for item in batch:
+                    try:
+                        item['result'] = self.score_fn(item['rows'])
+                    except Exception as e:
+                        item['error'] = e
+
+            if self.stats is not None:
+                self.stats.add_batch(n_rows)
+            for item in batch:
+                item['done'].set()
+
+
+# Modelos, tabla de localidades y micro-batching, cargados una sola vez
+class ScoringService:
+
+    def __init__(self, loc_feat, risk_models=None, count_models=None, max_batch=256, max_wait=0.002):
+
+        self.loc_feat = loc_table(loc_feat)
+        self.risk_models = risk_models or {}
+        self.count_models = count_models or {}
+        self.stats = LatencyStats()
+        self.batcher = MicroBatcher(self.score_rows, max_batch, max_wait, self.stats)
+
+    # Severidad y número de hospitalizaciones de un lote de registros
+    def score_rows(self, rows):
+
+        rows = rows.reindex(columns=rows.columns.union(risk_fields, sort=False))
+        feat = base_features(rows, self.loc_feat)
+        res = pd.DataFrame(index=rows.index)
+        if self.risk_models:
+            res = res.join(score_risk(rows, self.risk_models, self.loc_feat, grp_col='grp', feat=feat))
+        if self.count_models:
+            res['N_HOSP'] = score_count(rows, self.count_models, self.loc_feat, grp_col='grp', feat=feat)
+
+        return res
+
+    # Valida los registros recibidos (un dict o una lista) y regresa sus resultados
+    def score(self, records):
+
+        if isinstance(records, dict):
+            records = [records]
+        for rec in records:
+            missing = [f for f in required_fields if f not in rec]
+            if 'FECHA' not in rec and 'INGRESO' not in rec:
+                missing.append('FECHA')
+            if missing:
+                raise ValueError(f'Faltan campos: {missing}')
+
+        res = self.batcher.submit(pd.DataFrame.from_records(records))
+
+        # NaN (grupo sin modelo o datos faltantes) se regresa como null
+        cols = list(res.columns)
+        out = []
+        for rec, v in zip(records, res.to_numpy()):
+            r = {c: None if np.isnan(x) else float(x) for c, x in zip(cols, v)}
+            out.append({'grp': rec['grp'],
+                        'severity': {k: r[k] for k in ['LOGISTIC', 'GBM', 'TREE', 'MIX']} if self.risk_models else None,
+                        'count': r['N_HOSP'] if self.count_models else None})
+
+        return out
+
+
+def make_handler(service):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, code, obj):
+
+            body = json.dumps(obj).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+
+            if self.path=='/metrics':
+                self._send(200, service.stats.summary())
+            elif self.path=='/groups':
+                self._send(200, {'risk': list(service.risk_models), 'count': list(service.count_models)})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+
+            if self.path!='/score':
+                self._send(404, {'error': 'not found'})
+                return
+            start = time.perf_counter()
+            try:
+                records = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._send(200, {'results': service.score(records)})
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {'error': str(e)})
+            except Exception as e:
+                self._send(500, {'error': repr(e)})
+            service.stats.add_request(time.perf_counter()-start)
+
+        # Sin registro en stderr de cada solicitud
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# Servidor con un hilo por solicitud. La cola de conexiones pendientes (listen) de socketserver es de 5: con
+# muchos clientes simultáneos las conexiones que no caben se rechazan, por lo que se usa una cola mayor
+class ScoringHTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, request_queue_size=128):
+        # Se fija antes de __init__, que llama a listen
+        self.request_queue_size = request_queue_size
+        super().__init__(address, handler)
+
+
+# Crea el servidor (sin iniciarlo), para usarlo también desde otro programa o en pruebas
+def make_server(service, host='127.0.0.1', port=8080, request_queue_size=128):
+
+    return ScoringHTTPServer((host, port), make_handler(service), request_queue_size)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='modelos_hosp.server', description='Servidor local para evaluar los modelos')
+    parser.add_argument('--risk', default=None, help='Modelos de severidad (directorio de artifacts o pickle)')
+    parser.add_argument('--count', default=None, help='Modelos del número de hospitalizaciones (directorio de artifacts o pickle)')
+    parser.add_argument('--base-dir', default=CFG.base_dir, help='Directorio base (indicadores de INEGI y contaminantes)')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que se atienden las solicitudes')
+    parser.add_argument('--port', type=int, default=8080, help='Puerto')
+    parser.add_argument('--max-batch', type=int, default=256, help='Registros máximos por lote')
+    parser.add_argument('--max-wait-ms', type=float, default=2, help='Espera máxima para juntar solicitudes en un lote (ms)')
+    parser.add_argument('--backlog', type=int, default=128, help='Conexiones pendientes máximas antes de rechazar nuevas')
+    args = parser.parse_args(argv)
+
+    if args.risk is None and args.count is None:
+        parser.error('se requiere --risk o --count')
+
+    service = ScoringService(load_loc_feat(CFG(base_dir=args.base_dir)),
+                             load_risk_models(args.risk) if args.risk else None,
+                             load_count_models(args.count) if args.count else None,
+                             args.max_batch, args.max_wait_ms/1000)
+
+    server = make_server(service, args.host, args.port, args.backlog)
+    print(f'Servidor en http://{args.host}:{args.port} (severidad: {len(service.risk_models)} grupos, '
+          f'hospitalizaciones: {len(service.count_models)} grupos)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
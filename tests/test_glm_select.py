@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Paridad de los ajustes binomiales negativos por lotes (nb_fit_batch, nb_screen)
+con statsmodels (sm.GLM con NegativeBinomial(alpha)), con datos sintéticos.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from modelos_hosp.glm_select import glm_design, nb_fit_batch, nb_screen, nb_alpha
+
+
+# Matriz de diseño común (con la constante) y G columnas de conteos binomiales negativos
+def make_data(n=800, p=5, G=4, seed=0):
+
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([np.ones(n), rng.random((n, p))])
+    Y = np.empty((n, G))
+    for g in range(G):
+        mu = np.exp(0.5 + X[:, 1:].dot(rng.normal(0, 0.7, p)))
+        a = 0.3 + 0.5*g
+        Y[:, g] = rng.negative_binomial(1/a, 1/(1+a*mu))
+
+    return X, Y
+
+
+# Ajuste de referencia de statsmodels de un modelo (registros y columnas de X)
+def sm_fit(X, y, alpha, rows=None, cols=None):
+
+    rows = np.ones(len(y), dtype=bool) if rows is None else rows
+    cols = np.ones(X.shape[1], dtype=bool) if cols is None else cols
+
+    return sm.GLM(y[rows], X[rows][:, cols], family=sm.families.NegativeBinomial(alpha=alpha)).fit()
+
+
+def assert_same_fit(res, g, ref, cols=None):
+
+    cols = np.ones(res['params'].shape[1], dtype=bool) if cols is None else cols
+    np.testing.assert_allclose(res['params'][g, cols], ref.params, rtol=1e-13, atol=1e-13)
+    np.testing.assert_allclose(res['bse'][g, cols], ref.bse, rtol=1e-13, atol=1e-13)
+    np.testing.assert_allclose(res['cov'][g][np.ix_(cols, cols)], ref.cov_params(), rtol=1e-12, atol=1e-13)
+    np.testing.assert_allclose(res['llf'][g], ref.llf, rtol=1e-13)
+    np.testing.assert_allclose(res['aic'][g], ref.aic, rtol=1e-13)
+    np.testing.assert_allclose(res['deviance'][g], ref.deviance, rtol=1e-13)
+
+
+@pytest.mark.parametrize('alpha', [0.5, 1.0, 2.5])
+def test_nb_fit_batch_parity(alpha):
+
+    X, Y = make_data()
+    res = nb_fit_batch(X, Y, alpha)
+
+    assert res['converged'].all()
+    for g in range(Y.shape[1]):
+        assert_same_fit(res, g, sm_fit(X, Y[:, g], alpha))
+
+
+# Cada modelo con sus registros (máscara), sus columnas y su alpha, en el mismo IRLS
+def test_nb_fit_batch_masks_parity():
+
+    X, Y = make_data()
+    G = Y.shape[1]
+    rng = np.random.default_rng(1)
+    mask = rng.random(Y.shape) < 0.7
+    cols = np.ones((G, X.shape[1]), dtype=bool)
+    cols[1, 2] = False
+    cols[2, [1, 4, 5]] = False
+    alpha = np.array([0.3, 0.8, 1.5, 4.0])
+
+    res = nb_fit_batch(X, Y, alpha, mask, cols)
+
+    for g in range(G):
+        assert_same_fit(res, g, sm_fit(X, Y[:, g], alpha[g], mask[:, g], cols[g]), cols[g])
+        assert (res['params'][g, ~cols[g]]==0).all()
+        assert np.isnan(res['bse'][g, ~cols[g]]).all()
+
+
+# Con bloques pequeños de modelos (menos memoria) el resultado es el mismo
+def test_nb_fit_batch_blocks(monkeypatch):
+
+    from modelos_hosp import glm_select
+
+    X, Y = make_data()
+    res = nb_fit_batch(X, Y, 1.0)
+
+    gram = glm_select.weighted_gram
+    monkeypatch.setattr(glm_select, 'weighted_gram', lambda X, W: gram(X, W, max_elems=1))
+    res_b = nb_fit_batch(X, Y, 1.0)
+
+    np.testing.assert_array_equal(res['params'], res_b['params'])
+
+
+# alpha estimado por modelo: igual al de nb_alpha de cada modelo por separado
+@pytest.mark.parametrize('method', ['mom', 'profile'])
+def test_nb_screen_alpha(method):
+
+    X, Y = make_data()
+    G = Y.shape[1]
+    mask = np.random.default_rng(2).random(Y.shape) < 0.8
+    alpha, res = nb_screen(X, Y, method, mask)
+
+    for g in range(G):
+        data = pd.DataFrame(X[mask[:, g], 1:], columns=[f'V{j}' for j in range(1, X.shape[1])])
+        data['Y'] = Y[mask[:, g], g]
+        assert alpha[g]==pytest.approx(nb_alpha(glm_design(data), list(data.columns[:-1]), method), rel=1e-12)
+        assert_same_fit(res, g, sm_fit(X, Y[:, g], alpha[g], mask[:, g]))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: Carlos Minutti Martinez <carlos.minutti@iimas.unam.mx>
+@author: Miguel Félix Mata Rivera <mmatar@ipn.mx >
+
+Paridad de la evaluación por lotes (scoring, con los modelos en el formato de
+artifacts) con la predicción de scikit-learn y statsmodels, con datos sintéticos.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+import statsmodels.formula.api as smf
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from modelos_hosp.artifacts import tree_arrays, gbm_arrays, glm_arrays
+from modelos_hosp.prep import MinMaxScaler
+from modelos_hosp.scoring import tree_tables, tree_predict, glm_tables, glm_score, scale_matrix, loc_table, base_features
+
+
+# Datos sintéticos: variables continuas y una dummy, y respuesta en 0-1
+def make_data(n=600, seed=0):
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({'EDAD': rng.uniform(0, 90, n), 'PESO': rng.uniform(2, 120, n),
+                      'F_ECONOM': rng.normal(0, 1, n), 'SEXO_M': rng.integers(0, 2, n).astype('float64')})
+    eta = -1 + 0.03*X.EDAD - 0.01*X.PESO + 0.5*X.F_ECONOM + 0.3*X.SEXO_M
+    y = (rng.random(n) < 1/(1+np.exp(-eta))).astype('float64')
+
+    return X, y
+
+
+# Tablas de scoring de los arreglos de artifacts de un árbol o GBM
+def lean_tables(arrays_meta, prefix):
+
+    arrays, meta = arrays_meta
+    return tree_tables(arrays, meta[prefix+'meta'], prefix)
+
+
+@pytest.mark.parametrize('model', [
+    GradientBoostingRegressor(n_estimators=40, max_depth=3, random_state=0),
+    HistGradientBoostingRegressor(max_iter=40, random_state=0),
+])
+def test_gbm_parity(model):
+
+    X, y = make_data()
+    model.fit(X.to_numpy(), y)
+    X_new, _ = make_data(seed=1)
+
+    pred = tree_predict(lean_tables(gbm_arrays(model), 'gbm_'), X_new.to_numpy())
+
+    np.testing.assert_allclose(pred, model.predict(X_new.to_numpy()), rtol=0, atol=1e-15)
+
+
+def test_tree_parity():
+
+    X, y = make_data()
+    clf = DecisionTreeRegressor(max_depth=6, random_state=0).fit(X.to_numpy(), y)
+    X_new, _ = make_data(seed=1)
+
+    pred = tree_predict(lean_tables(tree_arrays(clf), 'tree_'), X_new.to_numpy())
+
+    np.testing.assert_allclose(pred, clf.predict(X_new.to_numpy()), rtol=0, atol=1e-15)
+
+
+def test_hgb_missing_values():
+
+    X, y = make_data()
+    X.loc[::7, 'F_ECONOM'] = np.nan
+    model = HistGradientBoostingRegressor(max_iter=40, random_state=0).fit(X.to_numpy(), y)
+    X_new, _ = make_data(seed=1)
+    X_new.loc[::5, 'F_ECONOM'] = np.nan
+
+    pred = tree_predict(lean_tables(gbm_arrays(model), 'gbm_'), X_new.to_numpy())
+
+    np.testing.assert_allclose(pred, model.predict(X_new.to_numpy()), rtol=0, atol=1e-15)
+
+
+# GBR y el árbol no admiten nulos: esos registros quedan con NaN y los demás no cambian
+@pytest.mark.parametrize('model, prefix', [
+    (GradientBoostingRegressor(n_estimators=20, random_state=0), 'gbm_'),
+    (DecisionTreeRegressor(max_depth=5, random_state=0), 'tree_'),
+])
+def test_missing_values_without_support(model, prefix):
+
+    X, y = make_data()
+    model.fit(X.to_numpy(), y)
+    X_new, _ = make_data(seed=1)
+    nan_rows = np.zeros(len(X_new), dtype=bool)
+    nan_rows[::5] = True
+    X_nan = X_new.to_numpy(copy=True)
+    X_nan[nan_rows, 2] = np.nan
+
+    arrays_meta = gbm_arrays(model) if prefix=='gbm_' else tree_arrays(model)
+    pred = tree_predict(lean_tables(arrays_meta, prefix), X_nan)
+
+    assert np.isnan(pred[nan_rows]).all()
+    np.testing.assert_allclose(pred[~nan_rows], model.predict(X_new.to_numpy()[~nan_rows]), rtol=0, atol=1e-15)
+
+
+@pytest.mark.parametrize('family', [sm.families.Binomial(), sm.families.NegativeBinomial(alpha=0.7)])
+def test_glm_parity(family):
+
+    X, y = make_data()
+    if isinstance(family, sm.families.NegativeBinomial):
+        y = np.random.default_rng(2).poisson(np.exp(0.5 + 0.5*X.F_ECONOM.to_numpy())).astype('float64')
+
+    # Variables escaladas con MinMaxScaler, como en los modelos
+    scaler = MinMaxScaler().fit(X)
+    data = scaler.transform(X)
+    data['Y'] = y
+    model = smf.glm('Y~EDAD+PESO+F_ECONOM+SEXO_M', data=data, family=family).fit()
+
+    arrays, meta = glm_arrays(model)
+    arrays.update({'xmin': scaler.xmin.to_numpy(), 'xmax': scaler.xmax.to_numpy()})
+    meta['columns'] = list(scaler.xmin.index)
+
+    X_new, _ = make_data(seed=1)
+    feat = {col: X_new[col].to_numpy() for col in ['EDAD', 'PESO', 'F_ECONOM']}
+    feat['SEXO'] = np.where(X_new.SEXO_M>0, 'M', 'F').astype(object)
+    feat['FECHA'] = np.ones(len(X_new))
+    pred = glm_score({'glm': glm_tables(meta, arrays)}, feat)
+
+    np.testing.assert_allclose(pred, model.predict(scaler.transform(X_new)).to_numpy(), rtol=1e-13, atol=1e-15)
+
+
+def test_scale_matrix_matches_scaler():
+
+    X = pd.DataFrame({'a': [1., 2., 3.], 'b': [0., 1., 0.5], 'c': [4., 4., 4.], 'd': [-1., 0., 2.]})
+    scaler = MinMaxScaler().fit(X)
+    X_new = pd.DataFrame({'a': [0., 2.5, 5.], 'b': [0.2, 1.5, -1.], 'c': [4., 5., 3.], 'd': [3., np.nan, 0.]})
+
+    A = scale_matrix(X_new.to_numpy(copy=True), scaler.xmin.to_numpy(), scaler.xmax.to_numpy())
+
+    np.testing.assert_array_equal(A, scaler.transform(X_new).to_numpy())
+
+
+# Las localidades que no existen usan el promedio de las localidades con datos
+def test_unknown_locality_mean():
+
+    loc_feat = pd.DataFrame({'F_ECONOM': [1., 3., 5.], 'PM_CO': [np.nan, 2., np.nan]},
+                            index=['090020001', '090030001', '150010001'])
+    rows = pd.DataFrame({'ENTIDAD': ['09', '99'], 'MUNIC': ['002', '999'], 'LOC': ['0001', '9999'], 'FECHA': [10, 11]})
+
+    feat = base_features(rows, loc_table(loc_feat))
+
+    np.testing.assert_array_equal(feat['F_ECONOM'], [1., 3.])
+    np.testing.assert_array_equal(feat['PM_CO'], [np.nan, 2.])